@@ -1,16 +1,40 @@
 """
-Huấn luyện mô hình RandomForestRegressor để tính điểm phù hợp AI Score
+Huấn luyện mô hình tính điểm phù hợp AI Score (loại mô hình theo "model.type", xem model_engines.py)
 Dự đoán điểm phù hợp giữa sinh viên và môn học/kỹ năng
+
+- train_model(): huấn luyện lại toàn bộ trên file features
+- update_model(): chọn giữa huấn luyện tăng dần (thêm cây bằng warm_start, chỉ fit trên các dòng
+  của học sinh vừa cập nhật trong kho features) và huấn luyện lại toàn bộ, theo lượng dữ liệu đã đổi
+- Bảng features lớn hơn ngân sách dòng/bộ nhớ được lấy mẫu phân tầng khi đọc (training_sampler.py)
+- Các đặc trưng có permutation importance dưới ngưỡng được bỏ rồi huấn luyện lại (feature_selection.py)
 """
 
 import pandas as pd
 from pathlib import Path
 import json
+import time
 import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from data_processor import process_all_data
+from data_store import dataset_columns, dataset_exists, find_dataset, load_dataset
+from feature_engineering import create_features
+from feature_selection import get_selection_config, permutation_importances, select_features
+from feature_store import clear_changes, count_changed_rows, load_changed_features
+from feedback_features import build_feedback_features
+from forest_predictor import FlatForest, can_flatten
+from feature_transformer import TRANSFORMER_PATH, build_model_matrix, get_hashed_text_config, load_feature_transformer
+from hyperparameter_search import get_search_config, successive_halving_search
+from model_engines import DEFAULT_ENGINE, engine_for_model, get_engine
+from model_evaluation import _take, cross_validate, get_evaluation_config, split_indices, split_train_test
+from model_registry import (
+    REGISTRY_DIR, current_model_paths, current_version, get_current_model, load_training_sample, load_version, promote,
+    prune_versions, register_model
+)
+from pipeline_manifest import hash_file, is_stage_fresh, record_stage, snapshot_inputs
+from training_sampler import get_sampling_config, sample_features
 
 
 def get_project_root():
@@ -25,6 +49,33 @@ PROJECT_ROOT = get_project_root()
 DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
 CONFIG_DIR = PROJECT_ROOT / 'config'
 MODELS_DIR = PROJECT_ROOT / 'models'
+SEARCH_HISTORY_PATH = MODELS_DIR / 'search_history.json'
+
+# Số dòng huấn luyện tối thiểu để chạy tìm kiếm siêu tham số (ít hơn thì dùng tham số cấu hình)
+MIN_SEARCH_ROWS = 50
+
+# Số dòng kiểm định tối thiểu để chọn đặc trưng theo importance (ít hơn thì giữ mọi đặc trưng)
+MIN_SELECTION_ROWS = 50
+
+# Các cột văn bản/ID của features không dùng khi huấn luyện (không đọc từ đĩa)
+UNUSED_COLUMNS = ['subject_code', 'subject_id', 'name', 'comment']
+
+# Rừng cây gọn để phục vụ web (mục "serving" của model_config.json)
+DEFAULT_SERVING_CONFIG = {
+    # Dung lượng tối đa (MB); vượt quá thì cắt tỉa độ sâu các cây. None = giữ nguyên cây
+    'max_size_mb': None,
+}
+
+# Huấn luyện tăng dần (mục "incremental" của model_config.json)
+DEFAULT_INCREMENTAL_CONFIG = {
+    'enabled': True,
+    # Tỷ lệ dòng đã đổi (cộng dồn từ lần huấn luyện toàn bộ gần nhất) tối đa để còn huấn luyện tăng dần
+    'max_changed_fraction': 0.2,
+    # Số cây thêm vào mỗi lần cập nhật
+    'trees_per_update': 10,
+    # Số cây tối đa; vượt quá thì bỏ các cây cũ nhất
+    'max_estimators': 300,
+}
 
 
 def get_output_path(filename: str) -> Path:
@@ -74,61 +125,255 @@ def create_target_variable(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def train_model():
-    """Huấn luyện mô hình RandomForestRegressor"""
-    print("🔄 Bắt đầu huấn luyện mô hình AI...")
-    
-    # Đọc cấu hình
-    config = load_config()
-    model_config = config.get('model', {})
+def save_search_history(best_params: Dict, history: List[Dict], search_config: Dict) -> Dict:
+    """Ghi toàn bộ lịch sử tìm kiếm vào models/search_history.json; trả về bản tóm tắt"""
+    best = max(history, key=lambda entry: (entry['n_samples'], entry['val_r2']))
+    summary = {
+        'best_params': best_params,
+        'best_val_r2': best['val_r2'],
+        'n_evaluations': len(history),
+        'n_rounds': max(entry['round'] for entry in history),
+        'budget_seconds': search_config['budget_seconds'],
+        'total_fit_seconds': round(sum(entry['fit_seconds'] for entry in history), 3),
+    }
+    MODELS_DIR.mkdir(parents=True, exist_ok=True)
+    with open(SEARCH_HISTORY_PATH, 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'history': history}, f, indent=2, ensure_ascii=False)
+    print(f"💾 Đã lưu lịch sử tìm kiếm ({len(history)} lần đánh giá) tại: {SEARCH_HISTORY_PATH}")
+    return summary
+
+
+def get_serving_config(config: Dict) -> Dict:
+    """Cấu hình rừng cây gọn dùng khi phục vụ web đã điền giá trị mặc định"""
+    return {**DEFAULT_SERVING_CONFIG, **config.get('serving', {})}
+
+
+def export_forest(model, config: Dict, X_eval, y_eval) -> Tuple[Optional[FlatForest], Optional[Dict]]:
+    """
+    Xuất rừng cây gọn (forest_predictor.py) để phục vụ web, cắt tỉa nếu vượt "serving.max_size_mb".
+
+    Returns:
+        (rừng cây, thông tin ghi vào feature_info); (None, None) nếu mô hình không phải rừng cây
+    """
+    if not can_flatten(model):
+        return None, None
+    forest = FlatForest.from_model(model)
+    max_size_mb = get_serving_config(config)['max_size_mb']
+    if max_size_mb:
+        forest = forest.fit_size(int(max_size_mb * 1024 ** 2))
+    summary = forest.summary()
+    if forest.pruned_depth is not None and len(y_eval) > 1:
+        summary['test_r2'] = float(r2_score(y_eval, forest.predict(X_eval)))
+        print(f"✂️  Rừng cây phục vụ web được cắt ở độ sâu {forest.pruned_depth} "
+              f"({summary['size_mb']:.2f} MB), R² {summary['test_r2']:.4f}")
+    return forest, summary
+
+
+def get_incremental_config(config: Dict) -> Dict:
+    """Cấu hình huấn luyện tăng dần đã điền giá trị mặc định"""
+    return {**DEFAULT_INCREMENTAL_CONFIG, **config.get('incremental', {})}
+
+
+def prepare_training_data(config: Dict) -> Dict:
+    """
+    Đọc file features và tạo ma trận huấn luyện (dùng chung cho train_model và benchmark_models.py).
+    Chỉ đọc các cột cần cho huấn luyện; bảng vượt ngân sách của mục "sampling" được lấy mẫu phân tầng.
+
+    Returns:
+        dict gồm X, y, feature_cols, hashed_text, target,
+        groups (student_id từng dòng) và terms (year, semester từng dòng) để chia dữ liệu đánh giá,
+        sampling (thông tin mẫu, None nếu đọc toàn bộ), sample_rows (vị trí các dòng mẫu trong file)
+        và frame (DataFrame đã đọc, để tạo lại ma trận với ít đặc trưng hơn)
+    """
     target = config.get('target', 'ai_score')
-    min_accuracy = config.get('min_accuracy', 0.80)
-    
-    # Đọc dữ liệu features
-    features_path = get_output_path('features.csv')
-    if not features_path.exists():
-        print("❌ File features.csv không tồn tại!")
-        print("   Vui lòng chạy feature_engineering.py trước!")
-        return None
-    
-    df = pd.read_csv(features_path)
-    print(f"📊 Đã đọc {len(df)} dòng dữ liệu")
+    columns = [col for col in dataset_columns('features') if col not in UNUSED_COLUMNS]
+    sampling_config = get_sampling_config(config)
+    sampled = sample_features(columns, sampling_config) if sampling_config['enabled'] else None
+    if sampled is None:
+        df, sampling = load_dataset('features', columns), None
+        print(f"📊 Đã đọc {len(df)} dòng dữ liệu")
+    else:
+        df, sampling = sampled
+        print(f"📊 Lấy mẫu phân tầng {sampling['sample_rows']}/{sampling['total_rows']} dòng "
+              f"({sampling['n_strata']} nhóm theo {', '.join(sampling['strata']) or 'toàn bảng'}, "
+              f"{sampling['seconds']:.1f}s)")
     
-    # Tạo biến mục tiêu nếu chưa có
+    # Tạo biến mục tiêu nếu chưa có (không ghi ngược vào features để manifest
+    # của bước Feature Engineering không bị thay đổi)
     if target not in df.columns:
         print("📝 Tạo biến mục tiêu AI Score...")
         df = create_target_variable(df)
-        df.to_csv(features_path, index=False, encoding='utf-8')
     
-    # Chọn các đặc trưng (loại bỏ ID và target)
-    exclude_cols = ['student_id', 'subject_code', 'subject_id', target, 'name', 'comment']
+    # Chọn các đặc trưng (loại bỏ ID và target; cột văn bản mã hóa băm được thêm riêng)
+    hashed_text = get_hashed_text_config(config)
+    exclude_cols = ['student_id', target] + UNUSED_COLUMNS
+    if hashed_text:
+        exclude_cols += hashed_text['columns']
     feature_cols = [col for col in df.columns if col not in exclude_cols]
     
     # Loại bỏ các cột có quá nhiều giá trị thiếu
     feature_cols = [col for col in feature_cols if df[col].notna().sum() > len(df) * 0.5]
     
-    X = df[feature_cols].fillna(0)
-    y = df[target]
-    
     print(f"📈 Sử dụng {len(feature_cols)} đặc trưng")
     print(f"   Các đặc trưng: {', '.join(feature_cols[:10])}...")
+    if hashed_text:
+        print(f"   Mã hóa băm ({hashed_text['n_features']} cột thưa): {', '.join(hashed_text['columns'])}")
     
-    # Chia dữ liệu train/test
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+    return {
+        'X': build_model_matrix(df, feature_cols, hashed_text),
+        'y': df[target],
+        'feature_cols': feature_cols,
+        'hashed_text': hashed_text,
+        'target': target,
+        'groups': df['student_id'].astype(str).to_numpy() if 'student_id' in df.columns else None,
+        'terms': df[['year', 'semester']] if {'year', 'semester'}.issubset(df.columns) else None,
+        'sampling': sampling,
+        'sample_rows': df.index.to_numpy() if sampling is not None else None,
+        'frame': df,
+    }
+
+
+def prune_features(engine, model_params: Dict, data: Dict, X, selection_config: Dict):
+    """
+    Bỏ các đặc trưng có permutation importance dưới ngưỡng rồi huấn luyện lại với cùng tham số.
+    Chỉ dùng phần train của cách chia train/test: một phần (theo học sinh) được tách làm tập kiểm
+    định để đo importance và so sánh mô hình đầy đủ với mô hình rút gọn; tập kiểm tra không được dùng.
+
+    Args:
+        X: Ma trận đặc trưng đầy đủ (mọi dòng, đã engine.prepare)
+
+    Returns:
+        (kết quả rút gọn, thông tin chọn đặc trưng); kết quả rút gọn là (mô hình huấn luyện trên toàn
+        bộ phần train, X, feature_cols, hashed_text), hoặc None nếu không bỏ được đặc trưng nào hay
+        mô hình rút gọn kém hơn quá max_r2_drop
+    """
+    start = time.perf_counter()
+    y, groups, frame = data['y'], data['groups'], data['frame']
+    feature_cols, hashed_text = data['feature_cols'], data['hashed_text']
+    train_idx, _ = split_indices(len(y), groups)
+    fit_pos, val_pos = split_indices(
+        len(train_idx), groups[train_idx] if groups is not None else None,
+        test_size=selection_config['validation_size'], random_state=selection_config['random_state']
     )
+    fit_idx, val_idx = train_idx[fit_pos], train_idx[val_pos]
+    y_fit, y_val = _take(y, fit_idx), _take(y, val_idx)
+
+    full_model = engine.build(model_params, n_jobs=-1)
+    full_model.fit(_take(X, fit_idx), y_fit)
+    engine.for_serving(full_model)
+    importances = permutation_importances(
+        full_model, frame.iloc[val_idx], y_val, feature_cols, hashed_text, selection_config
+    )
+    kept_cols, kept_hashed, dropped = select_features(
+        importances, feature_cols, hashed_text, selection_config['threshold']
+    )
+    summary = {
+        'method': 'permutation',
+        'threshold': selection_config['threshold'],
+        'validation_rows': int(len(val_idx)),
+        'importances': dict(sorted(importances.items(), key=lambda item: -item[1])),
+        'dropped': dropped,
+        'accepted': False,
+    }
+
+    reduced = None
+    if dropped:
+        print(f"   Bỏ {len(dropped)} đặc trưng: {', '.join(dropped)}")
+        X_reduced = engine.prepare(build_model_matrix(frame, kept_cols, kept_hashed))
+        reduced_model = engine.build(model_params, n_jobs=-1)
+        reduced_model.fit(_take(X_reduced, fit_idx), y_fit)
+        full_r2 = r2_score(y_val, full_model.predict(_take(X, val_idx)))
+        reduced_r2 = r2_score(y_val, reduced_model.predict(_take(X_reduced, val_idx)))
+        summary.update({'full_val_r2': float(full_r2), 'reduced_val_r2': float(reduced_r2),
+                        'accepted': bool(reduced_r2 >= full_r2 - selection_config['max_r2_drop'])})
+        print(f"   R² kiểm định: {full_r2:.4f} (đầy đủ) -> {reduced_r2:.4f} (rút gọn)")
+        if summary['accepted']:
+            # Mô hình dùng được huấn luyện lại trên toàn bộ phần train (gồm cả tập kiểm định)
+            final_model = engine.build(model_params, n_jobs=-1)
+            final_model.fit(_take(X_reduced, train_idx), _take(y, train_idx))
+            engine.for_serving(final_model)
+            reduced = (final_model, X_reduced, kept_cols, kept_hashed)
+        else:
+            print(f"⚠️  Mô hình rút gọn kém hơn quá {selection_config['max_r2_drop']}, giữ mọi đặc trưng")
+    else:
+        print("   Không có đặc trưng nào dưới ngưỡng")
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return reduced, summary
+
+
+def train_model(force: bool = False):
+    """
+    Huấn luyện mô hình (loại theo "model.type" trong model_config.json)
+
+    Args:
+        force: Huấn luyện lại kể cả khi features và cấu hình không thay đổi
+    """
+    print("🔄 Bắt đầu huấn luyện mô hình AI...")
+    
+    # Đọc cấu hình
+    config = load_config()
+    model_config = config.get('model', {})
+    min_accuracy = config.get('min_accuracy', 0.80)
+    engine = get_engine(model_config.get('type'))
+    
+    # Đọc dữ liệu features
+    if not dataset_exists('features'):
+        print("❌ File features không tồn tại!")
+        print("   Vui lòng chạy feature_engineering.py trước!")
+        return None
+    
+    stage_inputs = [find_dataset('features'), CONFIG_DIR / 'model_config.json']
+    if not force and is_stage_fresh('train_model', stage_inputs, current_model_paths()):
+        print("⏭️  Bỏ qua huấn luyện (features và cấu hình không thay đổi)")
+        return get_current_model()[0]
+    input_snapshot = snapshot_inputs(stage_inputs)
+    
+    data = prepare_training_data(config)
+    feature_cols, hashed_text, target = data['feature_cols'], data['hashed_text'], data['target']
+    # HistGradientBoosting chỉ nhận ma trận dày
+    X = engine.prepare(data['X'])
+    y = data['y']
+    
+    # Chia dữ liệu train/test theo học sinh (mọi dòng của một học sinh cùng một phía)
+    train_idx, _ = split_indices(len(y), data['groups'])
+    X_train, X_test, y_train, y_test = split_train_test(X, y, data['groups'])
+    groups_train = data['groups'][train_idx] if data['groups'] is not None else None
+    
+    model_params = engine.params_from_config(model_config)
+    
+    # Tìm siêu tham số (successive halving trong ngân sách thời gian) nếu được bật
+    search_config = get_search_config(config)
+    search_summary = None
+    if search_config['enabled'] and len(y_train) >= MIN_SEARCH_ROWS:
+        print(f"🔎 Tìm siêu tham số {engine.name} (ngân sách {search_config['budget_seconds']}s)...")
+        best_params, history = successive_halving_search(
+            X_train, y_train, {'random_state': model_params.get('random_state', 42)}, search_config, engine,
+            groups=groups_train
+        )
+        model_params.update(best_params)
+        search_summary = save_search_history(best_params, history, search_config)
+    elif search_config['enabled']:
+        print(f"⚠️  Quá ít dữ liệu để tìm siêu tham số ({len(y_train)} dòng), dùng tham số cấu hình")
     
     # Tạo và huấn luyện mô hình
-    model = RandomForestRegressor(
-        n_estimators=model_config.get('n_estimators', 100),
-        max_depth=model_config.get('max_depth', 10),
-        min_samples_split=model_config.get('min_samples_split', 5),
-        min_samples_leaf=model_config.get('min_samples_leaf', 2),
-        random_state=model_config.get('random_state', 42)
-    )
+    model = engine.build(model_params, n_jobs=-1)
     
-    print("🎯 Đang huấn luyện mô hình...")
+    print(f"🎯 Đang huấn luyện mô hình {engine.name}...")
     model.fit(X_train, y_train)
+    engine.for_serving(model)
+    
+    # Bỏ các đặc trưng không có ích (permutation importance) rồi huấn luyện lại
+    selection_config = get_selection_config(config)
+    selection = None
+    n_validation = int(len(y_train) * selection_config['validation_size'])
+    if selection_config['enabled'] and n_validation >= MIN_SELECTION_ROWS:
+        print("✂️  Chọn đặc trưng theo permutation importance...")
+        reduced, selection = prune_features(engine, model_params, data, X, selection_config)
+        if reduced is not None:
+            model, X, feature_cols, hashed_text = reduced
+            X_train, X_test, y_train, y_test = split_train_test(X, y, data['groups'])
+    elif selection_config['enabled']:
+        print(f"⚠️  Quá ít dữ liệu để chọn đặc trưng ({n_validation} dòng kiểm định), giữ mọi đặc trưng")
     
     # Đánh giá mô hình
     y_pred_train = model.predict(X_train)
@@ -145,21 +390,45 @@ def train_model():
     print(f"   Test MAE: {test_mae:.4f}")
     print(f"   Test RMSE: {test_rmse:.4f}")
     
-    if test_r2 >= min_accuracy:
+    # Kiểm định chéo theo học sinh (các fold chạy song song) để so với min_accuracy
+    evaluation_config = get_evaluation_config(config)
+    cross_validation = None
+    if evaluation_config['enabled']:
+        print("🔁 Kiểm định chéo theo học sinh...")
+        cross_validation = cross_validate(
+            engine, model_params, X, y, data['groups'], data['terms'], evaluation_config
+        )
+    accuracy = test_r2
+    if cross_validation and 'group' in cross_validation:
+        group_cv = cross_validation['group']
+        accuracy = group_cv['mean_r2']
+        print(f"   GroupKFold ({group_cv['n_splits']} fold): R² {group_cv['mean_r2']:.4f} "
+              f"± {group_cv['std_r2']:.4f}, MAE {group_cv['mean_mae']:.4f} ({cross_validation['seconds']:.1f}s)")
+    if cross_validation and 'time' in cross_validation:
+        time_cv = cross_validation['time']
+        print(f"   Theo học kỳ ({time_cv['n_splits']} fold): R² {time_cv['mean_r2']:.4f} ± {time_cv['std_r2']:.4f}")
+    
+    if accuracy >= min_accuracy:
         print(f"✅ Mô hình đạt yêu cầu (R² >= {min_accuracy})")
     else:
         print(f"⚠️  Mô hình chưa đạt yêu cầu (R² < {min_accuracy})")
     
-    # Lưu mô hình
-    MODELS_DIR.mkdir(parents=True, exist_ok=True)
-    model_path = MODELS_DIR / 'ai_model.pkl'
-    joblib.dump(model, model_path)
-    print(f"💾 Đã lưu mô hình tại: {model_path}")
-    
-    # Lưu danh sách đặc trưng
+    # Danh sách đặc trưng (kèm phiên bản và hash của bộ biến đổi đặc trưng đã tạo ra features)
+    transformer = load_feature_transformer()
     feature_info = {
         'features': feature_cols,
+        'hashed_text': hashed_text,
         'target': target,
+        'transformer_version': transformer.version if transformer is not None else None,
+        'transformer_hash': hash_file(TRANSFORMER_PATH) if TRANSFORMER_PATH.exists() else None,
+        'model_type': engine.name,
+        'model_params': model_params,
+        'search': search_summary,
+        'n_train_rows': int(len(y_train)),
+        'rows_since_full': 0,
+        'cross_validation': cross_validation,
+        'sampling': data['sampling'],
+        'selection': selection,
         'metrics': {
             'train_r2': float(train_r2),
             'test_r2': float(test_r2),
@@ -168,15 +437,145 @@ def train_model():
         }
     }
     
-    feature_info_path = MODELS_DIR / 'feature_info.json'
-    with open(feature_info_path, 'w', encoding='utf-8') as f:
-        json.dump(feature_info, f, indent=2, ensure_ascii=False)
-    
-    print(f"💾 Đã lưu thông tin đặc trưng tại: {feature_info_path}")
+    # Lưu thành phiên bản mới trong registry rồi đưa vào sử dụng (web app tự nạp lại)
+    forest, feature_info['forest'] = export_forest(model, config, X_test, y_test)
+    version = register_model(model, feature_info, forest, data['sample_rows'])
+    promote(version)
+    prune_versions()
+    print(f"💾 Đã lưu mô hình phiên bản {version} tại: {REGISTRY_DIR / version}")
+    record_stage('train_model', input_snapshot, current_model_paths())
     
     return model
 
 
+def _training_stage_inputs() -> List[Path]:
+    return [find_dataset('features'), CONFIG_DIR / 'model_config.json']
+
+
+def choose_training_mode(config: Dict, force_full: bool = False):
+    """
+    Chọn cách cập nhật mô hình.
+
+    Returns:
+        (chế độ, lý do, số dòng đã đổi); chế độ là 'full' hoặc 'incremental'
+    """
+    incremental = get_incremental_config(config)
+    changed_rows = count_changed_rows()
+    if force_full:
+        return 'full', 'yêu cầu huấn luyện toàn bộ', changed_rows
+    if not incremental['enabled']:
+        return 'full', 'huấn luyện tăng dần bị tắt', changed_rows
+    if changed_rows == 0:
+        return 'full', 'không có dòng features cập nhật tăng dần', changed_rows
+
+    model, feature_info = get_current_model()
+    if model is None:
+        return 'full', 'chưa có mô hình đã huấn luyện', changed_rows
+    engine = engine_for_model(model)
+    if engine.name != config.get('model', {}).get('type', DEFAULT_ENGINE):
+        return 'full', 'loại mô hình đã thay đổi', changed_rows
+    if not engine.incremental:
+        return 'full', f'{engine.name} không hỗ trợ huấn luyện tăng dần', changed_rows
+    # Cấu hình hoặc file features đổi kể từ lần huấn luyện gần nhất (kể cả khi bộ biến đổi đặc trưng
+    # được fit lại: dòng mới sẽ được mã hóa khác với dữ liệu của các cây cũ)
+    if not dataset_exists('features') or not is_stage_fresh('train_model', _training_stage_inputs(), current_model_paths()):
+        return 'full', 'features hoặc cấu hình đã thay đổi', changed_rows
+
+    n_train_rows = feature_info.get('n_train_rows')
+    if not n_train_rows:
+        return 'full', 'không rõ số dòng huấn luyện của mô hình hiện tại', changed_rows
+    fraction = (feature_info.get('rows_since_full', 0) + changed_rows) / n_train_rows
+    if fraction > incremental['max_changed_fraction']:
+        return 'full', f"{fraction:.1%} dữ liệu đã đổi (> {incremental['max_changed_fraction']:.0%})", changed_rows
+    return 'incremental', f"{fraction:.1%} dữ liệu đã đổi", changed_rows
+
+
+def train_incremental(config: Dict):
+    """
+    Thêm cây vào mô hình hiện tại (warm_start), các cây mới chỉ fit trên dòng features của
+    những học sinh đã cập nhật tăng dần; các cây cũ giữ nguyên. Lưu thành phiên bản mới.
+    """
+    incremental = get_incremental_config(config)
+    target = config.get('target', 'ai_score')
+    input_snapshot = snapshot_inputs(_training_stage_inputs())
+    base_version = current_version()
+    # Tải bản riêng từ đĩa: không sửa mô hình đang phục vụ trong bộ nhớ
+    model, feature_info = load_version(base_version)
+
+    df, cutoff = load_changed_features()
+    if target not in df.columns:
+        df = create_target_variable(df)
+    X = build_model_matrix(df, feature_info['features'], feature_info.get('hashed_text'))
+    y = df[target]
+    r2_before = r2_score(y, model.predict(X)) if len(y) > 1 else None
+
+    n_trees = int(incremental['trees_per_update'])
+    print(f"🌱 Huấn luyện tăng dần: thêm {n_trees} cây trên {len(df)} dòng "
+          f"({df['student_id'].nunique()} học sinh)...")
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees, n_jobs=-1)
+    model.fit(X, y)
+    model.set_params(warm_start=False, n_jobs=None)
+
+    # Giữ kích thước rừng cố định: bỏ các cây cũ nhất
+    dropped = max(len(model.estimators_) - int(incremental['max_estimators']), 0)
+    if dropped:
+        model.estimators_ = model.estimators_[dropped:]
+        model.set_params(n_estimators=len(model.estimators_))
+    r2_after = r2_score(y, model.predict(X)) if len(y) > 1 else None
+
+    feature_info = {
+        **feature_info,
+        'rows_since_full': feature_info.get('rows_since_full', 0) + int(len(df)),
+        'incremental': {
+            'base_version': base_version,
+            'n_rows': int(len(df)),
+            'trees_added': n_trees,
+            'trees_dropped': dropped,
+            'n_estimators': len(model.estimators_),
+            'changed_r2_before': None if r2_before is None else float(r2_before),
+            'changed_r2_after': None if r2_after is None else float(r2_after),
+        },
+    }
+    if r2_before is not None:
+        print(f"   R² trên các dòng đã đổi: {r2_before:.4f} -> {r2_after:.4f}")
+
+    forest, feature_info['forest'] = export_forest(model, config, X, y)
+    # Các cây cũ vẫn được huấn luyện trên mẫu của phiên bản gốc: giữ lại vị trí các dòng mẫu
+    version = register_model(model, feature_info, forest, load_training_sample(base_version))
+    promote(version)
+    prune_versions()
+    clear_changes(cutoff)
+    # Mô hình mới vẫn ứng với file features và cấu hình hiện tại (cộng các thay đổi tăng dần)
+    record_stage('train_model', input_snapshot, current_model_paths())
+    print(f"💾 Đã lưu mô hình phiên bản {version} ({len(model.estimators_)} cây)")
+    return model
+
+
+def update_model(force_full: bool = False):
+    """
+    Cập nhật mô hình sau khi dữ liệu thay đổi: huấn luyện tăng dần nếu lượng dòng đã đổi
+    (cộng dồn từ lần huấn luyện toàn bộ gần nhất) còn nhỏ, ngược lại làm sạch lại các file
+    đầu vào đã đổi, tạo lại features và huấn luyện toàn bộ.
+
+    Args:
+        force_full: Luôn huấn luyện lại toàn bộ
+    """
+    config = load_config()
+    mode, reason, changed_rows = choose_training_mode(config, force_full)
+    print(f"🔀 Chế độ huấn luyện: {'tăng dần' if mode == 'incremental' else 'toàn bộ'} ({reason})")
+    if mode == 'incremental':
+        return train_incremental(config)
+
+    if changed_rows:
+        # Kho features có dòng mới hơn file features (dữ liệu nhập qua web chỉ được ghi vào file
+        # đầu vào và database): làm sạch lại các file đầu vào đã đổi trước khi tạo lại file
+        # features, nếu không các dòng mới sẽ bị mất khi kho features được ghi lại
+        process_all_data()
+        build_feedback_features()
+        create_features()
+    return train_model(force=force_full or changed_rows > 0)
+
+
 if __name__ == '__main__':
     train_model()
 
@@ -10,6 +10,12 @@ import joblib
 import numpy as np
 from typing import Dict, List, Optional
 
+from data_store import dataset_exists, dataset_path, find_dataset, get_storage_format, load_dataset, save_dataset
+from database_manager import get_student_profile, is_database_loaded
+from model_registry import current_model_paths, get_current_model
+from pipeline_manifest import is_stage_fresh, record_stage, snapshot_inputs
+from prerequisite_graph import load_prerequisite_graph, passed_subjects
+
 
 def get_project_root():
     """Tìm thư mục gốc dự án"""
@@ -24,6 +30,12 @@ DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
 MODELS_DIR = PROJECT_ROOT / 'models'
 CONFIG_DIR = PROJECT_ROOT / 'config'
 
+# Mức ưu tiên thêm (trừ vào AI Score khi xếp hạng) cho môn là tiên quyết của nhiều môn khác
+PREREQUISITE_WEIGHT = 0.1
+
+# Các cột của bảng recommendations (dùng khi không có gợi ý nào để vẫn ghi được file rỗng)
+RECOMMENDATION_COLUMNS = ['student_id', 'subject_code', 'subject_name', 'ai_score', 'priority', 'reason', 'unlocks']
+
 
 def get_output_path(filename: str) -> Path:
     """Lấy đường dẫn file output"""
@@ -32,20 +44,11 @@ def get_output_path(filename: str) -> Path:
 
 
 def load_model():
-    """Tải mô hình đã huấn luyện"""
-    model_path = MODELS_DIR / 'ai_model.pkl'
-    feature_info_path = MODELS_DIR / 'feature_info.json'
-    
-    if not model_path.exists():
+    """Tải mô hình đang dùng từ registry"""
+    model, feature_info = get_current_model()
+    if model is None:
         print("❌ Mô hình chưa được huấn luyện!")
         print("   Vui lòng chạy ai_model.py trước!")
-        return None, None
-    
-    model = joblib.load(model_path)
-    
-    with open(feature_info_path, 'r', encoding='utf-8') as f:
-        feature_info = json.load(f)
-    
     return model, feature_info
 
 
@@ -69,6 +72,39 @@ def predict_ai_scores(student_id: Optional[str] = None):
     return calculate_ai_scores(student_id)
 
 
+def _apply_prerequisites(student_id: str, scores_df: pd.DataFrame):
+    """
+    Bỏ các môn chưa đủ môn tiên quyết (theo các môn học sinh đã qua) và tính điểm xếp hạng:
+    rank_score = ai_score - PREREQUISITE_WEIGHT * (số môn phụ thuộc / số môn phụ thuộc lớn nhất)
+
+    Returns:
+        scores_df đã lọc, thêm cột unlocks và rank_score
+    """
+    scores_df = scores_df.assign(unlocks=0, rank_score=scores_df['ai_score'])
+    graph = load_prerequisite_graph()
+    if graph is None:
+        return scores_df
+
+    from feature_engineering import load_student_raw_data
+
+    grades_df, _ = load_student_raw_data(student_id)
+    passed = graph.passed_mask(passed_subjects(grades_df))
+    codes = scores_df['subject_code'].astype(str)
+    unlocked = np.array([graph.is_unlocked(code, passed) for code in codes], dtype=bool)
+    if not unlocked.all():
+        locked = codes[~unlocked].tolist()
+        print(f"🔒 Bỏ {len(locked)} môn chưa đủ môn tiên quyết: {', '.join(locked[:5])}")
+    scores_df = scores_df[unlocked]
+
+    unlocks = np.array([graph.unlock_count(code) for code in scores_df['subject_code'].astype(str)], dtype=float)
+    max_unlocks = max(float(graph.unlock_counts.max()), 1.0) if len(graph.codes) else 1.0
+    scores_df = scores_df.assign(
+        unlocks=unlocks.astype(int),
+        rank_score=scores_df['ai_score'] - PREREQUISITE_WEIGHT * unlocks / max_unlocks
+    )
+    return scores_df
+
+
 def generate_recommendations(student_id: str, top_n: int = 10) -> List[Dict]:
     """
     Tạo gợi ý học tập cá nhân hóa cho một sinh viên.
@@ -76,6 +112,8 @@ def generate_recommendations(student_id: str, top_n: int = 10) -> List[Dict]:
     Chiến lược hiện tại:
     - Tập trung vào các môn có AI Score THẤP / CHƯA CAO
       để học sinh ưu tiên cải thiện ở kỳ tiếp theo.
+    - Bỏ các môn chưa đủ môn tiên quyết; ưu tiên môn là tiên quyết của nhiều môn khác
+      (prerequisite_graph.py).
     """
     print(f"🎯 Tạo gợi ý học tập cho sinh viên: {student_id}")
     
@@ -84,16 +122,25 @@ def generate_recommendations(student_id: str, top_n: int = 10) -> List[Dict]:
     if scores_df is None or scores_df.empty:
         return []
     
-    # Lấy các môn có AI Score thấp hơn để ưu tiên cải thiện
-    # Sắp xếp tăng dần theo ai_score và chọn top_n đầu tiên
-    scores_df = scores_df.sort_values('ai_score', ascending=True)
+    # Lọc và xếp hạng theo đồ thị môn tiên quyết
+    scores_df = _apply_prerequisites(student_id, scores_df)
+    if scores_df.empty:
+        return []
+
+    # Lấy các môn có AI Score thấp hơn để ưu tiên cải thiện (môn mở khóa nhiều môn khác
+    # được ưu tiên hơn); sắp xếp tăng dần theo điểm xếp hạng và chọn top_n đầu tiên
+    scores_df = scores_df.sort_values('rank_score', ascending=True)
     top_subjects = scores_df.head(top_n)
     
-    # Đọc hồ sơ sinh viên
-    profiles_path = get_output_path('student_profiles_cleaned.csv')
+    # Đọc hồ sơ sinh viên (tra cứu theo khóa trong database nếu đã nạp, tránh đọc cả file hồ sơ)
     career_path = None
-    if profiles_path.exists():
-        profiles_df = pd.read_csv(profiles_path)
+    if is_database_loaded():
+        student_profile = get_student_profile(student_id)
+        if student_profile:
+            career_path = student_profile.get('career_path')
+    elif dataset_exists('student_profiles_cleaned'):
+        profiles_df = load_dataset('student_profiles_cleaned', columns=['student_id', 'career_path'],
+                                   missing='ignore')
         student_profile = profiles_df[profiles_df['student_id'] == student_id]
         if not student_profile.empty:
             career_path = student_profile.iloc[0].get('career_path')
@@ -125,6 +172,11 @@ def generate_recommendations(student_id: str, top_n: int = 10) -> List[Dict]:
             )
         }
         
+        unlocks = int(row['unlocks'])
+        if unlocks:
+            rec['unlocks'] = unlocks
+            rec['reason'] += f"; là môn tiên quyết của {unlocks} môn khác"
+        
         # Thêm lý do dựa trên career path nếu có
         if career_path and learning_paths:
             career_info = learning_paths.get('career_paths', {}).get(career_path.lower(), {})
@@ -136,33 +188,51 @@ def generate_recommendations(student_id: str, top_n: int = 10) -> List[Dict]:
     return recommendations
 
 
-def save_recommendations(recommendations: List[Dict], output_file: str = 'recommendations.csv'):
-    """Lưu gợi ý vào file CSV"""
+def save_recommendations(recommendations: List[Dict], output_file: str = 'recommendations'):
+    """Lưu gợi ý vào kho dữ liệu output (không có gợi ý thì ghi bảng rỗng thay cho kết quả cũ)"""
     if not recommendations:
-        print("⚠️  Không có gợi ý để lưu")
-        return
+        print("⚠️  Không có gợi ý nào, ghi bảng gợi ý rỗng")
     
-    df = pd.DataFrame(recommendations)
-    output_path = get_output_path(output_file)
-    df.to_csv(output_path, index=False, encoding='utf-8')
+    df = pd.DataFrame(recommendations).reindex(columns=RECOMMENDATION_COLUMNS)
+    output_path = save_dataset(df, Path(output_file).stem)
     print(f"✅ Đã lưu {len(recommendations)} gợi ý vào: {output_path}")
 
 
-def save_ai_scores(scores_df: pd.DataFrame, output_file: str = 'ai_scores.csv'):
-    """Lưu AI Score vào file CSV"""
+def save_ai_scores(scores_df: pd.DataFrame, output_file: str = 'ai_scores'):
+    """Lưu AI Score vào kho dữ liệu output"""
     if scores_df is None or scores_df.empty:
         print("⚠️  Không có dữ liệu AI Score để lưu")
         return
     
-    output_path = get_output_path(output_file)
-    scores_df.to_csv(output_path, index=False, encoding='utf-8')
+    output_path = save_dataset(scores_df, Path(output_file).stem)
     print(f"✅ Đã lưu {len(scores_df)} bản ghi AI Score vào: {output_path}")
 
 
-def process_all_students():
-    """Xử lý gợi ý cho tất cả sinh viên"""
+def process_all_students(force: bool = False):
+    """
+    Xử lý gợi ý cho tất cả sinh viên
+
+    Args:
+        force: Tạo lại gợi ý kể cả khi features, mô hình và hồ sơ không thay đổi
+    """
     print("🔄 Xử lý gợi ý cho tất cả sinh viên...")
     
+    stage_inputs = [
+        find_dataset('features'),
+        *current_model_paths(),
+        find_dataset('student_profiles_cleaned'),
+        # Môn đã qua và đồ thị môn tiên quyết dùng để lọc/xếp hạng gợi ý
+        find_dataset('grades_cleaned'),
+        find_dataset('subjects_cleaned'),
+        CONFIG_DIR / 'learning_paths.json',
+    ]
+    stage_outputs = [dataset_path('ai_scores'), dataset_path('recommendations')]
+    stage_params = {'format': get_storage_format()}
+    if not force and is_stage_fresh('recommendations', stage_inputs, stage_outputs, stage_params):
+        print("⏭️  Bỏ qua tạo gợi ý (dữ liệu và mô hình không thay đổi)")
+        return
+    input_snapshot = snapshot_inputs(stage_inputs)
+    
     # Tính AI Score cho tất cả
     scores_df = predict_ai_scores()
     if scores_df is not None:
@@ -177,9 +247,9 @@ def process_all_students():
             recommendations = generate_recommendations(student_id, top_n=10)
             all_recommendations.extend(recommendations)
         
-        if all_recommendations:
-            save_recommendations(all_recommendations)
+        save_recommendations(all_recommendations)
     
+    record_stage('recommendations', input_snapshot, stage_outputs, stage_params)
     print("✅ Hoàn thành xử lý gợi ý!")
 
 
@@ -189,7 +259,7 @@ if __name__ == '__main__':
     if len(sys.argv) > 1:
         student_id = sys.argv[1]
         recommendations = generate_recommendations(student_id)
-        save_recommendations(recommendations, f'recommendations_{student_id}.csv')
+        save_recommendations(recommendations, f'recommendations_{student_id}')
     else:
         process_all_students()
 
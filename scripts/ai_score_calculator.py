@@ -11,6 +11,11 @@ import joblib
 import numpy as np
 from typing import Dict, List, Optional, Tuple
 
+from data_store import dataset_exists, load_dataset
+from feature_store import load_features_for_student
+from feature_transformer import build_model_matrix
+from model_registry import get_serving_model
+
 
 def get_project_root():
     """Tìm thư mục gốc dự án"""
@@ -32,19 +37,13 @@ def get_output_path(filename: str) -> Path:
 
 
 def load_model():
-    """Tải mô hình đã huấn luyện"""
-    model_path = MODELS_DIR / 'ai_model.pkl'
-    feature_info_path = MODELS_DIR / 'feature_info.json'
-    
-    if not model_path.exists():
-        return None, None
-    
-    model = joblib.load(model_path)
-    
-    with open(feature_info_path, 'r', encoding='utf-8') as f:
-        feature_info = json.load(f)
-    
-    return model, feature_info
+    """
+    Tải mô hình đang dùng từ registry (giữ trong bộ nhớ, tự nạp lại khi có phiên bản mới)
+
+    Returns:
+        model_registry.LoadedModel (feature_info, predict) hoặc None nếu chưa có mô hình
+    """
+    return get_serving_model()
 
 
 def _filter_latest_term(df: pd.DataFrame) -> pd.DataFrame:
@@ -76,36 +75,57 @@ def _filter_latest_term(df: pd.DataFrame) -> pd.DataFrame:
     return latest_rows
 
 
+def _load_feature_rows(columns: List[str], student_id: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Đọc các dòng features cần để dự đoán.
+    Với một học sinh: tra cứu trong kho features SQLite theo index student_id (không đọc
+    toàn bộ file features); nếu kho chưa được tạo thì đọc file features rồi lọc.
+    """
+    if student_id:
+        df = load_features_for_student(student_id, columns=columns)
+        if df is not None:
+            return df
+
+    if not dataset_exists('features'):
+        print("❌ File features không tồn tại!")
+        return None
+
+    df = load_dataset('features', columns=columns, missing='ignore')
+    if student_id:
+        df = df[df['student_id'] == student_id]
+    return df
+
+
 def calculate_ai_scores(student_id: Optional[str] = None) -> Optional[pd.DataFrame]:
     """
     Tính điểm phù hợp (AI Score) cho tất cả sinh viên hoặc một sinh viên cụ thể
     Dữ liệu dùng để tính được lọc theo *học kỳ gần nhất* của từng học sinh
     (hiểu là gợi ý cho kỳ tiếp theo).
+    Khi chỉ tính cho một sinh viên, features được đọc từ kho features theo student_id
+    nên thời gian xử lý không tăng theo tổng số sinh viên.
     
     Returns:
         DataFrame với columns: student_id, subject_code, subject_name, ai_score
         (nếu có) sẽ giữ thêm các cột year, semester để tham chiếu
     """
     # Tải mô hình
-    model, feature_info = load_model()
+    model = load_model()
     if model is None:
         print("❌ Mô hình chưa được huấn luyện!")
         return None
     
-    # Đọc dữ liệu features
-    features_path = get_output_path('features.csv')
-    if not features_path.exists():
-        print("❌ File features.csv không tồn tại!")
+    # Đọc dữ liệu features (chỉ các cột cần cho dự đoán và kết quả)
+    feature_info = model.feature_info
+    feature_cols = feature_info['features']
+    hashed_text = feature_info.get('hashed_text')
+    hashed_cols = hashed_text['columns'] if hashed_text else []
+    key_cols = ['student_id', 'subject_code', 'subject_name', 'year', 'semester']
+    df = _load_feature_rows(list(dict.fromkeys(key_cols + feature_cols + hashed_cols)), student_id)
+    if df is None:
+        return None
+    if student_id and df.empty:
+        print(f"❌ Không tìm thấy sinh viên: {student_id}")
         return None
-    
-    df = pd.read_csv(features_path)
-
-    # Lọc theo student_id nếu có
-    if student_id:
-        df = df[df['student_id'] == student_id]
-        if df.empty:
-            print(f"❌ Không tìm thấy sinh viên: {student_id}")
-            return None
 
     # Lọc theo học kỳ gần nhất cho từng học sinh
     df = _filter_latest_term(df)
@@ -113,11 +133,11 @@ def calculate_ai_scores(student_id: Optional[str] = None) -> Optional[pd.DataFra
         print("❌ Không còn dữ liệu sau khi lọc theo học kỳ gần nhất")
         return None
 
-    # Lấy các đặc trưng
-    feature_cols = feature_info['features']
-    X = df[feature_cols].fillna(0)
+    # Lấy các đặc trưng (kèm các cột văn bản mã hóa băm nếu mô hình được huấn luyện với chúng)
+    X = build_model_matrix(df, feature_cols, hashed_text)
     
     # Dự đoán AI Score
+    # Một học sinh (vài dòng): dùng rừng cây gọn, không qua sklearn
     predictions = model.predict(X)
     
     # Tạo DataFrame kết quả
@@ -0,0 +1,141 @@
+"""
+So sánh các loại mô hình AI Score (model_engines.py) trên cùng file features và cùng cách chia
+train/test như train_model: thời gian huấn luyện, độ trễ dự đoán (cả lô và từng dòng như khi
+phục vụ web), kích thước mô hình và độ chính xác.
+
+Ví dụ:
+    python scripts/benchmark_models.py
+    python scripts/benchmark_models.py --engines RandomForestRegressor HistGradientBoostingRegressor
+
+Với dữ liệu tổng hợp lớn: tạo features trong một thư mục làm việc riêng rồi chạy benchmark ở đó
+    python scripts/benchmark_pipeline.py --size 100k --workspace /tmp/spcn --keep-workspace \\
+        --stages process_all_data load_database feedback_features create_features
+    python /tmp/spcn/scripts/benchmark_models.py
+"""
+
+import argparse
+import io
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from ai_model import load_config, prepare_training_data
+from benchmark_pipeline import _environment, _git_commit, save_report
+from data_store import dataset_exists
+from model_engines import ENGINES, get_engine, predict
+from model_evaluation import split_train_test
+
+# Số dòng dùng để đo độ trễ dự đoán từng dòng
+LATENCY_ROWS = 200
+
+
+def _model_size_mb(model) -> float:
+    buffer = io.BytesIO()
+    joblib.dump(model, buffer)
+    return buffer.tell() / 1024 ** 2
+
+
+def _row_latency_ms(model, X, n_rows: int) -> float:
+    """Trung vị thời gian dự đoán một dòng (gồm cả bước chuyển ma trận như khi phục vụ web)"""
+    timings = []
+    for i in range(min(n_rows, X.shape[0])):
+        start = time.perf_counter()
+        predict(model, X[i:i + 1])
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000
+
+
+def benchmark_engine(name: str, model_config: Dict, X_train, X_test, y_train, y_test,
+                     latency_rows: int = LATENCY_ROWS) -> Dict:
+    """Huấn luyện và đo một loại mô hình"""
+    engine = get_engine(name)
+    params = engine.params_from_config(model_config)
+
+    start = time.perf_counter()
+    X_fit = engine.prepare(X_train)
+    prepare_seconds = time.perf_counter() - start
+    model = engine.build(params, n_jobs=-1)
+    start = time.perf_counter()
+    model.fit(X_fit, y_train)
+    fit_seconds = time.perf_counter() - start
+    engine.for_serving(model)
+
+    start = time.perf_counter()
+    y_pred = predict(model, X_test)
+    batch_seconds = time.perf_counter() - start
+    return {
+        'params': params,
+        'prepare_seconds': round(prepare_seconds, 3),
+        'fit_seconds': round(fit_seconds, 3),
+        'predict_batch_seconds': round(batch_seconds, 4),
+        'predict_us_per_row': round(batch_seconds / max(len(y_test), 1) * 1e6, 3),
+        'predict_row_latency_ms': round(_row_latency_ms(model, X_test, latency_rows), 3),
+        'model_size_mb': round(_model_size_mb(model), 3),
+        'train_r2': float(r2_score(y_train, predict(model, X_train))),
+        'test_r2': float(r2_score(y_test, y_pred)),
+        'test_mae': float(mean_absolute_error(y_test, y_pred)),
+        'test_rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+    }
+
+
+def run_model_benchmark(engines: List[str], latency_rows: int = LATENCY_ROWS) -> Optional[Dict]:
+    """Chạy benchmark các loại mô hình trên file features của dự án; trả về báo cáo"""
+    if not dataset_exists('features'):
+        print("❌ File features không tồn tại!")
+        print("   Vui lòng chạy feature_engineering.py trước!")
+        return None
+
+    config = load_config()
+    model_config = config.get('model', {})
+    data = prepare_training_data(config)
+    # Cùng cách chia với train_model
+    X_train, X_test, y_train, y_test = split_train_test(data['X'], data['y'], data['groups'])
+
+    results = {}
+    for name in engines:
+        print(f"⏱️  {name}...")
+        results[name] = benchmark_engine(name, model_config, X_train, X_test, y_train, y_test, latency_rows)
+        result = results[name]
+        print(f"   fit {result['fit_seconds']:.2f}s, R² {result['test_r2']:.4f}")
+
+    return {
+        'label': f"models_{len(data['y'])}",
+        'rows': int(len(data['y'])),
+        'n_features': int(data['X'].shape[1]),
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'git_commit': _git_commit(),
+        'environment': _environment(),
+        'engines': results,
+    }
+
+
+def print_report(report: Dict):
+    """In bảng so sánh các loại mô hình"""
+    print(f"\n📊 {report['rows']} dòng, {report['n_features']} đặc trưng")
+    print(f"{'Mô hình':<32}{'Fit (s)':>10}{'Lô (µs/dòng)':>14}{'1 dòng (ms)':>13}"
+          f"{'MB':>9}{'Test R²':>10}{'MAE':>9}")
+    for name, result in report['engines'].items():
+        print(f"{name:<32}{result['fit_seconds']:>10.2f}{result['predict_us_per_row']:>14.2f}"
+              f"{result['predict_row_latency_ms']:>13.3f}{result['model_size_mb']:>9.2f}"
+              f"{result['test_r2']:>10.4f}{result['test_mae']:>9.4f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='So sánh các loại mô hình AI Score')
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES),
+                        help='Các loại mô hình cần so sánh (mặc định: tất cả)')
+    parser.add_argument('--latency-rows', type=int, default=LATENCY_ROWS,
+                        help='Số dòng dùng để đo độ trễ dự đoán từng dòng')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='File báo cáo JSON (mặc định: data/output/benchmarks/)')
+    args = parser.parse_args()
+
+    report = run_model_benchmark(args.engines, args.latency_rows)
+    if report is not None:
+        print_report(report)
+        print(f"📄 Báo cáo: {save_report(report, args.output)}")
@@ -0,0 +1,523 @@
+"""
+Benchmark toàn bộ pipeline với dữ liệu tổng hợp
+1. Sinh dữ liệu giả lập (vector hóa) cho subjects.csv, grades.csv, teacher_feedback.csv,
+   student_profile.csv với số học sinh tùy chọn (1k, 100k, 1m hoặc tự chọn)
+2. Chạy từng bước pipeline trong một process riêng trên thư mục làm việc tạm
+   (bản sao scripts/ và config/), đo thời gian, CPU và bộ nhớ đỉnh của từng bước
+3. Ghi báo cáo JSON vào data/output/benchmarks/ và so sánh với báo cáo trước (--compare)
+
+Ví dụ:
+    python scripts/benchmark_pipeline.py --size 1k
+    python scripts/benchmark_pipeline.py --size 100k --chunksize 200000 --workers 4
+    python scripts/benchmark_pipeline.py --size 1k --compare data/output/benchmarks/benchmark_1k_20250101-120000.json
+"""
+
+import argparse
+import json
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+SCRIPTS_DIR = PROJECT_ROOT / 'scripts'
+CONFIG_DIR = PROJECT_ROOT / 'config'
+BENCHMARK_DIR = PROJECT_ROOT / 'data' / 'output' / 'benchmarks'
+
+# Số học sinh theo kích thước có sẵn
+SIZES = {
+    '1k': 1_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+# Số học sinh mỗi lô khi sinh dữ liệu (giới hạn bộ nhớ khi sinh 1m học sinh)
+GENERATE_BATCH_STUDENTS = 100_000
+
+# Dòng kết quả của process con được đánh dấu bằng tiền tố này
+RESULT_PREFIX = 'BENCHMARK_RESULT '
+
+# Chênh lệch thời gian/bộ nhớ (tỷ lệ) được coi là suy giảm khi so sánh báo cáo
+REGRESSION_THRESHOLD = 1.2
+
+
+# ===== Sinh dữ liệu giả lập =====
+
+BASE_SUBJECTS = [
+    ('TOAN', 'Toán học', 'Lõi', 3, 'Medium'),
+    ('VAN', 'Ngữ văn', 'Lõi', 3, 'Medium'),
+    ('ANH', 'Tiếng Anh', 'Lõi', 3, 'Medium'),
+    ('LY', 'Vật lý', 'Tự nhiên', 2, 'Medium'),
+    ('HOA', 'Hóa học', 'Tự nhiên', 2, 'Hard'),
+    ('SINH', 'Sinh học', 'Tự nhiên', 2, 'Medium'),
+    ('SU', 'Lịch sử', 'Xã hội', 2, 'Medium'),
+    ('DIA', 'Địa lý', 'Xã hội', 2, 'Medium'),
+    ('GDCD', 'Giáo dục công dân', 'Kỹ năng', 1, 'Easy'),
+    ('TIN', 'Tin học', 'Công nghệ', 2, 'Medium'),
+    ('CN', 'Công nghệ', 'Công nghệ', 2, 'Medium'),
+    ('TD', 'Thể dục', 'Thể chất', 1, 'Easy'),
+    ('QP', 'Giáo dục quốc phòng và an ninh', 'Thể chất', 1, 'Easy'),
+    ('NHAC', 'Âm nhạc', 'Ngữ nghệ', 1, 'Easy'),
+    ('MY', 'Mỹ thuật', 'Ngữ nghệ', 1, 'Easy'),
+]
+CATEGORIES = ['Lõi', 'Tự nhiên', 'Xã hội', 'Công nghệ', 'Ngữ nghệ', 'Kỹ năng']
+DIFFICULTIES = np.array(['Easy', 'Medium', 'Hard'])
+DIFFICULTY_PENALTY = {'Easy': -0.5, 'Medium': 0.0, 'Hard': 0.8}
+
+FAMILY_NAMES = np.array(['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Huỳnh', 'Phan', 'Vũ', 'Võ', 'Đặng'])
+GIVEN_NAMES = np.array(['An', 'Bình', 'Chi', 'Dũng', 'Giang', 'Hà', 'Khánh', 'Linh', 'Minh', 'Nam',
+                        'Phương', 'Quân', 'Thảo', 'Trang', 'Tuấn', 'Vy'])
+MAJORS = np.array(['Mathematics', 'Physics', 'Chemistry', 'Biology', 'Literature',
+                   'History', 'Economics', 'Computer Science'])
+# Định hướng nghề nghiệp tương ứng với từng ngành (cùng thứ tự với MAJORS)
+MAJOR_CAREERS = np.array(['engineering', 'engineering', 'engineering', 'engineering', 'arts',
+                          'arts', 'business', 'engineering'])
+CAREERS = np.array(['engineering', 'business', 'arts'])
+LEARNING_STYLES = np.array(['Visual', 'Auditory', 'Reading/Writing', 'Kinesthetic', 'Mixed'])
+INTERESTS = np.array(['Công nghệ, học tập', 'Khoa học, thí nghiệm', 'Văn học, đọc sách',
+                      'Kinh doanh, tài chính', 'Nghệ thuật, thiết kế', 'Thể thao, âm nhạc'])
+GOALS = np.array(['Cải thiện kết quả học tập', 'Thi đỗ đại học', 'Đạt học bổng',
+                  'Phát triển kỹ năng mềm', 'Chuẩn bị cho nghề nghiệp'])
+STRENGTHS = np.array(['Năng lực tốt, thái độ tích cực', 'Tư duy logic tốt', 'Chăm chỉ, cẩn thận',
+                      'Tích cực phát biểu', 'Làm bài tập đầy đủ'])
+IMPROVEMENTS = np.array(['Tiếp tục luyện tập và ôn bài', 'Cần tập trung hơn trong giờ học',
+                         'Cần cải thiện kỹ năng trình bày', 'Nên làm thêm bài tập nâng cao',
+                         'Cần đi học đầy đủ hơn'])
+COMMENTS = np.array(['Cần cố gắng nhiều hơn', 'Kết quả khá', 'Kết quả tốt', 'Xuất sắc'])
+
+# Các học kỳ được sinh: (học kỳ, năm học)
+TERMS = [(1, 2023), (2, 2023), (1, 2024), (2, 2024)]
+
+
+def _prefixed_ids(prefix: str, numbers: np.ndarray, width: int) -> np.ndarray:
+    """Sinh mã dạng HS0000001 cho cả mảng (không lặp Python)"""
+    return np.char.add(prefix, np.char.zfill(numbers.astype(str), width))
+
+
+def generate_subjects(n_subjects: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Môn học: các môn cơ bản + môn tự chọn tổng hợp, một số môn có môn tiên quyết"""
+    base = pd.DataFrame(BASE_SUBJECTS, columns=['subject_code', 'subject_name', 'category',
+                                                'credits', 'difficulty_level'])
+    base['prerequisites'] = ''
+    n_extra = max(n_subjects - len(base), 0)
+    if n_extra == 0:
+        return base.head(n_subjects)
+
+    codes = _prefixed_ids('TC', np.arange(1, n_extra + 1), 3)
+    all_codes = np.concatenate([base['subject_code'].to_numpy(), codes])
+    # Môn tiên quyết luôn là một môn đứng trước trong danh sách (không tạo chu trình)
+    has_prereq = rng.random(n_extra) < 0.4
+    prereq_index = (rng.random(n_extra) * (len(base) + np.arange(n_extra))).astype(int)
+    extra = pd.DataFrame({
+        'subject_code': codes,
+        'subject_name': np.char.add('Chuyên đề ', codes),
+        'category': rng.choice(CATEGORIES, n_extra),
+        'credits': rng.integers(1, 4, n_extra),
+        'difficulty_level': rng.choice(DIFFICULTIES, n_extra, p=[0.3, 0.5, 0.2]),
+        'prerequisites': np.where(has_prereq, all_codes[prereq_index], ''),
+    })
+    return pd.concat([base, extra], ignore_index=True)
+
+
+def generate_profiles(first_id: int, n_students: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Hồ sơ học sinh cho một lô mã học sinh liên tiếp"""
+    major_index = rng.integers(0, len(MAJORS), n_students)
+    # 80% học sinh có định hướng khớp với ngành, còn lại ngẫu nhiên
+    careers = np.where(rng.random(n_students) < 0.8, MAJOR_CAREERS[major_index],
+                       rng.choice(CAREERS, n_students))
+    names = np.char.add(np.char.add(rng.choice(FAMILY_NAMES, n_students), ' '),
+                        rng.choice(GIVEN_NAMES, n_students))
+    return pd.DataFrame({
+        'student_id': _prefixed_ids('HS', np.arange(first_id, first_id + n_students), 7),
+        'name': names,
+        'major': MAJORS[major_index],
+        'career_path': careers,
+        'learning_style': rng.choice(LEARNING_STYLES, n_students),
+        'interests': rng.choice(INTERESTS, n_students),
+        'goals': rng.choice(GOALS, n_students),
+    })
+
+
+def generate_grades(student_ids: np.ndarray, subjects: pd.DataFrame, grades_per_student: int,
+                    rng: np.random.Generator, duplicate_rate: float, invalid_rate: float) -> pd.DataFrame:
+    """
+    Điểm số: mỗi học sinh có năng lực riêng, mỗi môn có độ khó riêng.
+    Một phần nhỏ dòng bị lặp lại (upload trùng) hoặc không hợp lệ để kiểm tra các bước làm sạch.
+    """
+    n_students = len(student_ids)
+    n_rows = n_students * grades_per_student
+    student_index = np.repeat(np.arange(n_students), grades_per_student)
+    subject_index = rng.integers(0, len(subjects), n_rows)
+    term_index = np.tile(np.arange(grades_per_student) % len(TERMS), n_students)
+
+    ability = rng.normal(7.0, 1.2, n_students)
+    penalty = subjects['difficulty_level'].map(DIFFICULTY_PENALTY).to_numpy()
+    grade = np.clip(ability[student_index] - penalty[subject_index] + rng.normal(0, 0.8, n_rows), 0, 10)
+    diligence = (ability[student_index] - 7.0) * 0.04
+    attendance = np.clip(0.88 + diligence + rng.normal(0, 0.05, n_rows), 0, 1)
+    homework = np.clip(0.85 + diligence + rng.normal(0, 0.07, n_rows), 0, 1)
+    terms = np.array(TERMS)
+
+    grades = pd.DataFrame({
+        'student_id': student_ids[student_index],
+        'subject_code': subjects['subject_code'].to_numpy()[subject_index],
+        'grade_score': grade.round(1),
+        'attendance_rate': attendance.round(2),
+        'homework_completion': homework.round(2),
+        'semester': terms[term_index, 0],
+        'year': terms[term_index, 1],
+    })
+
+    n_invalid = int(n_rows * invalid_rate)
+    if n_invalid:
+        invalid_rows = rng.choice(n_rows, n_invalid, replace=False)
+        grades.loc[invalid_rows, 'grade_score'] = rng.choice([-1.0, 11.0, np.nan], n_invalid)
+
+    n_duplicates = int(n_rows * duplicate_rate)
+    if n_duplicates:
+        duplicates = grades.iloc[rng.choice(n_rows, n_duplicates, replace=False)].copy()
+        duplicates['grade_score'] = np.clip(duplicates['grade_score'] + 0.5, 0, 10)
+        grades = pd.concat([grades, duplicates], ignore_index=True)
+    return grades
+
+
+def generate_feedback(grades: pd.DataFrame, feedback_rate: float, rng: np.random.Generator) -> pd.DataFrame:
+    """Nhận xét của giáo viên cho một phần các bản ghi điểm"""
+    sample = grades[rng.random(len(grades)) < feedback_rate]
+    n_rows = len(sample)
+    band = np.digitize(sample['grade_score'].fillna(0).to_numpy(), [5.0, 7.0, 8.5])
+    return pd.DataFrame({
+        'student_id': sample['student_id'].to_numpy(),
+        'subject_code': sample['subject_code'].to_numpy(),
+        'teacher_id': _prefixed_ids('GV', rng.integers(1, 500, n_rows), 4),
+        'comment': COMMENTS[band],
+        'strengths': rng.choice(STRENGTHS, n_rows),
+        'improvements': rng.choice(IMPROVEMENTS, n_rows),
+        'semester': sample['semester'].to_numpy(),
+    })
+
+
+def generate_dataset(input_dir: Path, n_students: int, grades_per_student: int = 8,
+                     n_subjects: int = 40, feedback_rate: float = 0.3,
+                     duplicate_rate: float = 0.01, invalid_rate: float = 0.001,
+                     seed: int = 42) -> Dict[str, int]:
+    """
+    Sinh các file CSV đầu vào vào input_dir theo lô học sinh.
+    Trả về số dòng của từng file.
+    """
+    rng = np.random.default_rng(seed)
+    input_dir.mkdir(parents=True, exist_ok=True)
+
+    subjects = generate_subjects(n_subjects, rng)
+    subjects.to_csv(input_dir / 'subjects.csv', index=False, encoding='utf-8')
+    rows = {'subjects.csv': len(subjects), 'grades.csv': 0,
+            'teacher_feedback.csv': 0, 'student_profile.csv': 0}
+
+    for first in range(0, n_students, GENERATE_BATCH_STUDENTS):
+        batch_size = min(GENERATE_BATCH_STUDENTS, n_students - first)
+        profiles = generate_profiles(first + 1, batch_size, rng)
+        grades = generate_grades(profiles['student_id'].to_numpy(), subjects, grades_per_student,
+                                 rng, duplicate_rate, invalid_rate)
+        feedback = generate_feedback(grades, feedback_rate, rng)
+        for filename, df in (('student_profile.csv', profiles), ('grades.csv', grades),
+                             ('teacher_feedback.csv', feedback)):
+            df.to_csv(input_dir / filename, mode='a' if first else 'w', header=not first,
+                      index=False, encoding='utf-8')
+            rows[filename] += len(df)
+    return rows
+
+
+# ===== Chạy và đo từng bước pipeline =====
+
+def _run_process_all_data(options: Dict):
+    from data_processor import process_all_data
+    process_all_data(chunksize=options.get('chunksize'), force=True, workers=options.get('workers', 1))
+
+
+def _run_load_database(options: Dict):
+    from database_manager import load_cleaned_data
+    load_cleaned_data(force=True)
+
+
+def _run_feedback_features(options: Dict):
+    from feedback_features import build_feedback_features
+    build_feedback_features(force=True)
+
+
+def _run_create_features(options: Dict):
+    from feature_engineering import create_features
+    create_features(force=True)
+
+
+def _run_train_model(options: Dict):
+    from ai_model import train_model
+    if train_model(force=True) is None:
+        raise RuntimeError('Không thể huấn luyện mô hình')
+
+
+def _run_process_all_students(options: Dict):
+    from ai_recommender import process_all_students
+    process_all_students(force=True)
+
+
+# Các bước theo đúng thứ tự của run_full_pipeline
+STAGES = {
+    'process_all_data': _run_process_all_data,
+    'load_database': _run_load_database,
+    'feedback_features': _run_feedback_features,
+    'create_features': _run_create_features,
+    'train_model': _run_train_model,
+    'process_all_students': _run_process_all_students,
+}
+
+
+def run_stage(stage: str, options: Dict, trace_memory: bool = False) -> Dict:
+    """
+    Chạy một bước trong process hiện tại và đo: thời gian thực, thời gian CPU,
+    bộ nhớ đỉnh của process (RSS) và (tùy chọn) bộ nhớ đỉnh do Python cấp phát (tracemalloc).
+    """
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    STAGES[stage](options)
+    result = {
+        'seconds': round(time.perf_counter() - wall_start, 3),
+        'cpu_seconds': round(time.process_time() - cpu_start, 3),
+        # ru_maxrss tính bằng KB trên Linux, byte trên macOS
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                             / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    }
+    if trace_memory:
+        result['tracemalloc_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+        tracemalloc.stop()
+    return result
+
+
+def prepare_workspace(workspace: Path, storage_format: Optional[str] = None):
+    """Tạo thư mục làm việc: bản sao scripts/ và config/, thư mục data/ trống"""
+    shutil.copytree(SCRIPTS_DIR, workspace / 'scripts',
+                    ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+    shutil.copytree(CONFIG_DIR, workspace / 'config')
+    (workspace / 'data' / 'input').mkdir(parents=True, exist_ok=True)
+    (workspace / 'data' / 'output').mkdir(parents=True, exist_ok=True)
+    if storage_format:
+        config_path = workspace / 'config' / 'model_config.json'
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        config.setdefault('storage', {})['format'] = storage_format
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, indent=2, ensure_ascii=False)
+
+
+def run_stage_subprocess(workspace: Path, stage: str, options: Dict, trace_memory: bool,
+                         timeout: Optional[float]) -> Dict:
+    """Chạy một bước trong process riêng (để bộ nhớ đỉnh của từng bước độc lập nhau)"""
+    command = [
+        sys.executable, str(workspace / 'scripts' / 'benchmark_pipeline.py'),
+        '--run-stage', stage, '--options', json.dumps(options),
+    ]
+    if trace_memory:
+        command.append('--trace-memory')
+
+    log_path = workspace / 'logs' / f'{stage}.log'
+    log_path.parent.mkdir(exist_ok=True)
+    try:
+        completed = subprocess.run(command, cwd=workspace, capture_output=True, text=True,
+                                   encoding='utf-8', timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'status': 'timeout', 'seconds': timeout}
+
+    log_path.write_text(completed.stdout + completed.stderr, encoding='utf-8')
+    for line in reversed(completed.stdout.splitlines()):
+        if line.startswith(RESULT_PREFIX):
+            return {'status': 'ok', **json.loads(line[len(RESULT_PREFIX):])}
+    print(completed.stderr[-2000:] or completed.stdout[-2000:])
+    return {'status': 'failed', 'log': str(log_path)}
+
+
+def _git_commit() -> Optional[str]:
+    """Commit hiện tại của mã nguồn (để biết báo cáo thuộc phiên bản nào)"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _environment() -> Dict[str, str]:
+    import sklearn
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+    }
+
+
+def run_benchmark(n_students: int, label: str, stages: List[str], options: Dict,
+                  grades_per_student: int = 8, storage_format: Optional[str] = None,
+                  trace_memory: bool = False, timeout: Optional[float] = None,
+                  workspace: Optional[Path] = None, keep_workspace: bool = False) -> Dict:
+    """Sinh dữ liệu, chạy các bước và trả về báo cáo"""
+    own_workspace = workspace is None
+    workspace = Path(workspace or tempfile.mkdtemp(prefix='spcn_benchmark_'))
+    print(f"📁 Thư mục làm việc: {workspace}")
+
+    try:
+        prepare_workspace(workspace, storage_format)
+
+        print(f"🔄 Sinh dữ liệu cho {n_students} học sinh...")
+        start = time.perf_counter()
+        rows = generate_dataset(workspace / 'data' / 'input', n_students, grades_per_student)
+        generate_seconds = round(time.perf_counter() - start, 3)
+        print(f"✅ Đã sinh dữ liệu ({generate_seconds:.2f}s): "
+              + ', '.join(f"{name}: {count}" for name, count in rows.items()))
+
+        results = {}
+        failed = False
+        for stage in stages:
+            if failed:
+                results[stage] = {'status': 'skipped'}
+                continue
+            print(f"⏱️  {stage}...")
+            results[stage] = run_stage_subprocess(workspace, stage, options, trace_memory, timeout)
+            result = results[stage]
+            if result['status'] == 'ok':
+                print(f"   {result['seconds']:.2f}s, CPU {result['cpu_seconds']:.2f}s, "
+                      f"RSS đỉnh {result['peak_rss_mb']:.0f} MB")
+            else:
+                print(f"❌ {stage}: {result['status']}")
+                failed = True
+    finally:
+        if own_workspace and not keep_workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        'label': label,
+        'students': n_students,
+        'grades_per_student': grades_per_student,
+        'options': options,
+        'storage_format': storage_format,
+        'created_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'git_commit': _git_commit(),
+        'environment': _environment(),
+        'input_rows': rows,
+        'generate_seconds': generate_seconds,
+        'stages': results,
+        'total_seconds': round(sum(r.get('seconds', 0) for r in results.values() if r['status'] == 'ok'), 3),
+    }
+
+
+def save_report(report: Dict, output: Optional[Path] = None) -> Path:
+    """Ghi báo cáo JSON (mặc định: data/output/benchmarks/benchmark_<kích thước>_<thời gian>.json)"""
+    if output is None:
+        BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+        output = BENCHMARK_DIR / f"benchmark_{report['label']}_{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return output
+
+
+def compare_reports(baseline: Dict, current: Dict) -> bool:
+    """
+    In bảng so sánh thời gian và bộ nhớ từng bước với báo cáo gốc.
+    Trả về True nếu có bước chậm hơn hoặc tốn bộ nhớ hơn REGRESSION_THRESHOLD lần.
+    """
+    print(f"\n📊 So sánh với {baseline.get('git_commit')} ({baseline.get('created_at')})")
+    if baseline.get('students') != current.get('students'):
+        print(f"⚠️  Số học sinh khác nhau: {baseline.get('students')} / {current.get('students')}")
+
+    regressed = False
+    print(f"{'Bước':<24}{'Trước (s)':>12}{'Sau (s)':>12}{'Tỷ lệ':>8}{'RSS trước':>12}{'RSS sau':>10}")
+    for stage, result in current['stages'].items():
+        before = baseline.get('stages', {}).get(stage)
+        if not before or before.get('status') != 'ok' or result.get('status') != 'ok':
+            print(f"{stage:<24}{'-':>12}{result.get('seconds', '-')!s:>12}")
+            continue
+        time_ratio = result['seconds'] / max(before['seconds'], 1e-3)
+        memory_ratio = result['peak_rss_mb'] / max(before['peak_rss_mb'], 1e-3)
+        flag = ''
+        if time_ratio > REGRESSION_THRESHOLD or memory_ratio > REGRESSION_THRESHOLD:
+            flag = ' ⚠️'
+            regressed = True
+        print(f"{stage:<24}{before['seconds']:>12.2f}{result['seconds']:>12.2f}{time_ratio:>8.2f}"
+              f"{before['peak_rss_mb']:>12.0f}{result['peak_rss_mb']:>10.0f}{flag}")
+    return regressed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark pipeline với dữ liệu tổng hợp')
+    parser.add_argument('--size', choices=list(SIZES), default='1k',
+                        help='Số học sinh có sẵn: 1k, 100k, 1m (mặc định: 1k)')
+    parser.add_argument('--students', type=int, default=None,
+                        help='Số học sinh tự chọn (ghi đè --size)')
+    parser.add_argument('--grades-per-student', type=int, default=8,
+                        help='Số bản ghi điểm mỗi học sinh (mặc định: 8)')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES),
+                        help='Các bước cần đo (mặc định: tất cả)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Chế độ streaming cho process_all_data')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Số process làm sạch song song cho process_all_data')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='Định dạng lưu dữ liệu trung gian (mặc định: theo model_config.json)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Đo thêm bộ nhớ đỉnh bằng tracemalloc (chậm hơn đáng kể)')
+    parser.add_argument('--timeout', type=float, default=None,
+                        help='Thời gian tối đa (giây) cho mỗi bước')
+    parser.add_argument('--workspace', type=Path, default=None,
+                        help='Thư mục làm việc (mặc định: thư mục tạm, tự xóa sau khi chạy)')
+    parser.add_argument('--keep-workspace', action='store_true',
+                        help='Giữ lại thư mục làm việc tạm để xem log và dữ liệu')
+    parser.add_argument('--output', type=Path, default=None,
+                        help='Đường dẫn file báo cáo JSON')
+    parser.add_argument('--compare', type=Path, default=None,
+                        help='Báo cáo trước đó để so sánh')
+    # Dùng nội bộ: chạy một bước trong process con
+    parser.add_argument('--run-stage', choices=list(STAGES), help=argparse.SUPPRESS)
+    parser.add_argument('--options', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        result = run_stage(args.run_stage, json.loads(args.options), args.trace_memory)
+        print(RESULT_PREFIX + json.dumps(result))
+        sys.exit(0)
+
+    n_students = args.students or SIZES[args.size]
+    label = args.size if args.students is None else str(args.students)
+    options = {'chunksize': args.chunksize, 'workers': args.workers}
+    report = run_benchmark(n_students, label, args.stages, options,
+                           grades_per_student=args.grades_per_student,
+                           storage_format=args.format, trace_memory=args.trace_memory,
+                           timeout=args.timeout, workspace=args.workspace,
+                           keep_workspace=args.keep_workspace)
+    report_path = save_report(report, args.output)
+    print(f"\n✅ Tổng thời gian: {report['total_seconds']:.2f}s")
+    print(f"📄 Báo cáo: {report_path}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_reports(baseline, report):
+            sys.exit(1)
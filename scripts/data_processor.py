@@ -3,10 +3,20 @@ Xử lý và làm sạch dữ liệu từ các file CSV đầu vào
 Chuẩn hóa dữ liệu: subjects.csv, grades.csv, teacher_feedback.csv, career_path.csv, student_profile.csv
 """
 
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
 import os
 import sys
+import time
+
+from schemas import fill_missing, read_csv_typed
+from data_store import DatasetWriter, dataset_path, get_storage_format, save_dataset
+from data_validator import DatasetValidator, load_rule_actions, reference_inputs
+from pipeline_manifest import is_stage_fresh, record_stage, snapshot_inputs
 
 
 def get_project_root():
@@ -21,6 +31,9 @@ PROJECT_ROOT = get_project_root()
 DATA_INPUT = PROJECT_ROOT / 'data' / 'input'
 DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
 
+# Số dòng mỗi chunk mặc định khi xử lý ở chế độ streaming
+DEFAULT_CHUNK_SIZE = 100_000
+
 
 def get_input_path(filename: str) -> Path:
     """Lấy đường dẫn file input"""
@@ -41,30 +54,50 @@ def load_csv_safe(filename: str) -> pd.DataFrame:
         print(f"   Tạo file mẫu tại: {path}")
         return pd.DataFrame()
     try:
-        return pd.read_csv(path, encoding='utf-8')
+        return read_csv_typed(path, filename)
     except Exception as e:
         print(f"❌ Lỗi đọc file {filename}: {e}")
         return pd.DataFrame()
 
 
+def iter_csv_chunks(filename: str, chunksize: int = DEFAULT_CHUNK_SIZE,
+                    usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Đọc file CSV đầu vào theo từng chunk cố định để giới hạn bộ nhớ.
+    Không yield gì nếu file không tồn tại.
+
+    Args:
+        usecols: Chỉ đọc các cột này (None = toàn bộ)
+    """
+    path = get_input_path(filename)
+    if not path.exists():
+        print(f"⚠️  File không tồn tại: {path}")
+        return
+    yield from read_csv_typed(path, filename, chunksize=chunksize, usecols=usecols)
+
+
 def clean_subjects(df: pd.DataFrame) -> pd.DataFrame:
-    """Làm sạch dữ liệu môn học"""
+    """
+    Làm sạch dữ liệu môn học
+    (mã môn trùng lặp đã được loại ở bước kiểm tra, xem data_validator.py)
+    """
     if df.empty:
         return df
     
-    # Loại bỏ dòng trùng lặp
-    df = df.drop_duplicates(subset=['subject_code'], keep='first')
-    
     # Điền giá trị thiếu
-    df['category'] = df['category'].fillna('General')
+    df['category'] = fill_missing(df['category'], 'General')
     df['credits'] = pd.to_numeric(df['credits'], errors='coerce').fillna(3)
-    df['difficulty_level'] = df['difficulty_level'].fillna('Medium')
+    df['difficulty_level'] = fill_missing(df['difficulty_level'], 'Medium')
     
     return df
 
 
 def clean_grades(df: pd.DataFrame) -> pd.DataFrame:
-    """Làm sạch dữ liệu điểm số"""
+    """
+    Làm sạch dữ liệu điểm số
+    (dòng thiếu khóa đã được loại và ghi vào quarantine, điểm/tỷ lệ ngoài khoảng
+    hợp lệ đã được đưa về [0, 10] / [0, 1] ở bước kiểm tra, xem data_validator.py)
+    """
     if df.empty:
         return df
     
@@ -73,14 +106,6 @@ def clean_grades(df: pd.DataFrame) -> pd.DataFrame:
     df['attendance_rate'] = pd.to_numeric(df['attendance_rate'], errors='coerce')
     df['homework_completion'] = pd.to_numeric(df['homework_completion'], errors='coerce')
     
-    # Chuẩn hóa điểm số về thang 0-10
-    df['grade_score'] = df['grade_score'].clip(0, 10)
-    df['attendance_rate'] = df['attendance_rate'].clip(0, 1)
-    df['homework_completion'] = df['homework_completion'].clip(0, 1)
-    
-    # Loại bỏ dòng có điểm số không hợp lệ
-    df = df.dropna(subset=['student_id', 'subject_code', 'grade_score'])
-    
     return df
 
 
@@ -103,48 +128,224 @@ def clean_student_profiles(df: pd.DataFrame) -> pd.DataFrame:
         return df
     
     # Điền giá trị thiếu
-    df['major'] = df['major'].fillna('Unknown')
-    df['career_path'] = df['career_path'].fillna('General')
-    df['learning_style'] = df['learning_style'].fillna('Mixed')
+    df['major'] = fill_missing(df['major'], 'Unknown')
+    df['career_path'] = fill_missing(df['career_path'], 'General')
+    df['learning_style'] = fill_missing(df['learning_style'], 'Mixed')
     
     return df
 
 
-def process_all_data():
-    """Xử lý tất cả dữ liệu đầu vào"""
+# Khóa định danh bản ghi: các dòng trùng khóa chỉ giữ lại dòng xuất hiện cuối cùng
+# (ví dụ file điểm upload lại nhiều lần)
+DEDUP_KEYS = {
+    'grades.csv': ['student_id', 'subject_code', 'semester', 'year'],
+}
+
+
+def hash_keys(df: pd.DataFrame, keys: List[str]) -> np.ndarray:
+    """
+    Hash 64-bit của khóa cho từng dòng (8 byte/dòng thay vì lưu bản sao của khóa).
+    Dòng thiếu một phần khóa được đánh dấu bằng hash 0 và không bị gộp
+    (bước kiểm tra sẽ loại các dòng này).
+    """
+    hashes = pd.util.hash_pandas_object(df[keys], index=False).to_numpy()
+    return np.where(df[keys].isna().any(axis=1).to_numpy(), np.uint64(0), hashes)
+
+
+def keep_last_mask(hashes: np.ndarray) -> np.ndarray:
+    """Mặt nạ giữ lại lần xuất hiện cuối cùng của mỗi hash (hash 0 luôn được giữ)"""
+    n = len(hashes)
+    # np.unique trên mảng đảo ngược trả về vị trí đầu tiên = lần xuất hiện cuối trong mảng gốc
+    _, first_in_reversed = np.unique(hashes[::-1], return_index=True)
+    keep = np.zeros(n, dtype=bool)
+    keep[n - 1 - first_in_reversed] = True
+    keep[hashes == 0] = True
+    return keep
+
+
+def scan_keep_last(input_name: str, keys: List[str], chunksize: int = DEFAULT_CHUNK_SIZE) -> np.ndarray:
+    """
+    Lượt đọc thứ nhất của chế độ streaming: chỉ đọc các cột khóa, tính hash từng dòng
+    và trả về mặt nạ giữ dòng (theo thứ tự dòng trong file).
+    Bộ nhớ: ~9 byte/dòng, không phụ thuộc độ dài khóa.
+    """
+    hashes = [hash_keys(chunk, keys) for chunk in iter_csv_chunks(input_name, chunksize, usecols=keys)]
+    if not hashes:
+        return np.ones(0, dtype=bool)
+    return keep_last_mask(np.concatenate(hashes))
+
+
+def report_duplicates(input_name: str, keep: np.ndarray):
+    """In số bản ghi trùng lặp đã được gộp"""
+    n_duplicates = int(len(keep) - keep.sum())
+    if n_duplicates:
+        print(f"🧹 {input_name}: gộp {n_duplicates} bản ghi trùng lặp (giữ bản ghi cuối cùng)")
+
+
+# Các file đầu vào được làm sạch: (file đầu vào, bảng đầu ra, hàm làm sạch, nhãn hiển thị)
+CLEANING_TASKS = [
+    ('subjects.csv', 'subjects_cleaned', clean_subjects, 'môn học'),
+    ('grades.csv', 'grades_cleaned', clean_grades, 'bản ghi điểm số'),
+    ('teacher_feedback.csv', 'feedback_cleaned', clean_feedback, 'nhận xét'),
+    ('student_profile.csv', 'student_profiles_cleaned', clean_student_profiles, 'hồ sơ sinh viên'),
+]
+
+
+def clean_file_in_memory(input_name: str, output_name: str,
+                         clean_fn: Callable[[pd.DataFrame], pd.DataFrame]) -> Optional[int]:
+    """
+    Đọc toàn bộ file, làm sạch và ghi ra bảng output.
+    Trả về số dòng hoặc None nếu file không tồn tại/rỗng; lỗi đọc hoặc làm sạch được ném ra ngoài.
+    """
+    path = get_input_path(input_name)
+    if not path.exists():
+        print(f"⚠️  File không tồn tại: {path}")
+        return None
+    df = read_csv_typed(path, input_name)
+    if df.empty:
+        return None
+    if input_name in DEDUP_KEYS:
+        keep = keep_last_mask(hash_keys(df, DEDUP_KEYS[input_name]))
+        report_duplicates(input_name, keep)
+        df = df[keep]
+    validator = DatasetValidator(input_name, output_name)
+    try:
+        df = validator.validate(df)
+    finally:
+        validator.close()
+    df = clean_fn(df)
+    save_dataset(df, output_name)
+    return len(df)
+
+
+def clean_file_streaming(input_name: str, output_name: str,
+                         clean_fn: Callable[[pd.DataFrame], pd.DataFrame],
+                         chunksize: int = DEFAULT_CHUNK_SIZE) -> Optional[int]:
+    """
+    Làm sạch file theo từng chunk và ghi nối tiếp vào bảng output.
+    Bộ nhớ tối đa chỉ phụ thuộc vào chunksize, không phụ thuộc kích thước file.
+    Bảng output chỉ được thay thế khi toàn bộ file đã xử lý xong.
+    File có khóa trong DEDUP_KEYS được đọc hai lượt: lượt đầu chỉ đọc cột khóa
+    để xác định bản ghi cuối cùng của mỗi khóa, lượt sau lọc theo mặt nạ đó.
+    Lỗi đọc hoặc làm sạch được ném ra ngoài (bảng output cũ được giữ nguyên).
+    """
+    validator = DatasetValidator(input_name, output_name)
+    writer = DatasetWriter(output_name)
+
+    try:
+        keep = None
+        if input_name in DEDUP_KEYS:
+            keep = scan_keep_last(input_name, DEDUP_KEYS[input_name], chunksize)
+            report_duplicates(input_name, keep)
+        offset = 0
+        for chunk in iter_csv_chunks(input_name, chunksize):
+            if keep is not None:
+                chunk_keep = keep[offset:offset + len(chunk)]
+                offset += len(chunk)
+                chunk = chunk[chunk_keep]
+            writer.write(clean_fn(validator.validate(chunk)))
+    except BaseException:
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        validator.close()
+    return writer.rows if writer.started else None
+
+
+def run_cleaning_task(input_name: str, output_name: str,
+                      clean_fn: Callable[[pd.DataFrame], pd.DataFrame],
+                      chunksize: Optional[int] = None) -> Tuple[Optional[int], float]:
+    """
+    Làm sạch một file đầu vào (có thể chạy trong process con).
+    Trả về (số dòng hoặc None nếu không có dữ liệu, thời gian xử lý tính bằng giây)
+    """
+    start = time.perf_counter()
+    if chunksize:
+        n_rows = clean_file_streaming(input_name, output_name, clean_fn, chunksize)
+    else:
+        n_rows = clean_file_in_memory(input_name, output_name, clean_fn)
+    return n_rows, time.perf_counter() - start
+
+
+def process_all_data(chunksize: Optional[int] = None, force: bool = False, workers: int = 1):
+    """
+    Xử lý tất cả dữ liệu đầu vào
+
+    Args:
+        chunksize: Nếu được truyền, đọc và làm sạch từng file theo chunk
+                   (chế độ streaming) thay vì đọc toàn bộ vào bộ nhớ
+        force: Làm sạch lại mọi file kể cả khi file đầu vào không thay đổi
+        workers: Số process làm sạch song song các file độc lập (1 = tuần tự)
+    """
     print("🔄 Bắt đầu xử lý dữ liệu...")
+    if chunksize:
+        print(f"   Chế độ streaming: {chunksize} dòng/chunk")
     
-    # Đọc các file CSV
-    subjects_df = load_csv_safe('subjects.csv')
-    grades_df = load_csv_safe('grades.csv')
-    feedback_df = load_csv_safe('teacher_feedback.csv')
-    career_path_df = load_csv_safe('career_path.csv')
-    student_profiles_df = load_csv_safe('student_profile.csv')
-    
-    # Làm sạch dữ liệu
-    if not subjects_df.empty:
-        subjects_df = clean_subjects(subjects_df)
-        subjects_df.to_csv(get_output_path('subjects_cleaned.csv'), index=False, encoding='utf-8')
-        print(f"✅ Đã xử lý {len(subjects_df)} môn học")
-    
-    if not grades_df.empty:
-        grades_df = clean_grades(grades_df)
-        grades_df.to_csv(get_output_path('grades_cleaned.csv'), index=False, encoding='utf-8')
-        print(f"✅ Đã xử lý {len(grades_df)} bản ghi điểm số")
-    
-    if not feedback_df.empty:
-        feedback_df = clean_feedback(feedback_df)
-        feedback_df.to_csv(get_output_path('feedback_cleaned.csv'), index=False, encoding='utf-8')
-        print(f"✅ Đã xử lý {len(feedback_df)} nhận xét")
-    
-    if not student_profiles_df.empty:
-        student_profiles_df = clean_student_profiles(student_profiles_df)
-        student_profiles_df.to_csv(get_output_path('student_profiles_cleaned.csv'), index=False, encoding='utf-8')
-        print(f"✅ Đã xử lý {len(student_profiles_df)} hồ sơ sinh viên")
+    params = {'format': get_storage_format(), 'validation': load_rule_actions()}
+    pending = []
+    # Dấu vân tay đầu vào lấy trước khi làm sạch: file bị sửa trong lúc chạy sẽ được làm sạch lại lần sau
+    input_snapshots = {}
+    for task in CLEANING_TASKS:
+        input_name, output_name, _, _ = task
+        input_path = get_input_path(input_name)
+        stage_inputs = [input_path] + reference_inputs(input_name)
+        if not force and input_path.exists() and is_stage_fresh(
+                f'clean:{output_name}', stage_inputs, [dataset_path(output_name)], params):
+            print(f"⏭️  Bỏ qua {input_name} (không thay đổi)")
+            continue
+        input_snapshots[output_name] = snapshot_inputs(stage_inputs)
+        pending.append(task)
+
+    def finish_task(task, n_rows: Optional[int], seconds: float):
+        input_name, output_name, _, label = task
+        if n_rows is None:
+            # File đầu vào không tồn tại hoặc rỗng (lỗi đọc/làm sạch được ném ra từ run_cleaning_task)
+            return
+        record_stage(f'clean:{output_name}', input_snapshots[output_name], [dataset_path(output_name)], params)
+        print(f"✅ Đã xử lý {n_rows} {label} ({seconds:.2f}s)")
+
+    if workers > 1 and len(pending) > 1:
+        n_workers = min(workers, len(pending))
+        print(f"   Chế độ song song: {n_workers} process")
+        errors = []
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {}
+            for task in pending:
+                input_name, output_name, clean_fn, _ = task
+                futures[executor.submit(run_cleaning_task, input_name, output_name, clean_fn, chunksize)] = task
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    finish_task(task, *future.result())
+                except Exception as e:
+                    print(f"❌ Lỗi khi xử lý {task[0]}: {e}")
+                    errors.append(task[0])
+                    # Hủy các file chưa bắt đầu; file đang chạy vẫn được hoàn tất
+                    for other in futures:
+                        other.cancel()
+        if errors:
+            raise RuntimeError(f"Không thể làm sạch dữ liệu: {', '.join(errors)}")
+    else:
+        for task in pending:
+            input_name, output_name, clean_fn, _ = task
+            try:
+                finish_task(task, *run_cleaning_task(input_name, output_name, clean_fn, chunksize))
+            except Exception as e:
+                print(f"❌ Lỗi khi xử lý {input_name}: {e}")
+                raise RuntimeError(f"Không thể làm sạch dữ liệu: {input_name}") from e
     
     print("✅ Hoàn thành xử lý dữ liệu!")
 
 
 if __name__ == '__main__':
-    process_all_data()
-
+    parser = argparse.ArgumentParser(description='Xử lý và làm sạch dữ liệu đầu vào')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Số dòng mỗi chunk (bật chế độ streaming cho file lớn)')
+    parser.add_argument('--force', action='store_true',
+                        help='Làm sạch lại mọi file kể cả khi không thay đổi')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Số process làm sạch song song các file (mặc định: 1)')
+    args = parser.parse_args()
+    process_all_data(chunksize=args.chunksize, force=args.force, workers=args.workers)
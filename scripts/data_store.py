@@ -0,0 +1,284 @@
+"""
+Kho dữ liệu trung gian giữa các bước pipeline
+Lưu/đọc các bảng trong data/output (subjects_cleaned, grades_cleaned, features,
+ai_scores, recommendations, ...) dưới dạng CSV hoặc Parquet (dạng cột, có schema)
+
+Định dạng được chọn trong config/model_config.json:
+    "storage": {"format": "parquet"}   # hoặc "csv" (mặc định)
+Parquet cần thư viện pyarrow; nếu chưa cài sẽ tự động dùng CSV.
+Kiểu dữ liệu của các cột được lấy từ schemas.py cho cả hai định dạng.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+from schemas import NUMERIC_CATEGORIES, TEXT_DTYPE, apply_schema, get_schema, read_csv_typed
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
+CONFIG_DIR = PROJECT_ROOT / 'config'
+
+FORMAT_SUFFIXES = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+}
+DEFAULT_FORMAT = 'csv'
+DEFAULT_CHUNK_SIZE = 100_000
+
+_warned_missing_pyarrow = False
+
+
+def get_storage_format() -> str:
+    """Đọc định dạng lưu trữ từ model_config.json ('csv' hoặc 'parquet')"""
+    global _warned_missing_pyarrow
+
+    fmt = DEFAULT_FORMAT
+    config_path = CONFIG_DIR / 'model_config.json'
+    if config_path.exists():
+        with open(config_path, 'r', encoding='utf-8') as f:
+            fmt = json.load(f).get('storage', {}).get('format', DEFAULT_FORMAT)
+
+    if fmt not in FORMAT_SUFFIXES:
+        print(f"⚠️  Định dạng lưu trữ không hợp lệ: {fmt}. Dùng {DEFAULT_FORMAT}.")
+        return DEFAULT_FORMAT
+    if fmt == 'parquet' and not HAS_PYARROW:
+        if not _warned_missing_pyarrow:
+            print("⚠️  Chưa cài pyarrow, không thể dùng Parquet. Dùng CSV.")
+            _warned_missing_pyarrow = True
+        return 'csv'
+    return fmt
+
+
+def dataset_path(name: str, fmt: Optional[str] = None) -> Path:
+    """Đường dẫn file của một bảng dữ liệu theo định dạng (mặc định: định dạng cấu hình)"""
+    DATA_OUTPUT.mkdir(parents=True, exist_ok=True)
+    return DATA_OUTPUT / f"{name}{FORMAT_SUFFIXES[fmt or get_storage_format()]}"
+
+
+def find_dataset(name: str) -> Optional[Path]:
+    """
+    Tìm file hiện có của một bảng dữ liệu.
+    Nếu tồn tại ở cả hai định dạng, dùng file được ghi gần nhất.
+    """
+    candidates = [
+        DATA_OUTPUT / f"{name}{suffix}"
+        for fmt, suffix in FORMAT_SUFFIXES.items()
+        if fmt != 'parquet' or HAS_PYARROW
+    ]
+    existing = [path for path in candidates if path.exists()]
+    if not existing:
+        return None
+    return max(existing, key=lambda path: path.stat().st_mtime_ns)
+
+
+def dataset_exists(name: str) -> bool:
+    """Kiểm tra bảng dữ liệu đã tồn tại hay chưa"""
+    return find_dataset(name) is not None
+
+
+def dataset_columns(name: str) -> List[str]:
+    """Danh sách cột của bảng dữ liệu mà không cần đọc toàn bộ dữ liệu"""
+    path = find_dataset(name)
+    if path is None:
+        return []
+    if path.suffix == '.parquet':
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _select_columns(name: str, columns: Optional[List[str]], missing: str = 'raise') -> Optional[List[str]]:
+    """
+    Các cột được yêu cầu mà bảng dữ liệu có.
+    missing='raise': báo lỗi nếu thiếu cột (tên sai hoặc schema đã đổi);
+    missing='ignore': bỏ qua các cột không tồn tại (cột không bắt buộc)
+    """
+    if columns is None:
+        return None
+    if missing not in ('raise', 'ignore'):
+        raise ValueError(f"missing phải là 'raise' hoặc 'ignore', không phải {missing!r}")
+    available = set(dataset_columns(name))
+    absent = [col for col in columns if col not in available]
+    if absent and missing == 'raise':
+        raise KeyError(f"Bảng {name} không có cột: {', '.join(absent)}")
+    return [col for col in columns if col in available]
+
+
+def load_dataset(name: str, columns: Optional[List[str]] = None, missing: str = 'raise') -> pd.DataFrame:
+    """
+    Đọc một bảng dữ liệu.
+
+    Args:
+        name: Tên bảng (không có phần mở rộng), ví dụ 'features'
+        columns: Chỉ đọc các cột này. Với Parquet, chỉ các cột được chọn mới được đọc
+                 từ đĩa và file được memory-map.
+        missing: 'raise' (mặc định) báo KeyError nếu bảng thiếu cột được yêu cầu;
+                 'ignore' bỏ qua các cột không tồn tại
+    """
+    path = find_dataset(name)
+    if path is None:
+        raise FileNotFoundError(f"Không tìm thấy dữ liệu: {name}")
+    columns = _select_columns(name, columns, missing)
+
+    if path.suffix == '.parquet':
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    if columns is None:
+        return read_csv_typed(path, name)
+    return read_csv_typed(path, name, usecols=columns)[columns]
+
+
+def iter_dataset(name: str, columns: Optional[List[str]] = None,
+                 chunksize: int = DEFAULT_CHUNK_SIZE, missing: str = 'raise') -> Iterator[pd.DataFrame]:
+    """Đọc một bảng dữ liệu theo từng chunk để giới hạn bộ nhớ (columns, missing như load_dataset)"""
+    path = find_dataset(name)
+    if path is None:
+        raise FileNotFoundError(f"Không tìm thấy dữ liệu: {name}")
+    columns = _select_columns(name, columns, missing)
+
+    if path.suffix == '.parquet':
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+        return
+    read_kwargs = {'usecols': columns} if columns is not None else {}
+    for chunk in read_csv_typed(path, name, chunksize=chunksize, **read_kwargs):
+        yield chunk[columns] if columns is not None else chunk
+
+
+def save_dataset(df: pd.DataFrame, name: str, fmt: Optional[str] = None) -> Path:
+    """
+    Ghi một bảng dữ liệu theo định dạng cấu hình (ép kiểu theo schema trước khi ghi).
+    Ghi vào file tạm rồi thay thế để người đọc không bao giờ thấy file dở dang.
+    """
+    with DatasetWriter(name, fmt) as writer:
+        writer.write(df)
+    return writer.path
+
+
+# Kiểu Arrow của các kiểu trong schemas.py (category được xử lý riêng)
+ARROW_TYPES = {
+    TEXT_DTYPE: 'string',
+    'float32': 'float32',
+    'float64': 'float64',
+    'Int8': 'int8',
+    'Int16': 'int16',
+    'Int32': 'int32',
+}
+
+
+def _arrow_schema(name: str, inferred: 'pa.Schema') -> 'pa.Schema':
+    """
+    Schema Arrow của cả file, lấy từ schema khai báo trong schemas.py thay vì từ chunk đầu
+    (cột toàn ô trống trong chunk đầu sẽ bị suy ra kiểu null và chunk sau không ghi được):
+    - Cột category: dictionary chỉ số int32 (chunk sau có nhiều category hơn vẫn ghi được),
+      giá trị chuỗi; cột category dạng số (học kỳ) giữ kiểu giá trị của chunk đầu, mặc định int64
+    - Cột không khai báo: kiểu của chunk đầu; cột toàn ô trống thì dùng chuỗi
+    """
+    declared = get_schema(name)
+    fields = []
+    for field in inferred:
+        dtype = declared.get(field.name)
+        if dtype == 'category':
+            value_type = pa.string()
+            if field.name in NUMERIC_CATEGORIES:
+                inferred_values = field.type.value_type if pa.types.is_dictionary(field.type) else pa.null()
+                value_type = pa.int64() if pa.types.is_null(inferred_values) else inferred_values
+            field = field.with_type(pa.dictionary(pa.int32(), value_type))
+        elif dtype in ARROW_TYPES:
+            field = field.with_type(pa.type_for_alias(ARROW_TYPES[dtype]))
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        elif pa.types.is_dictionary(field.type):
+            field = field.with_type(pa.dictionary(pa.int32(), field.type.value_type, field.type.ordered))
+        fields.append(field)
+    return pa.schema(fields, metadata=inferred.metadata)
+
+
+class DatasetWriter:
+    """
+    Ghi nối tiếp nhiều chunk vào một bảng dữ liệu (CSV hoặc Parquet).
+    File chỉ được thay thế khi đóng writer thành công.
+    """
+
+    def __init__(self, name: str, fmt: Optional[str] = None):
+        self.name = name
+        self.fmt = fmt or get_storage_format()
+        self.path = dataset_path(name, self.fmt)
+        self.tmp_path = self.path.with_name(self.path.name + '.tmp')
+        self.rows = 0
+        self.started = False
+        self._parquet_writer = None
+        self._schema = None
+
+    def _to_arrow(self, df: pd.DataFrame) -> 'pa.Table':
+        """Chuyển DataFrame sang Arrow; cột object lẫn kiểu (số + chuỗi) được chuyển thành chuỗi"""
+        try:
+            return pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            df = df.copy()
+            for col in df.columns[df.dtypes == object]:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+            return pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+
+    def write(self, df: pd.DataFrame):
+        """Ghi thêm một chunk"""
+        df = apply_schema(df, self.name)
+        if self.fmt == 'parquet':
+            table = self._to_arrow(df)
+            if self._parquet_writer is None:
+                self._schema = _arrow_schema(self.name, table.schema)
+                table = self._to_arrow(df)
+                self._parquet_writer = pq.ParquetWriter(self.tmp_path, self._schema)
+            self._parquet_writer.write_table(table)
+        else:
+            df.to_csv(
+                self.tmp_path,
+                mode='a' if self.started else 'w',
+                header=not self.started,
+                index=False,
+                encoding='utf-8'
+            )
+        self.started = True
+        self.rows += len(df)
+
+    def close(self):
+        """Hoàn tất ghi và thay thế file đích"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self.started:
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Hủy ghi, xóa file tạm"""
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
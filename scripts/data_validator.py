@@ -0,0 +1,287 @@
+"""
+Kiểm tra dữ liệu đầu vào theo bộ luật khai báo (vector hóa)
+Mỗi bảng có một danh sách luật; mọi luật được đánh giá trên toàn bộ cột của chunk
+cùng lúc (không lặp theo từng dòng). Các loại luật:
+- required: cột bắt buộc phải có giá trị
+- range: giá trị số nằm trong khoảng [min, max] (giá trị thiếu do luật required xử lý)
+- reference: giá trị phải tồn tại trong cột của một file đầu vào khác (ví dụ subject_code)
+- unique: khóa không được trùng (giữ bản ghi hợp lệ xuất hiện đầu tiên, kể cả giữa các chunk)
+
+Mỗi luật có hành động 'reject' (loại dòng) hoặc 'warn' (chỉ đếm); luật range còn có
+'clip' (đưa giá trị về trong khoảng và giữ dòng). Điểm số và tỷ lệ chuyên cần/bài tập
+mặc định là 'clip' như bước làm sạch trước đây. Hành động có thể được ghi đè trong
+config/model_config.json:
+    "validation": {"unknown_subject_code": "warn", "grade_score_out_of_range": "reject"}
+
+Dòng bị loại được ghi vào data/output/quarantine/<bảng>_rejected.csv kèm mã lý do;
+số dòng vi phạm từng luật được ghi vào data/output/quarantine/<bảng>_report.json.
+"""
+
+import json
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from schemas import DATASET_SCHEMAS
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+DATA_INPUT = PROJECT_ROOT / 'data' / 'input'
+DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
+CONFIG_DIR = PROJECT_ROOT / 'config'
+QUARANTINE_DIR = DATA_OUTPUT / 'quarantine'
+
+# Bộ luật cho từng bảng (khóa theo tên schema trong schemas.py)
+VALIDATION_RULES: Dict[str, List[Dict]] = {
+    'subjects': [
+        {'name': 'missing_subject_code', 'type': 'required', 'column': 'subject_code'},
+        {'name': 'credits_out_of_range', 'type': 'range', 'column': 'credits', 'min': 0, 'max': 20},
+        {'name': 'duplicate_subject_code', 'type': 'unique', 'column': 'subject_code'},
+    ],
+    'grades': [
+        {'name': 'missing_student_id', 'type': 'required', 'column': 'student_id'},
+        {'name': 'missing_subject_code', 'type': 'required', 'column': 'subject_code'},
+        {'name': 'missing_grade_score', 'type': 'required', 'column': 'grade_score'},
+        {'name': 'grade_score_out_of_range', 'type': 'range', 'column': 'grade_score',
+         'min': 0, 'max': 10, 'action': 'clip'},
+        {'name': 'attendance_rate_out_of_range', 'type': 'range', 'column': 'attendance_rate',
+         'min': 0, 'max': 1, 'action': 'clip'},
+        {'name': 'homework_completion_out_of_range', 'type': 'range', 'column': 'homework_completion',
+         'min': 0, 'max': 1, 'action': 'clip'},
+        {'name': 'unknown_subject_code', 'type': 'reference', 'column': 'subject_code',
+         'reference': ('subjects.csv', 'subject_code')},
+    ],
+    'feedback': [
+        {'name': 'missing_student_id', 'type': 'required', 'column': 'student_id'},
+        {'name': 'missing_subject_code', 'type': 'required', 'column': 'subject_code'},
+        {'name': 'unknown_subject_code', 'type': 'reference', 'column': 'subject_code',
+         'reference': ('subjects.csv', 'subject_code')},
+    ],
+    'student_profiles': [
+        {'name': 'missing_student_id', 'type': 'required', 'column': 'student_id'},
+        {'name': 'duplicate_student_id', 'type': 'unique', 'column': 'student_id'},
+    ],
+}
+
+ACTIONS = ('reject', 'warn', 'clip')
+
+
+def load_rule_actions() -> Dict[str, str]:
+    """Đọc hành động ghi đè cho từng luật từ model_config.json (mục "validation")"""
+    config_path = CONFIG_DIR / 'model_config.json'
+    if not config_path.exists():
+        return {}
+    with open(config_path, 'r', encoding='utf-8') as f:
+        actions = json.load(f).get('validation', {})
+    return {name: action for name, action in actions.items() if action in ACTIONS}
+
+
+def get_rules(input_name: str) -> List[Dict]:
+    """Danh sách luật (đã áp dụng hành động ghi đè) cho một file đầu vào"""
+    rules = VALIDATION_RULES.get(DATASET_SCHEMAS.get(input_name, ''), [])
+    actions = load_rule_actions()
+    resolved = []
+    for rule in rules:
+        action = actions.get(rule['name'], rule.get('action', 'reject'))
+        if action == 'clip' and rule['type'] != 'range':
+            # Chỉ luật range mới đưa được giá trị về trong khoảng
+            action = 'reject'
+        resolved.append({**rule, 'action': action})
+    return resolved
+
+
+def reference_inputs(input_name: str) -> List[Path]:
+    """Các file đầu vào khác mà luật của file này tham chiếu tới (dùng cho manifest)"""
+    return sorted({DATA_INPUT / rule['reference'][0] for rule in get_rules(input_name)
+                   if rule['type'] == 'reference'})
+
+
+def _load_reference(filename: str, column: str) -> Optional[pd.Index]:
+    """Đọc tập giá trị hợp lệ từ một cột của file đầu vào; None nếu file không tồn tại"""
+    path = DATA_INPUT / filename
+    if not path.exists():
+        return None
+    values = pd.read_csv(path, usecols=[column], dtype=str, encoding='utf-8')[column]
+    return pd.Index(values.dropna().unique())
+
+
+def _column(df: pd.DataFrame, rule: Dict) -> Optional[pd.Series]:
+    return df[rule['column']] if rule['column'] in df.columns else None
+
+
+def _check_required(df: pd.DataFrame, rule: Dict, validator: 'DatasetValidator') -> np.ndarray:
+    series = _column(df, rule)
+    if series is None:
+        return np.ones(len(df), dtype=bool)
+    failed = series.isna().to_numpy()
+    if series.dtype == object or pd.api.types.is_string_dtype(series.dtype):
+        failed = failed | (series.astype(str).str.strip() == '').to_numpy()
+    return failed
+
+
+def _check_range(df: pd.DataFrame, rule: Dict, validator: 'DatasetValidator') -> np.ndarray:
+    series = _column(df, rule)
+    if series is None:
+        return np.zeros(len(df), dtype=bool)
+    values = pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    with np.errstate(invalid='ignore'):
+        return (values < rule['min']) | (values > rule['max'])
+
+
+def _check_reference(df: pd.DataFrame, rule: Dict, validator: 'DatasetValidator') -> np.ndarray:
+    series = _column(df, rule)
+    valid = validator.reference(rule)
+    if series is None or valid is None:
+        return np.zeros(len(df), dtype=bool)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Chỉ so khớp danh sách category rồi tra theo mã, không tạo chuỗi cho từng dòng
+        # Phần tử cuối (True) dành cho mã -1 (ô thiếu) để chunk không có category nào vẫn tra được
+        known = np.append(np.asarray(series.cat.categories.astype(str).isin(valid)), True)
+        codes = series.cat.codes.to_numpy()
+        return ~known[codes]
+    return (series.notna() & ~series.astype(str).isin(valid)).to_numpy()
+
+
+# Hàm kiểm tra theo loại luật: trả về mảng bool, True = dòng vi phạm
+CHECKS = {
+    'required': _check_required,
+    'range': _check_range,
+    'reference': _check_reference,
+}
+
+
+class DatasetValidator:
+    """
+    Kiểm tra một file đầu vào theo từng chunk.
+    Giữ trạng thái giữa các chunk (khóa đã gặp, số lượng vi phạm) và ghi dòng bị loại
+    vào file quarantine.
+    """
+
+    def __init__(self, input_name: str, output_name: str):
+        self.input_name = input_name
+        self.output_name = output_name
+        self.rules = get_rules(input_name)
+        self.counts = {rule['name']: 0 for rule in self.rules}
+        self.rows_checked = 0
+        self.rows_rejected = 0
+        self.quarantine_path = QUARANTINE_DIR / f"{output_name}_rejected.csv"
+        self.report_path = QUARANTINE_DIR / f"{output_name}_report.json"
+        self._references = {}
+        self._seen_keys = {rule['name']: set() for rule in self.rules if rule['type'] == 'unique'}
+        self._quarantine_started = False
+
+    def reference(self, rule: Dict) -> Optional[pd.Index]:
+        """Tập giá trị tham chiếu của luật (đọc một lần cho cả file)"""
+        if rule['name'] not in self._references:
+            self._references[rule['name']] = _load_reference(*rule['reference'])
+        return self._references[rule['name']]
+
+    def _check_unique(self, df: pd.DataFrame, rule: Dict, candidates: np.ndarray) -> np.ndarray:
+        """Khóa trùng trong chunk hoặc đã gặp ở chunk trước; chỉ xét các dòng chưa bị loại"""
+        failed = np.zeros(len(df), dtype=bool)
+        series = _column(df, rule)
+        if series is None or not candidates.any():
+            return failed
+        keys = series[candidates].astype(object)
+        seen = self._seen_keys[rule['name']]
+        duplicated = (keys.duplicated(keep='first') | keys.isin(seen)).to_numpy()
+        failed[candidates] = duplicated
+        seen.update(keys[~duplicated].dropna())
+        return failed
+
+    def validate(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Kiểm tra một chunk; trả về các dòng hợp lệ, ghi các dòng bị loại vào quarantine"""
+        if df.empty or not self.rules:
+            return df
+
+        masks = np.zeros((len(df), len(self.rules)), dtype=bool)
+        rejecting = np.array([rule['action'] == 'reject' for rule in self.rules])
+        unique_rules = []
+        for j, rule in enumerate(self.rules):
+            if rule['type'] == 'unique':
+                unique_rules.append(j)
+            else:
+                masks[:, j] = CHECKS[rule['type']](df, rule, self)
+
+        # Luật trùng khóa đánh giá sau cùng để bản ghi lỗi không "chiếm chỗ" bản ghi hợp lệ
+        for j in unique_rules:
+            candidates = ~(masks & rejecting).any(axis=1)
+            masks[:, j] = self._check_unique(df, self.rules[j], candidates)
+
+        for name, count in zip(self.counts, masks.sum(axis=0)):
+            self.counts[name] += int(count)
+        df = self._clip(df, masks)
+        rejected = (masks & rejecting).any(axis=1)
+        self.rows_checked += len(df)
+        if not rejected.any():
+            return df
+
+        self.rows_rejected += int(rejected.sum())
+        self._quarantine(df[rejected], masks[rejected])
+        return df[~rejected]
+
+    def _clip(self, df: pd.DataFrame, masks: np.ndarray) -> pd.DataFrame:
+        """Đưa giá trị ngoài khoảng của các luật 'clip' về [min, max]; dòng vẫn được giữ"""
+        for j, rule in enumerate(self.rules):
+            if rule['action'] != 'clip' or not masks[:, j].any():
+                continue
+            values = pd.to_numeric(df[rule['column']], errors='coerce')
+            df = df.assign(**{rule['column']: values.clip(rule['min'], rule['max'])})
+        return df
+
+    def _quarantine(self, rejected_df: pd.DataFrame, masks: np.ndarray):
+        """Ghi các dòng bị loại kèm mã lý do (các luật vi phạm, phân tách bằng ';')"""
+        reasons = np.full(len(rejected_df), '', dtype=object)
+        for j, rule in enumerate(self.rules):
+            reasons = np.where(masks[:, j], reasons + rule['name'] + ';', reasons)
+        rejected_df = rejected_df.assign(reject_reason=pd.Series(reasons, index=rejected_df.index).str.rstrip(';'))
+
+        QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+        rejected_df.to_csv(
+            self.quarantine_path,
+            mode='a' if self._quarantine_started else 'w',
+            header=not self._quarantine_started,
+            index=False,
+            encoding='utf-8'
+        )
+        self._quarantine_started = True
+
+    def close(self) -> Dict:
+        """Ghi báo cáo số vi phạm theo từng luật; xóa file quarantine cũ nếu lần này không loại dòng nào"""
+        if not self._quarantine_started:
+            self.quarantine_path.unlink(missing_ok=True)
+        report = {
+            'input': self.input_name,
+            'rows_checked': self.rows_checked,
+            'rows_rejected': self.rows_rejected,
+            'rules': {
+                rule['name']: {'action': rule['action'], 'violations': self.counts[rule['name']]}
+                for rule in self.rules
+            },
+            'quarantine_file': self.quarantine_path.name if self._quarantine_started else None,
+        }
+        QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(self.report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        violations = [f"{name}: {count}" for name, count in self.counts.items() if count]
+        if violations:
+            print(f"⚠️  {self.input_name}: loại {self.rows_rejected}/{self.rows_checked} dòng "
+                  f"({', '.join(violations)})")
+            clipped = [rule['name'] for rule in self.rules
+                       if rule['action'] == 'clip' and self.counts[rule['name']]]
+            if clipped:
+                print(f"   Đã đưa về khoảng hợp lệ: {', '.join(clipped)}")
+            if self._quarantine_started:
+                print(f"   Dòng bị loại: {self.quarantine_path}")
+        return report
@@ -5,8 +5,11 @@ Tạo và quản lý các bảng: subjects, grades, feedback, student_profiles,
 
 import sqlite3
 import os
+import time
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
+
+import pandas as pd
 
 
 def get_project_root():
@@ -153,6 +156,359 @@ def get_connection() -> sqlite3.Connection:
     return sqlite3.connect(str(db_path))
 
 
-if __name__ == '__main__':
+# ===== Nạp dữ liệu đã làm sạch vào database (bulk load) =====
+
+# Số dòng mỗi lần executemany
+LOAD_BATCH_SIZE = 50_000
+
+# Index phụ: xóa trước khi nạp và tạo lại sau khi nạp xong
+SECONDARY_INDEXES = {
+    'idx_grades_student': 'CREATE INDEX IF NOT EXISTS idx_grades_student ON grades (student_id, year, semester)',
+    'idx_grades_subject': 'CREATE INDEX IF NOT EXISTS idx_grades_subject ON grades (subject_id)',
+    'idx_feedback_student': 'CREATE INDEX IF NOT EXISTS idx_feedback_student ON feedback (student_id)',
+}
+
+# PRAGMA cho lúc nạp dữ liệu (ưu tiên tốc độ) và sau khi nạp (ưu tiên an toàn)
+BULK_LOAD_PRAGMAS = [
+    'PRAGMA journal_mode = MEMORY',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144',
+]
+DEFAULT_PRAGMAS = [
+    'PRAGMA journal_mode = DELETE',
+    'PRAGMA synchronous = FULL',
+]
+
+
+def _records(df: pd.DataFrame, columns: List[str]) -> Iterable[tuple]:
+    """Chuyển DataFrame thành các tuple cho executemany (NaN -> NULL), xử lý theo từng cột"""
+    values = []
+    for col in columns:
+        if col not in df.columns:
+            values.append([None] * len(df))
+            continue
+        series = df[col]
+        if series.dtype == 'float32':
+            # float32 -> float64 không kèm sai số biểu diễn (7.8 thay vì 7.800000190734863)
+            series = series.astype('float64').round(6)
+        series = series.astype(object)
+        values.append(series.where(series.notna(), None).tolist())
+    return zip(*values)
+
+
+def _ensure_subject_ids(cursor: sqlite3.Cursor, subject_ids: Dict[str, int], codes: Iterable) -> int:
+    """
+    Thêm môn học giữ chỗ cho các subject_code chưa có trong bảng subjects
+    (để bản ghi điểm/nhận xét không bị mất). Trả về số môn đã thêm.
+    """
+    missing = sorted({str(code) for code in codes if pd.notna(code)} - subject_ids.keys())
+    if not missing:
+        return 0
+    cursor.executemany(
+        'INSERT OR IGNORE INTO subjects (subject_code, subject_name) VALUES (?, ?)',
+        [(code, code) for code in missing]
+    )
+    placeholders = ','.join('?' * len(missing))
+    cursor.execute(
+        f'SELECT subject_code, subject_id FROM subjects WHERE subject_code IN ({placeholders})',
+        missing
+    )
+    subject_ids.update(cursor.fetchall())
+    return len(missing)
+
+
+def _load_with_subject_ids(cursor: sqlite3.Cursor, dataset: str, table: str, columns: List[str],
+                           subject_ids: Dict[str, int], chunksize: int) -> int:
+    """Nạp một bảng có cột subject_id (grades, feedback) từ dữ liệu đã làm sạch"""
+    from data_store import dataset_exists, iter_dataset
+
+    if not dataset_exists(dataset):
+        return 0
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    total = 0
+    for chunk in iter_dataset(dataset, chunksize=chunksize):
+        codes = chunk['subject_code'].astype(object)
+        _ensure_subject_ids(cursor, subject_ids, codes.unique())
+        chunk = chunk.assign(subject_id=codes.map(subject_ids))
+        chunk = chunk[chunk['subject_id'].notna() & chunk['student_id'].notna()]
+        cursor.executemany(sql, _records(chunk, columns))
+        total += len(chunk)
+    return total
+
+
+def load_cleaned_data(chunksize: int = LOAD_BATCH_SIZE, force: bool = False) -> Optional[Dict[str, int]]:
+    """
+    Nạp dữ liệu đã làm sạch (subjects, grades, feedback, student_profiles) vào database.
+
+    - Toàn bộ quá trình nằm trong một transaction, dùng executemany theo lô
+    - PRAGMA được điều chỉnh cho tốc độ khi nạp rồi khôi phục sau đó
+    - Bảng ánh xạ subject_code -> subject_id được xây một lần
+    - Index phụ được tạo sau khi nạp xong
+    Các bảng grades, feedback, student_profiles được làm mới hoàn toàn;
+    bảng subjects được cập nhật (upsert) để giữ nguyên subject_id đã có.
+
+    Returns:
+        Số dòng đã nạp cho từng bảng, hoặc None nếu bỏ qua vì dữ liệu không thay đổi
+    """
+    from data_store import dataset_exists, find_dataset, load_dataset
+    from pipeline_manifest import is_stage_fresh, record_stage, snapshot_inputs
+
     init_database()
+    stage_inputs = [
+        find_dataset(name)
+        for name in ('subjects_cleaned', 'grades_cleaned', 'feedback_cleaned', 'student_profiles_cleaned')
+    ]
+    db_path = get_db_path()
+
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    cursor = conn.cursor()
+    try:
+        has_grades = cursor.execute('SELECT EXISTS (SELECT 1 FROM grades)').fetchone()[0]
+        if not force and (has_grades or stage_inputs[1] is None) and is_stage_fresh('load_database', stage_inputs, []):
+            print("⏭️  Bỏ qua nạp database (dữ liệu không thay đổi)")
+            return None
+        input_snapshot = snapshot_inputs(stage_inputs)
+
+        start = time.perf_counter()
+        for pragma in BULK_LOAD_PRAGMAS:
+            cursor.execute(pragma)
+
+        counts = {}
+        cursor.execute('BEGIN')
+        try:
+            for index_name in SECONDARY_INDEXES:
+                cursor.execute(f'DROP INDEX IF EXISTS {index_name}')
+
+            # 1. Môn học (upsert) và bảng ánh xạ subject_code -> subject_id
+            if dataset_exists('subjects_cleaned'):
+                subjects_df = load_dataset('subjects_cleaned')
+                subjects_df = subjects_df[subjects_df['subject_code'].notna()]
+                subjects_df = subjects_df.assign(subject_name=subjects_df['subject_name'].astype(object)
+                                                 .fillna(subjects_df['subject_code'].astype(object)))
+                cursor.executemany(
+                    '''
+                    INSERT INTO subjects (subject_code, subject_name, category, credits, difficulty_level, prerequisites)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(subject_code) DO UPDATE SET
+                        subject_name = excluded.subject_name,
+                        category = excluded.category,
+                        credits = excluded.credits,
+                        difficulty_level = excluded.difficulty_level,
+                        prerequisites = excluded.prerequisites
+                    ''',
+                    _records(subjects_df, ['subject_code', 'subject_name', 'category', 'credits',
+                                           'difficulty_level', 'prerequisites'])
+                )
+                counts['subjects'] = len(subjects_df)
+            subject_ids = dict(cursor.execute('SELECT subject_code, subject_id FROM subjects').fetchall())
+
+            # 2. Hồ sơ học sinh
+            cursor.execute('DELETE FROM student_profiles')
+            counts['student_profiles'] = 0
+            if dataset_exists('student_profiles_cleaned'):
+                profiles_df = load_dataset('student_profiles_cleaned')
+                profiles_df = profiles_df[profiles_df['student_id'].notna()]
+                profiles_df = profiles_df.assign(name=profiles_df.get('name', pd.Series(index=profiles_df.index))
+                                                 .astype(object).fillna(''))
+                cursor.executemany(
+                    '''
+                    INSERT OR REPLACE INTO student_profiles
+                    (student_id, name, major, career_path, learning_style, interests, goals)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    _records(profiles_df, ['student_id', 'name', 'major', 'career_path',
+                                           'learning_style', 'interests', 'goals'])
+                )
+                counts['student_profiles'] = len(profiles_df)
+
+            # 3. Điểm số và nhận xét
+            cursor.execute('DELETE FROM grades')
+            counts['grades'] = _load_with_subject_ids(
+                cursor, 'grades_cleaned', 'grades',
+                ['student_id', 'subject_id', 'grade_score', 'attendance_rate',
+                 'homework_completion', 'semester', 'year'],
+                subject_ids, chunksize
+            )
+            cursor.execute('DELETE FROM feedback')
+            counts['feedback'] = _load_with_subject_ids(
+                cursor, 'feedback_cleaned', 'feedback',
+                ['student_id', 'subject_id', 'comment', 'strengths', 'improvements', 'semester'],
+                subject_ids, chunksize
+            )
+
+            for create_sql in SECONDARY_INDEXES.values():
+                cursor.execute(create_sql)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        finally:
+            for pragma in DEFAULT_PRAGMAS:
+                cursor.execute(pragma)
+
+        record_stage('load_database', input_snapshot, [])
+        elapsed = time.perf_counter() - start
+        summary = ', '.join(f"{count} {table}" for table, count in counts.items())
+        print(f"✅ Đã nạp dữ liệu vào database: {summary} ({elapsed:.2f}s)")
+        return counts
+    finally:
+        conn.close()
+
+
+def get_student_grades(student_id: str) -> List[Dict[str, Any]]:
+    """Lấy điểm số của một học sinh từ database (dùng index idx_grades_student)"""
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            '''
+            SELECT g.student_id, s.subject_code, g.grade_score, g.attendance_rate,
+                   g.homework_completion, g.semester, g.year
+            FROM grades g
+            JOIN subjects s ON s.subject_id = g.subject_id
+            WHERE g.student_id = ?
+            ORDER BY g.year, g.semester, g.grade_id
+            ''',
+            (student_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def get_student_feedback(student_id: str) -> List[Dict[str, Any]]:
+    """Lấy nhận xét của một học sinh từ database (dùng index idx_feedback_student)"""
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute(
+            '''
+            SELECT f.student_id, s.subject_code, f.comment, f.strengths, f.improvements, f.semester
+            FROM feedback f
+            JOIN subjects s ON s.subject_id = f.subject_id
+            WHERE f.student_id = ?
+            ORDER BY f.feedback_id
+            ''',
+            (student_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def is_database_loaded() -> bool:
+    """Database đã được nạp đầy đủ từ dữ liệu đã làm sạch ít nhất một lần hay chưa"""
+    from pipeline_manifest import load_manifest
+
+    return 'load_database' in load_manifest()['stages']
+
+
+def get_student_profile(student_id: str) -> Optional[Dict[str, Any]]:
+    """Lấy hồ sơ của một học sinh từ database"""
+    conn = get_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute('SELECT * FROM student_profiles WHERE student_id = ?', (student_id,)).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def upsert_grade(record: Dict[str, Any]):
+    """
+    Cập nhật hoặc thêm một bản ghi điểm (khóa: student_id, subject_code, semester, year).
+    Dùng để đồng bộ database khi học sinh nhập điểm mà không cần nạp lại toàn bộ.
+    """
+    conn = get_connection()
+    try:
+        with conn:
+            cursor = conn.cursor()
+            subject_ids = dict(cursor.execute(
+                'SELECT subject_code, subject_id FROM subjects WHERE subject_code = ?',
+                (record['subject_code'],)
+            ).fetchall())
+            _ensure_subject_ids(cursor, subject_ids, [record['subject_code']])
+            subject_id = subject_ids[str(record['subject_code'])]
+            values = (record.get('grade_score'), record.get('attendance_rate'),
+                      record.get('homework_completion'))
+            key = (record['student_id'], subject_id, str(record.get('semester')), record.get('year'))
+            cursor.execute(
+                '''
+                UPDATE grades SET grade_score = ?, attendance_rate = ?, homework_completion = ?
+                WHERE student_id = ? AND subject_id = ? AND semester = ? AND year = ?
+                ''',
+                values + key
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    '''
+                    INSERT INTO grades (grade_score, attendance_rate, homework_completion,
+                                        student_id, subject_id, semester, year)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ''',
+                    values + key
+                )
+    finally:
+        conn.close()
+
+
+def upsert_feedback(record: Dict[str, Any]):
+    """Cập nhật hoặc thêm một nhận xét (khóa: student_id, subject_code, semester)"""
+    conn = get_connection()
+    try:
+        with conn:
+            cursor = conn.cursor()
+            subject_ids = dict(cursor.execute(
+                'SELECT subject_code, subject_id FROM subjects WHERE subject_code = ?',
+                (record['subject_code'],)
+            ).fetchall())
+            _ensure_subject_ids(cursor, subject_ids, [record['subject_code']])
+            subject_id = subject_ids[str(record['subject_code'])]
+            values = (record.get('comment'), record.get('strengths'), record.get('improvements'))
+            key = (record['student_id'], subject_id, str(record.get('semester')))
+            cursor.execute(
+                '''
+                UPDATE feedback SET comment = ?, strengths = ?, improvements = ?
+                WHERE student_id = ? AND subject_id = ? AND semester = ?
+                ''',
+                values + key
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    '''
+                    INSERT INTO feedback (comment, strengths, improvements, student_id, subject_id, semester)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ''',
+                    values + key
+                )
+    finally:
+        conn.close()
+
+
+def upsert_student_profile(record: Dict[str, Any]):
+    """Cập nhật hoặc thêm hồ sơ học sinh (chỉ ghi đè các trường có giá trị)"""
+    columns = ['student_id', 'name', 'major', 'career_path', 'learning_style', 'interests', 'goals']
+    fields = [col for col in columns if record.get(col) is not None]
+    updates = ', '.join(f"{col} = excluded.{col}" for col in fields if col != 'student_id')
+    conflict_action = f"DO UPDATE SET {updates}" if updates else 'DO NOTHING'
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT INTO student_profiles ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))}) "
+                f"ON CONFLICT(student_id) {conflict_action}",
+                [record[col] for col in fields]
+            )
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    import sys
+
+    if '--load' in sys.argv:
+        load_cleaned_data(force='--force' in sys.argv)
+    else:
+        init_database()
 
@@ -1,13 +1,25 @@
 """
 Feature Engineering: Mã hóa đặc trưng từ dữ liệu đã làm sạch
 Tạo file features.csv với các đặc trưng đã được mã hóa sẵn sàng cho mô hình AI
+Bộ mã hóa/chuẩn hóa đã fit được lưu tại models/feature_transformer.pkl (xem feature_transformer.py)
 """
 
 import pandas as pd
 from pathlib import Path
+from typing import Optional
 import json
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-import numpy as np
+
+from data_store import (
+    dataset_exists, dataset_path, find_dataset, get_storage_format, iter_dataset, load_dataset, save_dataset
+)
+from feedback_features import (
+    OUTPUT_NAME as FEEDBACK_FEATURES, load_feedback_features, update_student_feedback_features
+)
+from feature_store import feature_store_exists, replace_student_features, write_features
+from feature_transformer import (
+    TRANSFORMER_PATH, FeatureTransformer, build_raw_features, get_hashed_text_config, load_feature_transformer
+)
+from pipeline_manifest import invalidate_stage, is_stage_fresh, record_stage, snapshot_inputs
 
 
 def get_project_root():
@@ -38,125 +50,147 @@ def load_config():
     return {}
 
 
-def encode_categorical_features(df: pd.DataFrame, columns: list) -> pd.DataFrame:
-    """Mã hóa các đặc trưng phân loại"""
-    df_encoded = df.copy()
-    encoders = {}
-    
-    for col in columns:
-        if col in df_encoded.columns:
-            le = LabelEncoder()
-            df_encoded[col] = le.fit_transform(df_encoded[col].astype(str))
-            encoders[col] = le
-    
-    return df_encoded, encoders
+def _feature_stage_files():
+    """Các file đầu vào/đầu ra của bước Feature Engineering (dùng cho manifest)"""
+    inputs = [
+        find_dataset('subjects_cleaned'),
+        find_dataset('grades_cleaned'),
+        find_dataset('student_profiles_cleaned'),
+        find_dataset(FEEDBACK_FEATURES),
+        CONFIG_DIR / 'model_config.json',
+    ]
+    outputs = [dataset_path('features'), TRANSFORMER_PATH]
+    return inputs, outputs
 
 
-def normalize_numerical_features(df: pd.DataFrame, columns: list) -> pd.DataFrame:
-    """Chuẩn hóa các đặc trưng số"""
-    df_normalized = df.copy()
-    scaler = StandardScaler()
-    
-    for col in columns:
-        if col in df_normalized.columns:
-            df_normalized[col] = scaler.fit_transform(df_normalized[[col]])
-    
-    return df_normalized, scaler
-
+def create_features(force: bool = False):
+    """
+    Tạo file features từ dữ liệu đã làm sạch
 
-def create_features():
-    """Tạo file features.csv từ dữ liệu đã làm sạch"""
+    Args:
+        force: Tạo lại kể cả khi dữ liệu đầu vào không thay đổi
+    """
     print("🔄 Bắt đầu Feature Engineering...")
     
     # Đọc dữ liệu đã làm sạch
-    subjects_path = get_output_path('subjects_cleaned.csv')
-    grades_path = get_output_path('grades_cleaned.csv')
-    profiles_path = get_output_path('student_profiles_cleaned.csv')
-    
-    if not subjects_path.exists() or not grades_path.exists():
+    if not dataset_exists('subjects_cleaned') or not dataset_exists('grades_cleaned'):
         print("❌ Vui lòng chạy data_processor.py trước!")
         return
     
-    subjects_df = pd.read_csv(subjects_path)
-    grades_df = pd.read_csv(grades_path)
+    stage_inputs, stage_outputs = _feature_stage_files()
+    stage_params = {'format': get_storage_format()}
+    if not force and is_stage_fresh('features', stage_inputs, stage_outputs, stage_params):
+        print("⏭️  Bỏ qua Feature Engineering (dữ liệu không thay đổi)")
+        return None
+    input_snapshot = snapshot_inputs(stage_inputs)
     
-    # Merge dữ liệu
-    merged_df = grades_df.merge(
-        subjects_df,
-        left_on='subject_code',
-        right_on='subject_code',
-        how='left'
-    )
+    subjects_df = load_dataset('subjects_cleaned')
+    grades_df = load_dataset('grades_cleaned')
+    profiles_df = load_dataset('student_profiles_cleaned') if dataset_exists('student_profiles_cleaned') else None
+    feedback_df = load_feedback_features()
     
-    # Đọc hồ sơ sinh viên nếu có
-    if profiles_path.exists():
-        profiles_df = pd.read_csv(profiles_path)
-        merged_df = merged_df.merge(
-            profiles_df,
-            on='student_id',
-            how='left'
-        )
+    # Ghép dữ liệu và tạo các đặc trưng mới (điểm trung bình, độ khó, tỷ lệ hoàn thành, nhận xét)
+    merged_df = build_raw_features(grades_df, subjects_df, profiles_df, feedback_df)
     
     # Đọc cấu hình
     config = load_config()
     numerical_features = config.get('features', {}).get('numerical', [])
     categorical_features = config.get('features', {}).get('categorical', [])
     
-    # Tạo các đặc trưng mới
-    # 1. Điểm trung bình của sinh viên
-    if 'grade_score' in merged_df.columns:
-        student_avg = merged_df.groupby('student_id')['grade_score'].transform('mean')
-        merged_df['student_avg_grade'] = student_avg
-    
-    # 2. Độ khó môn học (nếu có)
-    if 'difficulty_level' in merged_df.columns:
-        difficulty_map = {'Easy': 1, 'Medium': 2, 'Hard': 3}
-        merged_df['difficulty_numeric'] = merged_df['difficulty_level'].map(
-            lambda x: difficulty_map.get(x, 2)
-        )
-    
-    # 3. Tỷ lệ hoàn thành tổng thể
-    if 'attendance_rate' in merged_df.columns and 'homework_completion' in merged_df.columns:
-        merged_df['completion_rate'] = (
-            merged_df['attendance_rate'] * 0.4 + 
-            merged_df['homework_completion'] * 0.6
-        )
-    
-    # Mã hóa đặc trưng phân loại
-    categorical_cols = [col for col in categorical_features if col in merged_df.columns]
-    if categorical_cols:
-        merged_df, _ = encode_categorical_features(merged_df, categorical_cols)
-
-    # Tự động mã hóa các cột dạng object còn lại (tránh lỗi khi huấn luyện)
-    object_exclude = {
-        'student_id',
-        'subject_code',
-        'name',
-        'comment',
-        'strengths',
-        'improvements'
-    }
-    auto_categorical_cols = [
-        col for col in merged_df.select_dtypes(include=['object']).columns
-        if col not in object_exclude
-    ]
-    if auto_categorical_cols:
-        merged_df, _ = encode_categorical_features(merged_df, auto_categorical_cols)
-
-    # Chuẩn hóa đặc trưng số
-    numerical_cols = [col for col in numerical_features if col in merged_df.columns]
-    if numerical_cols:
-        merged_df, _ = normalize_numerical_features(merged_df, numerical_cols)
+    # Fit bộ mã hóa đặc trưng phân loại và chuẩn hóa đặc trưng số, rồi biến đổi
+    # Cột văn bản tự do được giữ dạng chữ để băm khi huấn luyện/tính điểm
+    hashed_text = get_hashed_text_config(config)
+    hashed_cols = hashed_text['columns'] if hashed_text else None
+    transformer = FeatureTransformer().fit(
+        merged_df, categorical_features, numerical_features, subjects_df, hashed_cols=hashed_cols
+    )
+    merged_df = transformer.transform_raw(merged_df)
     
     # Lưu file features
-    output_path = get_output_path('features.csv')
-    merged_df.to_csv(output_path, index=False, encoding='utf-8')
-    print(f"✅ Đã tạo file features.csv với {len(merged_df)} dòng và {len(merged_df.columns)} cột")
+    output_path = save_dataset(merged_df, 'features')
+    write_features(merged_df)
+    transformer.save()
+    record_stage('features', input_snapshot, stage_outputs, stage_params)
+    print(f"✅ Đã tạo file {output_path.name} với {len(merged_df)} dòng và {len(merged_df.columns)} cột")
     print(f"   Đường dẫn: {output_path}")
+    print(f"💾 Đã lưu bộ biến đổi đặc trưng (phiên bản {transformer.version}) tại: {TRANSFORMER_PATH}")
     
     return merged_df
 
 
+def load_student_raw_data(student_id: str):
+    """
+    Đọc điểm số và hồ sơ thô của một học sinh.
+    Ưu tiên database (truy vấn theo index student_id); nếu database chưa được nạp
+    thì quét bảng đã làm sạch theo từng chunk.
+    """
+    from database_manager import get_student_grades, get_student_profile, is_database_loaded
+
+    if is_database_loaded():
+        grades_df = pd.DataFrame(get_student_grades(student_id))
+        profile = get_student_profile(student_id)
+        profiles_df = pd.DataFrame([profile]) if profile else None
+        return grades_df, profiles_df
+
+    def scan(name: str) -> pd.DataFrame:
+        parts = [chunk[chunk['student_id'] == student_id] for chunk in iter_dataset(name)]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    grades_df = scan('grades_cleaned')
+    profiles_df = scan('student_profiles_cleaned') if dataset_exists('student_profiles_cleaned') else None
+    return grades_df, profiles_df
+
+
+def load_student_feedback(student_id: str) -> Optional[pd.DataFrame]:
+    """
+    Đọc các nhận xét thô của một học sinh (database theo index, hoặc quét bảng đã làm sạch);
+    None nếu không có nguồn nhận xét nào
+    """
+    from database_manager import get_student_feedback, is_database_loaded
+
+    if is_database_loaded():
+        return pd.DataFrame(get_student_feedback(student_id), columns=[
+            'student_id', 'subject_code', 'comment', 'strengths', 'improvements', 'semester'
+        ])
+    if not dataset_exists('feedback_cleaned'):
+        return None
+    parts = [chunk[chunk['student_id'] == student_id] for chunk in iter_dataset('feedback_cleaned')]
+    return pd.concat(parts, ignore_index=True) if parts else None
+
+
+def update_student_features(student_id: str):
+    """
+    Cập nhật tăng dần các dòng features của một học sinh (sau khi học sinh nhập điểm mới).
+    Chỉ đọc dữ liệu của học sinh đó, tính lại đặc trưng theo học sinh (student_avg_grade, ...)
+    bằng bộ biến đổi đã lưu và thay các dòng của học sinh trong kho features.
+    Chi phí tỷ lệ với số dòng của học sinh, không phụ thuộc tổng số dòng.
+
+    Nếu chưa có bộ biến đổi hoặc kho features, chạy create_features() đầy đủ.
+    Bảng mã hóa/tham số chuẩn hóa giữ nguyên như lần fit gần nhất; lần chạy pipeline đầy đủ
+    tiếp theo sẽ fit lại và tạo lại file features.
+    """
+    transformer = load_feature_transformer()
+    if transformer is None or not feature_store_exists():
+        print("⚠️  Chưa có bộ biến đổi đặc trưng hoặc kho features, tạo lại toàn bộ features...")
+        return create_features(force=True)
+
+    grades_df, profiles_df = load_student_raw_data(student_id)
+    if grades_df.empty:
+        print(f"⚠️  Không có dữ liệu điểm cho {student_id}")
+        return None
+
+    # Đặc trưng nhận xét của học sinh được tính lại từ nhận xét của học sinh đó (kho SQLite theo student_id)
+    feedback_rows = load_student_feedback(student_id)
+    feedback_df = (update_student_feedback_features(student_id, feedback_rows)
+                   if feedback_rows is not None else load_feedback_features(student_id))
+    student_features = transformer.transform(grades_df, profiles_df, feedback_df)
+    n_rows = replace_student_features(student_id, student_features)
+    # File features không còn khớp với kho features: lần chạy pipeline sau phải tạo lại
+    invalidate_stage('features')
+    print(f"✅ Đã cập nhật {n_rows} dòng features cho {student_id}")
+    return student_features
+
+
 if __name__ == '__main__':
     create_features()
 
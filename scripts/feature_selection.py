@@ -0,0 +1,150 @@
+"""
+Tự động bỏ các đặc trưng không có ích cho mô hình AI Score (permutation importance)
+Một phần (theo học sinh) của tập huấn luyện được tách làm tập kiểm định; mô hình huấn luyện trên
+phần còn lại, mỗi đặc trưng được xáo trộn trên tập kiểm định và đo R² giảm bao nhiêu; đặc trưng làm
+R² giảm ít hơn ngưỡng bị bỏ rồi mô hình được huấn luyện lại với các đặc trưng còn lại.
+Tập kiểm tra chỉ dùng để báo cáo kết quả cuối, không dùng để chọn đặc trưng.
+Danh sách rút gọn được ghi vào feature_info.json nên ai_score_calculator đọc và biến đổi ít cột hơn.
+
+- Mỗi cột văn bản mã hóa băm (interests, goals, ...) được đánh giá như một đặc trưng: các cột băm
+  dùng chung nên xáo trộn cột văn bản gốc rồi băm lại, không xáo trộn từng cột băm
+- Các đặc trưng được chia thành lô, mỗi lô chạy trong một process riêng (song song theo số lõi)
+- Dùng permutation importance thay vì impurity importance: dùng được cho mọi loại mô hình
+  (HistGradientBoosting không có feature_importances_) và cho các cột văn bản băm chung
+- Mô hình rút gọn chỉ được dùng nếu R² trên tập kiểm định không giảm quá max_r2_drop
+
+Cấu hình trong config/model_config.json:
+    "selection": {
+        "enabled": true,
+        "threshold": 0.001,
+        "n_repeats": 3,
+        "max_rows": 20000,
+        "max_r2_drop": 0.005,
+        "validation_size": 0.2,
+        "n_jobs": -1,
+        "random_state": 42
+    }
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from joblib import Parallel, delayed
+from sklearn.metrics import r2_score
+
+from feature_transformer import build_model_matrix, hash_text_features
+from hyperparameter_search import _as_matrix, _cpu_count
+
+DEFAULT_SELECTION_CONFIG = {
+    'enabled': True,
+    # Mức giảm R² trung bình tối thiểu khi xáo trộn để giữ một đặc trưng
+    'threshold': 0.001,
+    'n_repeats': 3,
+    # Số dòng tối đa của tập kiểm định dùng để đo (lấy mẫu ngẫu nhiên)
+    'max_rows': 20_000,
+    # R² trên tập kiểm định của mô hình rút gọn được phép thấp hơn mô hình đầy đủ tối đa bấy nhiêu
+    'max_r2_drop': 0.005,
+    # Tỷ lệ (theo học sinh) của tập huấn luyện tách ra làm tập kiểm định
+    'validation_size': 0.2,
+    'n_jobs': -1,
+    'random_state': 42,
+}
+
+
+def get_selection_config(config: Dict) -> Dict:
+    """Cấu hình chọn đặc trưng (mục "selection" của model_config.json) đã điền giá trị mặc định"""
+    return {**DEFAULT_SELECTION_CONFIG, **config.get('selection', {})}
+
+
+def _predict(model, X: np.ndarray, feature_cols: List[str]) -> np.ndarray:
+    """Dự đoán trên mảng dày; mô hình huấn luyện bằng DataFrame cần lại tên cột"""
+    if hasattr(model, 'feature_names_in_'):
+        return model.predict(pd.DataFrame(X, columns=feature_cols))
+    return model.predict(X)
+
+
+def _importance_batch(model, X: np.ndarray, y: np.ndarray, text: Optional[pd.DataFrame],
+                      batch: List[Tuple[int, str]], feature_cols: List[str], hashed_text: Optional[Dict],
+                      baseline: float, n_repeats: int, random_state: int) -> Dict[str, float]:
+    """Permutation importance (mức giảm R² trung bình) của một lô đặc trưng"""
+    n_dense = len(feature_cols)
+    importances = {}
+    for index, name in batch:
+        rng = np.random.default_rng([random_state, index])
+        X_perm = X.copy()
+        scores = []
+        for _ in range(n_repeats):
+            perm = rng.permutation(len(y))
+            if index < n_dense:
+                X_perm[:, index] = X[perm, index]
+            else:
+                # Cột văn bản: xáo trộn giá trị gốc rồi băm lại toàn bộ phần băm
+                shuffled = text.copy()
+                shuffled[name] = text[name].to_numpy()[perm]
+                hashed = hash_text_features(shuffled, hashed_text['columns'], hashed_text['n_features'])
+                X_perm[:, n_dense:] = hashed.toarray()
+            scores.append(baseline - r2_score(y, _predict(model, X_perm, feature_cols)))
+        importances[name] = float(np.mean(scores))
+    return importances
+
+
+def permutation_importances(model, frame: pd.DataFrame, y, feature_cols: List[str],
+                            hashed_text: Optional[Dict], selection_config: Dict) -> Dict[str, float]:
+    """
+    Permutation importance của từng đặc trưng và từng cột văn bản băm, tính song song.
+
+    Args:
+        frame: Các dòng của tập kiểm định (DataFrame features gốc, chưa biến đổi)
+        y: Giá trị mục tiêu của các dòng đó
+
+    Returns:
+        {tên đặc trưng hoặc cột văn bản: mức giảm R² trung bình khi xáo trộn}
+    """
+    y = np.asarray(y, dtype='float64')
+    random_state = selection_config.get('random_state', 42)
+    max_rows = selection_config.get('max_rows')
+    if max_rows and len(y) > max_rows:
+        rows = np.sort(np.random.default_rng(random_state).choice(len(y), size=max_rows, replace=False))
+        frame, y = frame.iloc[rows], y[rows]
+
+    X = _as_matrix(build_model_matrix(frame, feature_cols, hashed_text))
+    X = (X.toarray() if sp.issparse(X) else X).astype(np.float32)
+    baseline = r2_score(y, _predict(model, X, feature_cols))
+    text_cols = [col for col in hashed_text['columns'] if col in frame.columns] if hashed_text else []
+    text = frame[text_cols] if text_cols else None
+
+    names = list(enumerate(feature_cols)) + [(len(feature_cols) + i, col) for i, col in enumerate(text_cols)]
+    n_workers = min(_cpu_count(selection_config.get('n_jobs', -1)), len(names))
+    batches = [list(batch) for batch in np.array_split(np.array(names, dtype=object), n_workers) if len(batch)]
+    results = Parallel(n_jobs=n_workers)(
+        delayed(_importance_batch)(model, X, y, text, [(int(i), str(name)) for i, name in batch],
+                                   feature_cols, hashed_text, baseline,
+                                   int(selection_config['n_repeats']), random_state)
+        for batch in batches
+    )
+    importances = {}
+    for result in results:
+        importances.update(result)
+    return importances
+
+
+def select_features(importances: Dict[str, float], feature_cols: List[str], hashed_text: Optional[Dict],
+                    threshold: float) -> Tuple[List[str], Optional[Dict], List[str]]:
+    """
+    Bỏ các đặc trưng có importance dưới ngưỡng
+
+    Returns:
+        (đặc trưng giữ lại, cấu hình băm còn lại hoặc None nếu bỏ hết cột văn bản, các tên đã bỏ)
+    """
+    dropped = [name for name, value in importances.items() if value < threshold]
+    if len(dropped) == len(importances):
+        # Luôn giữ ít nhất đặc trưng quan trọng nhất
+        dropped.remove(max(importances, key=importances.get))
+    kept_cols = [col for col in feature_cols if col not in dropped]
+    kept_hashed = None
+    if hashed_text:
+        text_cols = [col for col in hashed_text['columns'] if col not in dropped]
+        kept_hashed = {**hashed_text, 'columns': text_cols} if text_cols else None
+    return kept_cols, kept_hashed, dropped
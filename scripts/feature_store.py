@@ -0,0 +1,290 @@
+"""
+Kho features dạng SQLite (data/output/feature_store.db)
+Bảng features có index theo (student_id, year, semester) để thay thế/đọc các dòng features
+của một học sinh mà không phải đọc hay ghi lại toàn bộ file features.
+
+- write_features(): ghi lại toàn bộ bảng (gọi từ create_features)
+- replace_student_features(): thay các dòng của một học sinh (cập nhật tăng dần)
+- load_features_for_student(): đọc các dòng của một học sinh (tính AI Score theo yêu cầu);
+  chi phí chỉ phụ thuộc số dòng của học sinh đó, không phụ thuộc tổng số học sinh
+
+Bảng feature_changes ghi lại các học sinh đã được cập nhật tăng dần kể từ lần ghi lại toàn bộ
+bảng; huấn luyện tăng dần (ai_model.update_model) chỉ đọc các dòng của những học sinh này.
+
+Bảng feedback_features (đặc trưng nhận xét, feedback_features.py) cũng được lưu ở đây với
+index theo student_id để cập nhật/tra cứu nhận xét của một học sinh không phải quét cả bảng.
+"""
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import pandas as pd
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
+FEATURE_STORE_PATH = DATA_OUTPUT / 'feature_store.db'
+
+FEATURES_TABLE = 'features'
+CHANGES_TABLE = 'feature_changes'
+FEEDBACK_TABLE = 'feedback_features'
+WRITE_BATCH_SIZE = 50_000
+# Cột của index tra cứu (chỉ dùng các cột có trong bảng; student_id luôn đứng đầu)
+INDEX_COLUMNS = ['student_id', 'year', 'semester']
+
+
+def get_connection() -> sqlite3.Connection:
+    """Kết nối tới kho features"""
+    DATA_OUTPUT.mkdir(parents=True, exist_ok=True)
+    return sqlite3.connect(str(FEATURE_STORE_PATH))
+
+
+def _table_exists(table: str) -> bool:
+    if not FEATURE_STORE_PATH.exists():
+        return False
+    conn = get_connection()
+    try:
+        row = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        return row is not None
+    finally:
+        conn.close()
+
+
+def feature_store_exists() -> bool:
+    """Kho features đã được tạo (có bảng features) hay chưa"""
+    return _table_exists(FEATURES_TABLE)
+
+
+def feedback_store_exists() -> bool:
+    """Bảng đặc trưng nhận xét trong kho đã được tạo hay chưa"""
+    return _table_exists(FEEDBACK_TABLE)
+
+
+def _sqlite_type(dtype) -> str:
+    """Kiểu cột SQLite tương ứng với kiểu pandas"""
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _rows(df: pd.DataFrame) -> List[tuple]:
+    """Chuyển DataFrame thành các tuple kiểu Python cho executemany (NaN -> NULL)"""
+    values = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == 'float32':
+            series = series.astype('float64')
+        series = series.astype(object)
+        values.append(series.where(series.notna(), None).tolist())
+    return list(zip(*values))
+
+
+def _create_table(conn: sqlite3.Connection, table: str, df: pd.DataFrame):
+    columns = ', '.join(f"{_quote(col)} {_sqlite_type(df[col].dtype)}" for col in df.columns)
+    conn.execute(f"CREATE TABLE {table} ({columns})")
+
+
+def _insert(conn: sqlite3.Connection, df: pd.DataFrame, table: str = FEATURES_TABLE):
+    columns = ', '.join(_quote(col) for col in df.columns)
+    placeholders = ', '.join('?' * len(df.columns))
+    sql = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+    for start in range(0, len(df), WRITE_BATCH_SIZE):
+        conn.executemany(sql, _rows(df.iloc[start:start + WRITE_BATCH_SIZE]))
+
+
+def write_features(df: pd.DataFrame):
+    """Ghi lại toàn bộ bảng features (một transaction, index tạo sau khi ghi)"""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(f"DROP TABLE IF EXISTS {FEATURES_TABLE}")
+            # Toàn bộ bảng được tạo lại: không còn thay đổi nào chờ huấn luyện tăng dần
+            conn.execute(f"DROP TABLE IF EXISTS {CHANGES_TABLE}")
+            _create_table(conn, FEATURES_TABLE, df)
+            _insert(conn, df)
+            index_cols = ', '.join(_quote(col) for col in INDEX_COLUMNS if col in df.columns)
+            conn.execute(f"CREATE INDEX idx_features_student_term ON {FEATURES_TABLE} ({index_cols})")
+    finally:
+        conn.close()
+
+
+def table_columns(table: str = FEATURES_TABLE) -> List[str]:
+    """Danh sách cột của một bảng trong kho (mặc định bảng features)"""
+    conn = get_connection()
+    try:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+
+
+def replace_student_features(student_id: str, df: pd.DataFrame) -> int:
+    """
+    Thay toàn bộ dòng features của một học sinh bằng các dòng mới (dùng index student_id).
+    Cột không có trong bảng bị bỏ qua, cột thiếu được ghi NULL. Trả về số dòng đã ghi.
+    """
+    df = df.reindex(columns=table_columns())
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(f"DELETE FROM {FEATURES_TABLE} WHERE student_id = ?", (student_id,))
+            _insert(conn, df)
+            _ensure_changes_table(conn)
+            conn.execute(
+                f"INSERT OR REPLACE INTO {CHANGES_TABLE} (student_id, changed_at) VALUES (?, ?)",
+                (student_id, time.time())
+            )
+    finally:
+        conn.close()
+    return len(df)
+
+
+def _ensure_changes_table(conn: sqlite3.Connection):
+    conn.execute(
+        f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} (student_id TEXT PRIMARY KEY, changed_at REAL)"
+    )
+
+
+def count_changed_rows() -> int:
+    """Số dòng features của các học sinh đã cập nhật tăng dần và chưa được huấn luyện"""
+    if not feature_store_exists():
+        return 0
+    conn = get_connection()
+    try:
+        _ensure_changes_table(conn)
+        row = conn.execute(
+            f"SELECT COUNT(*) FROM {FEATURES_TABLE} WHERE student_id IN (SELECT student_id FROM {CHANGES_TABLE})"
+        ).fetchone()
+        return int(row[0])
+    finally:
+        conn.close()
+
+
+def load_changed_features() -> Tuple[Optional[pd.DataFrame], float]:
+    """
+    Đọc các dòng features của những học sinh đã cập nhật tăng dần.
+
+    Returns:
+        (DataFrame hoặc None nếu kho chưa được tạo, mốc thời gian của thay đổi mới nhất đã đọc;
+        truyền mốc này cho clear_changes() để không xóa thay đổi đến sau khi đọc)
+    """
+    if not feature_store_exists():
+        return None, 0.0
+    conn = get_connection()
+    try:
+        with conn:
+            _ensure_changes_table(conn)
+            cutoff = conn.execute(f"SELECT COALESCE(MAX(changed_at), 0) FROM {CHANGES_TABLE}").fetchone()[0]
+            df = pd.read_sql_query(
+                f"SELECT * FROM {FEATURES_TABLE} "
+                f"WHERE student_id IN (SELECT student_id FROM {CHANGES_TABLE} WHERE changed_at <= ?)",
+                conn, params=(cutoff,)
+            )
+        return df, float(cutoff)
+    finally:
+        conn.close()
+
+
+def clear_changes(cutoff: float):
+    """Xóa các thay đổi đến trước mốc cutoff (đã được đưa vào mô hình)"""
+    if not feature_store_exists():
+        return
+    conn = get_connection()
+    try:
+        with conn:
+            _ensure_changes_table(conn)
+            conn.execute(f"DELETE FROM {CHANGES_TABLE} WHERE changed_at <= ?", (cutoff,))
+    finally:
+        conn.close()
+
+
+def load_features_for_student(student_id: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+    """
+    Đọc các dòng features của một học sinh qua index (không quét toàn bảng).
+
+    Args:
+        columns: Chỉ đọc các cột này (cột không có trong bảng bị bỏ qua); None = tất cả
+
+    Returns:
+        DataFrame (có thể rỗng nếu không có học sinh), None nếu kho chưa được tạo
+    """
+    if not feature_store_exists():
+        return None
+    select = '*'
+    if columns is not None:
+        existing = set(table_columns())
+        select = ', '.join(_quote(col) for col in columns if col in existing) or '*'
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(
+            f"SELECT {select} FROM {FEATURES_TABLE} WHERE student_id = ?", conn, params=(student_id,)
+        )
+    finally:
+        conn.close()
+
+
+def write_feedback_features(df: pd.DataFrame):
+    """Ghi lại toàn bộ bảng đặc trưng nhận xét (gọi từ build_feedback_features), index theo student_id"""
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(f"DROP TABLE IF EXISTS {FEEDBACK_TABLE}")
+            _create_table(conn, FEEDBACK_TABLE, df)
+            _insert(conn, df, FEEDBACK_TABLE)
+            conn.execute(f"CREATE INDEX idx_feedback_features_student ON {FEEDBACK_TABLE} (student_id)")
+    finally:
+        conn.close()
+
+
+def replace_student_feedback_features(student_id: str, df: pd.DataFrame) -> int:
+    """
+    Thay các dòng đặc trưng nhận xét của một học sinh (tạo bảng nếu chưa có).
+    Trả về số dòng đã ghi.
+    """
+    if not feedback_store_exists():
+        write_feedback_features(df)
+        return len(df)
+    df = df.reindex(columns=table_columns(FEEDBACK_TABLE))
+    conn = get_connection()
+    try:
+        with conn:
+            conn.execute(f"DELETE FROM {FEEDBACK_TABLE} WHERE student_id = ?", (student_id,))
+            _insert(conn, df, FEEDBACK_TABLE)
+    finally:
+        conn.close()
+    return len(df)
+
+
+def load_student_feedback_features(student_id: str) -> Optional[pd.DataFrame]:
+    """
+    Đọc đặc trưng nhận xét của một học sinh qua index student_id.
+
+    Returns:
+        DataFrame (có thể rỗng), None nếu bảng chưa được tạo
+    """
+    if not feedback_store_exists():
+        return None
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(
+            f"SELECT * FROM {FEEDBACK_TABLE} WHERE student_id = ?", conn, params=(student_id,)
+        )
+    finally:
+        conn.close()
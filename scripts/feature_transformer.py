@@ -0,0 +1,421 @@
+"""
+Bộ biến đổi đặc trưng (Feature Transformer) dùng chung cho huấn luyện và chấm điểm trực tuyến
+Lưu lại mọi thứ đã "học" được khi tạo features (bảng mã hóa nhãn, trung bình/độ lệch chuẩn
+để chuẩn hóa, bảng môn học, thứ tự cột) vào models/feature_transformer.pkl, để biến đổi
+dữ liệu thô của một học sinh mà không cần đọc lại hay ghi lại toàn bộ features.
+
+create_features() trong feature_engineering.py dùng chính transform() của lớp này,
+nên features offline và features tính trực tuyến luôn giống nhau.
+"""
+
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from sklearn.feature_extraction import FeatureHasher
+
+from feedback_features import join_feedback_features
+from schemas import TEXT_DTYPE, decategorize_numeric, get_schema
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+MODELS_DIR = PROJECT_ROOT / 'models'
+TRANSFORMER_PATH = MODELS_DIR / 'feature_transformer.pkl'
+
+# Phiên bản định dạng file; tăng khi thay đổi cấu trúc để không đọc nhầm file cũ
+TRANSFORMER_FORMAT_VERSION = 1
+
+DIFFICULTY_MAP = {'Easy': 1, 'Medium': 2, 'Hard': 3}
+
+# Số học kỳ gần nhất (tính cả kỳ hiện tại) dùng cho điểm trung bình trượt
+TEMPORAL_WINDOW = 3
+
+# Cột văn bản/định danh không được mã hóa nhãn
+NON_ENCODED_COLUMNS = {
+    'student_id',
+    'subject_code',
+    'name',
+    'comment',
+    'strengths',
+    'improvements'
+}
+
+# Mã hóa băm cho cột văn bản tự do (mục features.hashed_text trong model_config.json):
+# mỗi ô được tách thành các token theo dấu phẩy rồi băm vào số cột cố định
+DEFAULT_HASH_FEATURES = 64
+TOKEN_SEPARATOR = ','
+
+# Giá trị dùng cho ô thiếu khi mã hóa nhãn
+MISSING_LABEL = 'nan'
+# Mã của giá trị chưa gặp khi fit
+UNKNOWN_CODE = -1
+
+
+def build_raw_features(grades_df: pd.DataFrame, subjects_df: pd.DataFrame,
+                       profiles_df: Optional[pd.DataFrame] = None,
+                       feedback_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Ghép điểm số với môn học, hồ sơ và đặc trưng nhận xét (feedback_features.py),
+    tính các đặc trưng dẫn xuất (chưa mã hóa/chuẩn hóa): student_avg_grade,
+    difficulty_numeric, completion_rate và các đặc trưng theo thời gian (xem add_temporal_features)
+    """
+    merged_df = grades_df.merge(subjects_df, on='subject_code', how='left')
+    if profiles_df is not None:
+        merged_df = merged_df.merge(profiles_df, on='student_id', how='left')
+    merged_df = join_feedback_features(merged_df, feedback_df)
+
+    # Cột category có giá trị số (học kỳ) được dùng như số, không mã hóa nhãn
+    merged_df = decategorize_numeric(merged_df)
+
+    # 1. Điểm trung bình của sinh viên
+    if 'grade_score' in merged_df.columns:
+        merged_df['student_avg_grade'] = (
+            merged_df.groupby('student_id', observed=True)['grade_score'].transform('mean')
+        )
+
+    # 2. Độ khó môn học (nếu có)
+    if 'difficulty_level' in merged_df.columns:
+        merged_df['difficulty_numeric'] = (
+            merged_df['difficulty_level'].astype(object).map(DIFFICULTY_MAP).fillna(2).astype('int8')
+        )
+
+    # 3. Tỷ lệ hoàn thành tổng thể
+    if 'attendance_rate' in merged_df.columns and 'homework_completion' in merged_df.columns:
+        merged_df['completion_rate'] = (
+            merged_df['attendance_rate'] * 0.4 +
+            merged_df['homework_completion'] * 0.6
+        )
+
+    # 4. Đặc trưng theo thời gian (học kỳ trước, xu hướng, trung bình trượt)
+    merged_df = add_temporal_features(merged_df)
+
+    return merged_df
+
+
+def _numeric_values(series: pd.Series) -> np.ndarray:
+    return pd.to_numeric(series.astype(object), errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _changed(values: np.ndarray) -> np.ndarray:
+    """True tại vị trí có giá trị khác vị trí liền trước (NaN coi như bằng NaN)"""
+    a, b = values[1:], values[:-1]
+    differs = (a != b)
+    if values.dtype.kind == 'f':
+        differs &= ~(np.isnan(a) & np.isnan(b))
+    return np.r_[True, differs]
+
+
+def _term_means(values: np.ndarray, term_id: np.ndarray, n_terms: int) -> np.ndarray:
+    """Trung bình theo học kỳ (bỏ qua NaN; học kỳ không có giá trị -> NaN)"""
+    valid = ~np.isnan(values)
+    sums = np.bincount(term_id, weights=np.where(valid, values, 0.0), minlength=n_terms)
+    counts = np.bincount(term_id, weights=valid, minlength=n_terms)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _previous(values: np.ndarray, first: np.ndarray) -> np.ndarray:
+    """Giá trị ở vị trí liền trước trong cùng nhóm (vị trí đầu nhóm -> NaN)"""
+    prev = np.r_[np.nan, values[:-1]]
+    prev[first] = np.nan
+    return prev
+
+
+def add_temporal_features(df: pd.DataFrame, window: int = TEMPORAL_WINDOW) -> pd.DataFrame:
+    """
+    Thêm đặc trưng theo thời gian cho mỗi dòng điểm (cần student_id, year, semester, grade_score).
+
+    Theo học sinh (trên điểm trung bình từng học kỳ của học sinh):
+    - term_avg_grade, prev_term_avg_grade, term_grade_delta
+    - rolling_avg_grade: trung bình của tối đa `window` học kỳ gần nhất, tính cả kỳ hiện tại
+    - prev_term_attendance, attendance_trend (nếu có attendance_rate)
+    - terms_completed: số học kỳ trước đó của học sinh
+    Theo (học sinh, môn học):
+    - prev_subject_grade, subject_grade_delta, subject_attempt (lần học thứ mấy)
+
+    Chỉ sắp xếp một lần theo (học sinh, năm, học kỳ); mọi đặc trưng còn lại tính bằng
+    shift/cumsum vector hóa trên thứ tự đó, không lặp theo từng dòng.
+    Giá trị không có học kỳ trước được để trống (NaN).
+    """
+    required = {'student_id', 'year', 'semester', 'grade_score'}
+    if df.empty or not required.issubset(df.columns):
+        return df
+
+    student = pd.factorize(df['student_id'])[0]
+    year = _numeric_values(df['year'])
+    semester = _numeric_values(df['semester'])
+    order = np.lexsort((semester, year, student))
+
+    student_s, year_s, semester_s = student[order], year[order], semester[order]
+    grade_s = _numeric_values(df['grade_score'])[order]
+
+    # Học kỳ của từng học sinh: các đoạn liên tiếp có cùng (học sinh, năm, học kỳ)
+    term_start = _changed(student_s) | _changed(year_s) | _changed(semester_s)
+    term_id = np.cumsum(term_start) - 1
+    n_terms = int(term_id[-1]) + 1
+    term_student = student_s[term_start]
+    first_term = _changed(term_student)
+
+    term_grade = _term_means(grade_s, term_id, n_terms)
+    prev_term_grade = _previous(term_grade, first_term)
+
+    # Vị trí học kỳ trong lịch sử của học sinh và trung bình trượt bằng hiệu tổng cộng dồn
+    term_index = np.arange(n_terms)
+    student_first = np.maximum.accumulate(np.where(first_term, term_index, 0))
+    terms_completed = term_index - student_first
+    has_grade = ~np.isnan(term_grade)
+    grade_cumsum = np.r_[0.0, np.cumsum(np.where(has_grade, term_grade, 0.0))]
+    count_cumsum = np.r_[0, np.cumsum(has_grade)]
+    window_start = np.maximum(term_index - window + 1, student_first)
+    window_count = count_cumsum[term_index + 1] - count_cumsum[window_start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rolling_grade = np.where(
+            window_count > 0,
+            (grade_cumsum[term_index + 1] - grade_cumsum[window_start]) / np.maximum(window_count, 1),
+            np.nan
+        )
+
+    term_features = {
+        'term_avg_grade': term_grade,
+        'prev_term_avg_grade': prev_term_grade,
+        'term_grade_delta': term_grade - prev_term_grade,
+        'rolling_avg_grade': rolling_grade,
+        'terms_completed': terms_completed,
+    }
+    if 'attendance_rate' in df.columns:
+        term_attendance = _term_means(_numeric_values(df['attendance_rate'])[order], term_id, n_terms)
+        prev_term_attendance = _previous(term_attendance, first_term)
+        term_features['prev_term_attendance'] = prev_term_attendance
+        term_features['attendance_trend'] = term_attendance - prev_term_attendance
+
+    # Đưa về thứ tự dòng ban đầu: dòng thứ order[i] thuộc học kỳ term_id[i]
+    row_term = np.empty(len(df), dtype=np.int64)
+    row_term[order] = term_id
+    result = {name: values[row_term] for name, values in term_features.items()}
+
+    # Theo (học sinh, môn học): shift trong nhóm trên thứ tự thời gian đã sắp xếp
+    if 'subject_code' in df.columns:
+        subject_s = pd.factorize(df['subject_code'])[0][order]
+        sorted_grades = pd.DataFrame({'student': student_s, 'subject': subject_s, 'grade': grade_s})
+        pair = sorted_grades.groupby(['student', 'subject'], sort=False)
+        prev_subject_grade = np.empty(len(df))
+        prev_subject_grade[order] = pair['grade'].shift(1).to_numpy(dtype='float64', na_value=np.nan)
+        subject_attempt = np.empty(len(df), dtype=np.int64)
+        subject_attempt[order] = pair.cumcount().to_numpy() + 1
+        result['prev_subject_grade'] = prev_subject_grade
+        result['subject_grade_delta'] = _numeric_values(df['grade_score']) - prev_subject_grade
+        result['subject_attempt'] = subject_attempt
+
+    return df.assign(**result)
+
+
+def get_hashed_text_config(config: Dict) -> Optional[Dict]:
+    """
+    Cấu hình mã hóa băm từ model_config.json, ví dụ:
+        "features": {"hashed_text": {"columns": ["interests", "goals"], "n_features": 64}}
+    Trả về None nếu không có cột nào được cấu hình (các cột đó sẽ được mã hóa nhãn như cũ).
+    """
+    hashed = config.get('features', {}).get('hashed_text') or {}
+    columns = list(hashed.get('columns', []))
+    if not columns:
+        return None
+    return {'columns': columns, 'n_features': int(hashed.get('n_features', DEFAULT_HASH_FEATURES))}
+
+
+def _tokenize(value: str, column: str) -> List[str]:
+    """Tách ô văn bản thành token (chữ thường, có tiền tố tên cột để các cột không lẫn nhau)"""
+    return [f"{column}={token.strip().lower()}" for token in value.split(TOKEN_SEPARATOR) if token.strip()]
+
+
+def hash_text_features(df: pd.DataFrame, columns: List[str], n_features: int) -> sp.csr_matrix:
+    """
+    Băm token của các cột văn bản vào ma trận thưa (số dòng x n_features).
+    Không lưu bảng từ vựng nên bộ nhớ không tăng theo số giá trị khác nhau; mỗi giá trị
+    khác nhau chỉ được tách/băm một lần rồi lấy theo mã của từng dòng.
+    """
+    hasher = FeatureHasher(n_features=n_features, input_type='string', alternate_sign=False)
+    matrix = sp.csr_matrix((len(df), n_features), dtype=np.float32)
+    for col in columns:
+        if col not in df.columns:
+            continue
+        codes, uniques = pd.factorize(df[col].astype(object))
+        if not len(uniques):
+            continue
+        unique_matrix = hasher.transform(_tokenize(str(value), col) for value in uniques).astype(np.float32)
+        rows = unique_matrix[np.maximum(codes, 0)]
+        if (codes < 0).any():
+            # Ô thiếu không có token
+            rows = sp.diags((codes >= 0).astype(np.float32)) @ rows
+        matrix = matrix + rows
+    return matrix.tocsr()
+
+
+def build_model_matrix(df: pd.DataFrame, feature_cols: List[str], hashed_text: Optional[Dict] = None):
+    """
+    Ma trận đầu vào cho mô hình (dùng chung khi huấn luyện và khi tính AI Score).
+    Không có cấu hình băm: DataFrame các cột đặc trưng (như trước);
+    có cấu hình băm: ma trận thưa CSR = [các cột đặc trưng | các cột băm].
+    """
+    X = df[feature_cols].fillna(0)
+    if not hashed_text:
+        return X
+    dense = sp.csr_matrix(X.to_numpy(dtype='float32', na_value=0))
+    hashed = hash_text_features(df, hashed_text['columns'], hashed_text['n_features'])
+    return sp.hstack([dense, hashed], format='csr')
+
+
+def _coerce_numeric(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    """
+    Ép kiểu số cho các cột số theo schema (bản nhẹ của apply_schema cho vài dòng:
+    không chuyển sang category vì mã hóa nhãn làm việc được với cả hai kiểu)
+    """
+    df = df.copy(deep=False)
+    for col, dtype in get_schema(dataset).items():
+        if dtype not in ('category', TEXT_DTYPE) and col in df.columns:
+            df[col] = pd.to_numeric(df[col].astype(object), errors='coerce')
+    return df
+
+
+def _label_strings(series: pd.Series) -> pd.Series:
+    """Giá trị dạng chuỗi dùng để mã hóa nhãn (ô thiếu -> 'nan')"""
+    return series.astype(object).where(series.notna(), MISSING_LABEL).astype(str)
+
+
+def _fit_classes(series: pd.Series) -> pd.Index:
+    """Danh sách nhãn đã sắp xếp (giống LabelEncoder.classes_)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        labels = set(series.cat.categories.astype(str))
+        if series.isna().any():
+            labels.add(MISSING_LABEL)
+        return pd.Index(sorted(labels))
+    return pd.Index(np.sort(_label_strings(series).unique()))
+
+
+def _encode(series: pd.Series, classes: pd.Index) -> np.ndarray:
+    """Mã hóa nhãn theo danh sách nhãn đã fit; nhãn chưa gặp -> UNKNOWN_CODE"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Chỉ tra cứu danh sách category rồi lấy theo mã, không tạo chuỗi cho từng dòng
+        category_codes = classes.get_indexer(series.cat.categories.astype(str))
+        missing_code = classes.get_indexer([MISSING_LABEL])[0]
+        codes = series.cat.codes.to_numpy()
+        return np.where(codes >= 0, category_codes[np.maximum(codes, 0)], missing_code)
+    return classes.get_indexer(_label_strings(series))
+
+
+class FeatureTransformer:
+    """
+    Biến đổi dữ liệu thô (điểm số + hồ sơ) thành các dòng features cho mô hình.
+
+    Dùng:
+        transformer = FeatureTransformer().fit(raw_df, categorical_cols, numerical_cols, subjects_df)
+        features_df = transformer.transform_raw(raw_df)             # toàn bộ dữ liệu
+        student_df = transformer.transform(grade_rows, profile_row) # một học sinh
+    """
+
+    def __init__(self):
+        self.format_version = TRANSFORMER_FORMAT_VERSION
+        self.fitted_at: Optional[str] = None
+        self.n_rows = 0
+        self.classes: Dict[str, pd.Index] = {}
+        self.scaling: Dict[str, tuple] = {}
+        self.subjects: Optional[pd.DataFrame] = None
+        self.columns: List[str] = []
+
+    @property
+    def version(self) -> str:
+        """Phiên bản của bộ biến đổi (đổi mỗi lần fit lại)"""
+        return f"{self.format_version}-{self.fitted_at}"
+
+    def fit(self, raw_df: pd.DataFrame, categorical_cols: List[str], numerical_cols: List[str],
+            subjects_df: pd.DataFrame, hashed_cols: Optional[List[str]] = None) -> 'FeatureTransformer':
+        """
+        Học bảng mã hóa và tham số chuẩn hóa từ dữ liệu thô đã ghép (build_raw_features).
+
+        Args:
+            categorical_cols: Cột phân loại theo cấu hình; các cột object/category còn lại
+                              (trừ NON_ENCODED_COLUMNS) cũng được mã hóa
+            numerical_cols: Cột số cần chuẩn hóa (z-score như StandardScaler)
+            hashed_cols: Cột văn bản được mã hóa băm khi đưa vào mô hình (build_model_matrix);
+                         giữ nguyên dạng chữ, không mã hóa nhãn
+        """
+        skipped = NON_ENCODED_COLUMNS | set(hashed_cols or [])
+        auto_cols = [
+            col for col in raw_df.select_dtypes(include=['object', 'category', 'string']).columns
+            if col not in skipped
+        ]
+        encoded_cols = [col for col in categorical_cols if col in raw_df.columns and col not in skipped]
+        encoded_cols += [col for col in auto_cols if col not in encoded_cols]
+        self.classes = {col: _fit_classes(raw_df[col]) for col in encoded_cols}
+
+        self.scaling = {}
+        for col in numerical_cols:
+            if col not in raw_df.columns:
+                continue
+            values = raw_df[col].to_numpy(dtype='float64', na_value=np.nan)
+            mean = float(np.nanmean(values)) if len(values) else 0.0
+            scale = float(np.nanstd(values)) if len(values) else 1.0
+            # Giống StandardScaler: cột hằng số không chia cho 0
+            self.scaling[col] = (mean, scale if scale > 0 else 1.0)
+
+        # Bảng môn học lưu dạng object để ghép nhanh với vài dòng dữ liệu thô
+        self.subjects = decategorize_numeric(
+            subjects_df.drop_duplicates(subset=['subject_code']).reset_index(drop=True)
+        ).astype({col: object for col in subjects_df.select_dtypes(include='category').columns})
+        self.columns = list(raw_df.columns)
+        self.n_rows = len(raw_df)
+        self.fitted_at = time.strftime('%Y%m%d-%H%M%S')
+        return self
+
+    def transform_raw(self, raw_df: pd.DataFrame) -> pd.DataFrame:
+        """Mã hóa và chuẩn hóa dữ liệu thô đã ghép; trả về các cột theo đúng thứ tự lúc fit"""
+        df = raw_df.reindex(columns=self.columns)
+        for col, classes in self.classes.items():
+            df[col] = _encode(df[col], classes)
+        for col, (mean, scale) in self.scaling.items():
+            df[col] = (df[col].to_numpy(dtype='float64', na_value=np.nan) - mean) / scale
+        return df
+
+    def transform(self, grades_df: pd.DataFrame, profiles_df: Optional[pd.DataFrame] = None,
+                  feedback_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """
+        Biến đổi các dòng điểm thô (ví dụ của một học sinh) thành features.
+        Chỉ dùng bảng môn học và tham số đã lưu, không đọc dữ liệu khác.
+        Đặc trưng theo học sinh (student_avg_grade) được tính trên các dòng truyền vào,
+        nên cần truyền toàn bộ điểm của học sinh đó.
+        """
+        grades_df = _coerce_numeric(grades_df, 'grades')
+        raw_df = build_raw_features(grades_df, self.subjects, profiles_df, feedback_df)
+        return self.transform_raw(raw_df)
+
+    def save(self, path: Path = TRANSFORMER_PATH) -> Path:
+        """Lưu bộ biến đổi (ghi file tạm rồi thay thế)"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + '.tmp')
+        joblib.dump(self, tmp_path)
+        tmp_path.replace(path)
+        return path
+
+
+def load_feature_transformer(path: Path = TRANSFORMER_PATH) -> Optional[FeatureTransformer]:
+    """Tải bộ biến đổi đã lưu; None nếu chưa có hoặc khác phiên bản định dạng"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    transformer = joblib.load(path)
+    if getattr(transformer, 'format_version', None) != TRANSFORMER_FORMAT_VERSION:
+        print(f"⚠️  Bộ biến đổi đặc trưng có phiên bản cũ, cần chạy lại Feature Engineering: {path}")
+        return None
+    return transformer
@@ -0,0 +1,277 @@
+"""
+Đặc trưng từ nhận xét của giáo viên (feedback_cleaned)
+Biến các cột văn bản comment, strengths, improvements thành vài cột số gọn,
+gộp theo (student_id, subject_code, semester) để ghép vào features:
+- feedback_count: số nhận xét
+- feedback_sentiment: điểm cảm xúc trung bình theo từ điển tiếng Việt, trong khoảng [-1, 1]
+- feedback_positive / feedback_negative: số từ tích cực / tiêu cực trung bình
+- feedback_length: số từ trung bình
+- feedback_hash_0..N: túi từ (bag of words) được băm vào số cột cố định, lấy trung bình
+
+Bảng nhận xét được đọc theo từng chunk. Kết quả vector hóa của từng nội dung nhận xét
+được lưu cache theo hash nội dung (data/output/feedback_text_cache), nên lần chạy sau
+chỉ tách từ các nhận xét mới hoặc đã bị sửa.
+
+Kết quả được ghi ra bảng feedback_features và vào kho SQLite (feature_store.py, index theo
+student_id): cập nhật tăng dần một học sinh (update_student_feedback_features) và tra cứu
+load_feedback_features(student_id) chỉ đọc/ghi các dòng của học sinh đó.
+"""
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction import FeatureHasher
+
+from data_store import dataset_exists, dataset_path, find_dataset, iter_dataset, load_dataset, save_dataset
+from feature_store import (
+    feedback_store_exists, load_student_feedback_features, replace_student_feedback_features, write_feedback_features
+)
+from pipeline_manifest import invalidate_stage, is_stage_fresh, record_stage, snapshot_inputs
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
+
+FEEDBACK_KEYS = ['student_id', 'subject_code', 'semester']
+TEXT_COLUMNS = ['comment', 'strengths', 'improvements']
+FEEDBACK_HASH_FEATURES = 16
+CACHE_NAME = 'feedback_text_cache'
+OUTPUT_NAME = 'feedback_features'
+
+# Từ điển cảm xúc (âm tiết hoặc cụm hai âm tiết, chữ thường)
+POSITIVE_WORDS = {
+    'tốt', 'giỏi', 'xuất sắc', 'tích cực', 'chăm chỉ', 'chăm', 'tiến bộ', 'cố gắng', 'nỗ lực',
+    'hăng hái', 'sáng tạo', 'vững', 'năng động', 'tự giác', 'cẩn thận', 'nhanh', 'hiểu bài',
+    'khá', 'đạt', 'tập trung', 'say mê', 'nhiệt tình', 'chủ động', 'ổn định', 'năng lực',
+}
+NEGATIVE_WORDS = {
+    'yếu', 'kém', 'chậm', 'lười', 'thiếu', 'hổng', 'lơ là', 'sai', 'vắng', 'muộn', 'cẩu thả',
+    'mất tập trung', 'xao nhãng', 'sao nhãng', 'thụ động', 'chểnh mảng', 'bỏ bài', 'hạn chế',
+}
+LEXICON = POSITIVE_WORDS | NEGATIVE_WORDS
+# Từ phủ định đứng trước làm đổi dấu ("chưa tốt", "không tập trung")
+NEGATIONS = {'không', 'chưa', 'chẳng', 'chả'}
+
+TOKEN_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+VECTOR_COLUMNS = (
+    ['feedback_length', 'feedback_positive', 'feedback_negative', 'feedback_sentiment']
+    + [f'feedback_hash_{i}' for i in range(FEEDBACK_HASH_FEATURES)]
+)
+FEATURE_COLUMNS = ['feedback_count'] + VECTOR_COLUMNS
+
+
+def _sentiment_counts(tokens: List[str]):
+    """Số từ/cụm từ tích cực và tiêu cực (xét cả cụm hai âm tiết và từ phủ định đứng trước)"""
+    positive = negative = 0
+    i = 0
+    while i < len(tokens):
+        # Ưu tiên cụm hai âm tiết ("tích cực"); cụm ba âm tiết như "mất tập trung" được xét
+        # qua âm tiết đứng trước cụm "tập trung"
+        if i + 1 < len(tokens) and f"{tokens[i]} {tokens[i + 1]}" in LEXICON:
+            word, width = f"{tokens[i]} {tokens[i + 1]}", 2
+        else:
+            word, width = tokens[i], 1
+        polarity = (word in POSITIVE_WORDS) - (word in NEGATIVE_WORDS)
+        if polarity and i > 0 and tokens[i - 1] in NEGATIONS:
+            polarity = -polarity
+        if i > 0 and f"{tokens[i - 1]} {word}" in NEGATIVE_WORDS:
+            polarity = -1
+        positive += polarity > 0
+        negative += polarity < 0
+        i += width
+    return positive, negative
+
+
+def vectorize_texts(texts: List[str]) -> np.ndarray:
+    """
+    Vector hóa các nội dung nhận xét: [số từ, số từ tích cực, số từ tiêu cực, điểm cảm xúc,
+    túi từ được băm]. Mỗi phần tử là một nội dung (đã ghép comment/strengths/improvements).
+    """
+    token_lists = [TOKEN_PATTERN.findall(text.lower()) for text in texts]
+    counts = np.array([_sentiment_counts(tokens) for tokens in token_lists], dtype='float64').reshape(-1, 2)
+    positive, negative = counts[:, 0], counts[:, 1]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sentiment = np.where(positive + negative > 0, (positive - negative) / (positive + negative), 0.0)
+    lengths = np.array([len(tokens) for tokens in token_lists], dtype='float64')
+
+    hasher = FeatureHasher(n_features=FEEDBACK_HASH_FEATURES, input_type='string', alternate_sign=False)
+    hashed = hasher.transform(token_lists).toarray()
+    return np.column_stack([lengths, positive, negative, sentiment, hashed])
+
+
+def _text_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Hash 64-bit nội dung nhận xét của từng dòng (khóa của cache)"""
+    texts = df[TEXT_COLUMNS].astype(object).fillna('').astype(str)
+    return pd.util.hash_pandas_object(texts, index=False).to_numpy().view('int64')
+
+
+class TextVectorCache:
+    """Cache vector theo hash nội dung nhận xét; chỉ giữ lại các nội dung được dùng ở lần chạy này"""
+
+    def __init__(self):
+        self.vectors: Dict[int, np.ndarray] = {}
+        if dataset_exists(CACHE_NAME):
+            cache_df = load_dataset(CACHE_NAME)
+            if list(cache_df.columns) == ['text_hash'] + VECTOR_COLUMNS:
+                values = cache_df[VECTOR_COLUMNS].to_numpy(dtype='float64')
+                self.vectors = dict(zip(cache_df['text_hash'].to_numpy(dtype='int64').tolist(), values))
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, df: pd.DataFrame) -> np.ndarray:
+        """Vector của từng dòng; chỉ vector hóa các nội dung chưa có trong cache"""
+        hashes = _text_hashes(df)
+        unique_hashes, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+        missing = [i for i, h in enumerate(unique_hashes.tolist()) if h not in self.vectors]
+        if missing:
+            texts = df[TEXT_COLUMNS].astype(object).fillna('').astype(str).iloc[first[missing]]
+            new_vectors = vectorize_texts(texts.agg(' . '.join, axis=1).tolist())
+            for i, vector in zip(missing, new_vectors):
+                self.vectors[int(unique_hashes[i])] = vector
+        self.misses += len(missing)
+        self.hits += len(unique_hashes) - len(missing)
+        self.used.update(unique_hashes.tolist())
+        unique_vectors = np.array([self.vectors[h] for h in unique_hashes.tolist()]).reshape(-1, len(VECTOR_COLUMNS))
+        return unique_vectors[inverse.reshape(-1)]
+
+    def save(self) -> Path:
+        used = sorted(self.used)
+        cache_df = pd.DataFrame(
+            np.array([self.vectors[h] for h in used]).reshape(-1, len(VECTOR_COLUMNS)), columns=VECTOR_COLUMNS
+        )
+        cache_df.insert(0, 'text_hash', np.array(used, dtype='int64'))
+        return save_dataset(cache_df, CACHE_NAME)
+
+
+def _normalize_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """Khóa ghép dạng thống nhất giữa các chunk và giữa các bảng (chuỗi, chuỗi, số)"""
+    return pd.DataFrame({
+        'student_id': df['student_id'].astype(object).astype(str).to_numpy(),
+        'subject_code': df['subject_code'].astype(object).astype(str).to_numpy(),
+        'semester': pd.to_numeric(df['semester'].astype(object), errors='coerce').to_numpy(dtype='float64'),
+    })
+
+
+def build_feedback_features(force: bool = False) -> Optional[pd.DataFrame]:
+    """
+    Tạo bảng feedback_features từ feedback_cleaned (đọc theo chunk).
+
+    Args:
+        force: Tạo lại kể cả khi bảng nhận xét không thay đổi
+    """
+    if not dataset_exists('feedback_cleaned'):
+        print("⚠️  Không có dữ liệu nhận xét, bỏ qua đặc trưng nhận xét")
+        return None
+
+    stage_inputs = [find_dataset('feedback_cleaned')]
+    stage_outputs = [dataset_path(OUTPUT_NAME), dataset_path(CACHE_NAME)]
+    if not force and is_stage_fresh('feedback_features', stage_inputs, stage_outputs):
+        print("⏭️  Bỏ qua đặc trưng nhận xét (dữ liệu không thay đổi)")
+        return None
+
+    print("🔄 Tạo đặc trưng từ nhận xét giáo viên...")
+    input_snapshot = snapshot_inputs(stage_inputs)
+    cache = TextVectorCache()
+    chunks = iter_dataset('feedback_cleaned', columns=FEEDBACK_KEYS + TEXT_COLUMNS, missing='ignore')
+    features_df = _aggregate(chunks, cache.lookup)
+
+    output_path = save_dataset(features_df, OUTPUT_NAME)
+    write_feedback_features(features_df)
+    cache.save()
+    record_stage('feedback_features', input_snapshot, stage_outputs)
+    print(f"✅ Đã tạo {len(features_df)} dòng đặc trưng nhận xét "
+          f"({cache.misses} nội dung mới được tách từ, {cache.hits} lấy từ cache)")
+    print(f"   Đường dẫn: {output_path}")
+    return features_df
+
+
+def _vectorize_rows(df: pd.DataFrame) -> np.ndarray:
+    """Vector của từng dòng nhận xét, không qua cache (dùng cho vài dòng của một học sinh)"""
+    texts = df.reindex(columns=TEXT_COLUMNS).astype(object).fillna('').astype(str)
+    return vectorize_texts(texts.agg(' . '.join, axis=1).tolist()).reshape(-1, len(VECTOR_COLUMNS))
+
+
+def _aggregate(chunks: Iterable[pd.DataFrame], vectorize: Callable[[pd.DataFrame], np.ndarray]) -> pd.DataFrame:
+    """Gộp vector nhận xét theo (student_id, subject_code, semester): đếm số nhận xét và lấy trung bình"""
+    partials = []
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        chunk = chunk.reset_index(drop=True)
+        # Cộng dồn theo khóa trong chunk; trung bình được tính sau khi gộp mọi chunk
+        sums = pd.DataFrame(vectorize(chunk), columns=VECTOR_COLUMNS)
+        sums.insert(0, 'feedback_count', 1.0)
+        sums = pd.concat([_normalize_keys(chunk), sums], axis=1)
+        partials.append(sums.groupby(FEEDBACK_KEYS, dropna=False, sort=False).sum())
+
+    if not partials:
+        return pd.DataFrame(columns=FEEDBACK_KEYS + FEATURE_COLUMNS)
+    totals = pd.concat(partials).groupby(level=FEEDBACK_KEYS, dropna=False, sort=False).sum()
+    totals[VECTOR_COLUMNS] = totals[VECTOR_COLUMNS].div(totals['feedback_count'], axis=0)
+    return totals.reset_index()
+
+
+def update_student_feedback_features(student_id: str, feedback_rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    Tính lại đặc trưng nhận xét của một học sinh từ các nhận xét của học sinh đó và thay các dòng
+    của học sinh trong kho (không đọc bảng nhận xét hay bảng đặc trưng của các học sinh khác).
+    File feedback_features không còn khớp với kho: lần chạy pipeline đầy đủ sau sẽ tạo lại.
+    """
+    features_df = _aggregate([feedback_rows], _vectorize_rows)
+    _ensure_feedback_store()
+    replace_student_feedback_features(student_id, features_df)
+    invalidate_stage('feedback_features')
+    return features_df
+
+
+def join_feedback_features(df: pd.DataFrame, feedback_df: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Ghép đặc trưng nhận xét vào các dòng điểm theo (student_id, subject_code, semester),
+    giữ nguyên thứ tự dòng. Dòng không có nhận xét nhận giá trị 0.
+    """
+    if feedback_df is None or not set(FEEDBACK_KEYS).issubset(df.columns):
+        return df
+    right_keys = pd.MultiIndex.from_frame(_normalize_keys(feedback_df))
+    positions = right_keys.get_indexer(pd.MultiIndex.from_frame(_normalize_keys(df)))
+    found = positions >= 0
+
+    columns = [col for col in FEATURE_COLUMNS if col in feedback_df.columns]
+    values = np.zeros((len(df), len(columns)))
+    # Học sinh chưa có nhận xét nào: bảng rỗng, mọi dòng nhận 0
+    if len(feedback_df):
+        values[found] = feedback_df[columns].to_numpy(dtype='float64', na_value=0.0)[positions[found]]
+    return df.assign(**{col: values[:, j] for j, col in enumerate(columns)})
+
+
+def _ensure_feedback_store():
+    """Bảng đặc trưng nhận xét được tạo trước khi có kho: đưa vào kho một lần"""
+    if not feedback_store_exists() and dataset_exists(OUTPUT_NAME):
+        write_feedback_features(load_dataset(OUTPUT_NAME))
+
+
+def load_feedback_features(student_id: Optional[str] = None) -> Optional[pd.DataFrame]:
+    """
+    Đọc bảng đặc trưng nhận xét (toàn bộ, hoặc của một học sinh qua index student_id trong kho
+    SQLite); None nếu chưa được tạo
+    """
+    if student_id is None:
+        return load_dataset(OUTPUT_NAME) if dataset_exists(OUTPUT_NAME) else None
+    _ensure_feedback_store()
+    return load_student_feedback_features(student_id)
+
+
+if __name__ == '__main__':
+    build_feedback_features(force=True)
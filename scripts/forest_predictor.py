@@ -0,0 +1,331 @@
+"""
+Dự đoán bằng rừng cây đã "làm phẳng" (Flat Forest)
+RandomForest đã huấn luyện được xuất thành các mảng NumPy liền kề cho toàn bộ rừng:
+chỉ số đặc trưng, ngưỡng, con trái/phải và giá trị lá của mọi nút (nút của cây sau nối tiếp
+cây trước). Khi dự đoán, mọi dòng đi xuống mọi cây cùng lúc: mỗi bước là vài phép lấy phần tử
+theo chỉ số trên mảng (số dòng x số cây), lặp bằng độ sâu lớn nhất của rừng.
+
+Với vài dòng (một học sinh), cách này tránh được chi phí kiểm tra dữ liệu và gọi từng cây
+của sklearn, vốn lớn hơn nhiều so với phần tính toán thật.
+
+Định dạng gọn (khoảng 1/4 kích thước pickle của sklearn):
+- ngưỡng float32 làm tròn xuống (số float32 lớn nhất <= ngưỡng float64): với đầu vào float32
+  như sklearn dùng, phép so sánh cho kết quả giống hệt ngưỡng gốc
+- giá trị lá float32 (sai khác so với model.predict cỡ 1e-7)
+- có thể cắt tỉa các cây về độ sâu nhỏ hơn để vừa giới hạn dung lượng (nút ở độ sâu giới hạn
+  trở thành lá với giá trị trung bình của nó)
+Các mảng được lưu thành từng file .npy trong một thư mục và đọc bằng mmap: các process web
+dùng chung trang bộ nhớ của cùng file thay vì mỗi process giữ một bản sao.
+
+Kiểm tra khớp kết quả và đo độ trễ với mô hình đang dùng:
+    python scripts/forest_predictor.py
+"""
+
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+# Số dòng mỗi lô khi dự đoán nhiều dòng (giữ mảng nút số dòng x số cây vừa cache)
+PREDICT_BATCH_ROWS = 512
+# Sai khác tối đa cho phép so với model.predict (giá trị lá lưu dạng float32)
+PARITY_TOLERANCE = 1e-6
+# Tên các mảng được lưu (mỗi mảng một file <tên>.npy) và file thông tin
+ARRAY_NAMES = ['feature', 'threshold', 'children', 'missing_left', 'value', 'depth', 'roots']
+META_FILE = 'meta.json'
+FORMAT_VERSION = 1
+
+
+def can_flatten(model) -> bool:
+    """Mô hình có phải rừng cây hồi quy đã huấn luyện (RandomForest/ExtraTrees) không"""
+    estimators = getattr(model, 'estimators_', None)
+    return (
+        isinstance(estimators, list) and len(estimators) > 0
+        and all(hasattr(tree, 'tree_') for tree in estimators)
+        and getattr(model, 'n_outputs_', 1) == 1
+    )
+
+
+def float32_thresholds(threshold: np.ndarray) -> np.ndarray:
+    """
+    Ngưỡng float32 tương đương: số float32 lớn nhất <= ngưỡng gốc, nên với mọi x float32
+    x <= ngưỡng float32  <=>  x <= ngưỡng gốc
+    """
+    rounded = threshold.astype(np.float32)
+    too_large = rounded.astype(np.float64) > threshold
+    rounded[too_large] = np.nextafter(rounded[too_large], np.float32(-np.inf))
+    return rounded
+
+
+def _as_float32(X) -> np.ndarray:
+    """Ma trận đầu vào -> mảng float32 dày (sklearn cũng so sánh trên float32)"""
+    if sp.issparse(X):
+        return X.astype(np.float32).toarray()
+    if hasattr(X, 'to_numpy'):
+        return X.to_numpy(dtype=np.float32, na_value=np.nan)
+    return np.asarray(X, dtype=np.float32)
+
+
+class FlatForest:
+    """
+    Rừng cây dạng mảng phẳng.
+    children có dạng (số nút, 2): con trái, con phải. Nút lá trỏ về chính nó (children[i] = [i, i])
+    nên mọi dòng có thể đi đủ max_depth bước mà không cần kiểm tra đã tới lá chưa.
+    depth là độ sâu của từng nút (dùng khi cắt tỉa).
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, children: np.ndarray,
+                 missing_left: np.ndarray, value: np.ndarray, depth: np.ndarray, roots: np.ndarray,
+                 max_depth: int, n_features: int, pruned_depth: Optional[int] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_left = missing_left
+        self.value = value
+        self.depth = depth
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        # Độ sâu đã cắt tỉa (None = giữ nguyên cây): khi đó kết quả khác model.predict
+        self.pruned_depth = pruned_depth
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in ARRAY_NAMES)
+
+    @staticmethod
+    def _node_depths(tree) -> np.ndarray:
+        """Độ sâu của từng nút (duyệt theo từng tầng)"""
+        left, right = tree.children_left, tree.children_right
+        depth = np.zeros(tree.node_count, dtype=np.int64)
+        level, frontier = 0, np.array([0])
+        while len(frontier):
+            depth[frontier] = level
+            frontier = np.concatenate([left[frontier], right[frontier]])
+            frontier = frontier[frontier != -1]
+            level += 1
+        return depth
+
+    @classmethod
+    def from_model(cls, model) -> 'FlatForest':
+        """Xuất một RandomForestRegressor (hoặc ExtraTreesRegressor) đã huấn luyện"""
+        if not can_flatten(model):
+            raise ValueError(f"Không thể làm phẳng mô hình {type(model).__name__}")
+        features, thresholds, children, missing, values, depths, roots = [], [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes) + offset
+            is_leaf = tree.children_left == -1
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+            features.append(np.where(is_leaf, 0, tree.feature))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            children.append(np.stack([left, right], axis=1))
+            missing_go_left = getattr(tree, 'missing_go_to_left', None)
+            missing.append(np.zeros(n_nodes, dtype=bool) if missing_go_left is None
+                           else np.asarray(missing_go_left, dtype=bool) & ~is_leaf)
+            values.append(tree.value[:, 0, 0])
+            depths.append(cls._node_depths(tree))
+            roots.append(offset)
+            offset += n_nodes
+            max_depth = max(max_depth, tree.max_depth)
+        n_features = model.n_features_in_
+        return cls(
+            feature=np.concatenate(features).astype(np.int16 if n_features < 2 ** 15 else np.int32),
+            threshold=float32_thresholds(np.concatenate(thresholds)),
+            children=np.concatenate(children).astype(np.int32),
+            missing_left=np.concatenate(missing),
+            value=np.concatenate(values).astype(np.float32),
+            depth=np.concatenate(depths).astype(np.uint16),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_depth=max_depth,
+            n_features=n_features,
+        )
+
+    def prune(self, max_depth: int) -> 'FlatForest':
+        """Rừng cây cắt ở độ sâu max_depth: nút ở độ sâu đó trở thành lá"""
+        if max_depth >= self.max_depth:
+            return self
+        keep = self.depth <= max_depth
+        at_limit = self.depth == max_depth
+        node_ids = np.arange(self.n_nodes, dtype=np.int32)
+        children = np.where(at_limit[:, None], node_ids[:, None], self.children)
+        # Đánh lại chỉ số các nút còn giữ
+        new_index = (np.cumsum(keep) - 1).astype(np.int32)
+        return FlatForest(
+            feature=np.where(at_limit, 0, self.feature).astype(self.feature.dtype)[keep],
+            threshold=np.where(at_limit, np.float32(np.inf), self.threshold)[keep],
+            children=new_index[children[keep]],
+            missing_left=(self.missing_left & ~at_limit)[keep],
+            value=np.asarray(self.value)[keep],
+            depth=np.asarray(self.depth)[keep],
+            roots=new_index[self.roots],
+            max_depth=max_depth,
+            n_features=self.n_features,
+            pruned_depth=max_depth,
+        )
+
+    def fit_size(self, max_bytes: int) -> 'FlatForest':
+        """Cắt tỉa về độ sâu lớn nhất mà dung lượng không vượt max_bytes (tối thiểu độ sâu 1)"""
+        if self.nbytes <= max_bytes:
+            return self
+        bytes_per_node = (self.nbytes - self.roots.nbytes) / self.n_nodes
+        nodes_by_depth = np.cumsum(np.bincount(self.depth, minlength=self.max_depth + 1))
+        fitting = np.flatnonzero(nodes_by_depth * bytes_per_node + self.roots.nbytes <= max_bytes)
+        return self.prune(max(int(fitting[-1]) if len(fitting) else 1, 1))
+
+    def _predict_batch(self, X: np.ndarray) -> np.ndarray:
+        # Lấy phần tử trên mảng một chiều (nhanh hơn chỉ số hai chiều): X[r, f] = x_flat[r * n_cột + f],
+        # children[n, c] = children_flat[2n + c]
+        x_flat = np.ascontiguousarray(X).ravel()
+        children = self.children.ravel()
+        row_offset = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        check_missing = bool(np.isnan(x_flat).any())
+        for _ in range(self.max_depth):
+            x = x_flat[row_offset + self.feature[node]]
+            # So sánh như sklearn: đi sang phải khi x > ngưỡng
+            go_right = x > self.threshold[node]
+            if check_missing:
+                go_right = np.where(np.isnan(x), ~self.missing_left[node], go_right)
+            node = children[2 * node + go_right]
+        return self.value[node].mean(axis=1, dtype=np.float64)
+
+    def predict(self, X) -> np.ndarray:
+        """Dự đoán (DataFrame, mảng hoặc ma trận thưa với đúng số cột khi huấn luyện)"""
+        X = _as_float32(X)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Cần {self.n_features} cột đặc trưng, nhận được {X.shape}")
+        if len(X) <= PREDICT_BATCH_ROWS:
+            return self._predict_batch(X)
+        return np.concatenate([
+            self._predict_batch(X[start:start + PREDICT_BATCH_ROWS])
+            for start in range(0, len(X), PREDICT_BATCH_ROWS)
+        ])
+
+    def save(self, directory: Path):
+        """Lưu mỗi mảng thành một file .npy (đọc lại bằng mmap) cùng meta.json"""
+        directory.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(directory / f"{name}.npy", getattr(self, name))
+        meta = {
+            'format_version': FORMAT_VERSION,
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+            'pruned_depth': self.pruned_depth,
+        }
+        with open(directory / META_FILE, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> 'FlatForest':
+        """Đọc rừng cây đã lưu; mmap=True: các mảng được ánh xạ từ file, không đọc vào bộ nhớ riêng"""
+        with open(directory / META_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != FORMAT_VERSION:
+            raise ValueError(f"Định dạng rừng cây không hỗ trợ: {meta.get('format_version')}")
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode='r' if mmap else None)
+                  for name in ARRAY_NAMES}
+        return cls(**arrays, max_depth=meta['max_depth'], n_features=meta['n_features'],
+                   pruned_depth=meta.get('pruned_depth'))
+
+    def summary(self) -> Dict:
+        """Thông tin kích thước (ghi vào feature_info)"""
+        return {
+            'n_trees': self.n_trees,
+            'n_nodes': self.n_nodes,
+            'max_depth': self.max_depth,
+            'pruned_depth': self.pruned_depth,
+            'size_mb': round(self.nbytes / 1024 ** 2, 3),
+        }
+
+
+def check_parity(model, forest: FlatForest, X) -> float:
+    """Sai khác lớn nhất giữa forest.predict và model.predict; báo lỗi nếu vượt PARITY_TOLERANCE"""
+    difference = float(np.max(np.abs(forest.predict(X) - model.predict(X)), initial=0.0))
+    if difference > PARITY_TOLERANCE:
+        raise AssertionError(f"Flat forest lệch {difference:.3g} so với model.predict")
+    return difference
+
+
+def measure_latency(predict_fn, X, batch_sizes: List[int], repeats: int = 20) -> Dict[int, float]:
+    """Trung vị thời gian (ms) dự đoán một lô cho từng kích thước lô"""
+    results = {}
+    for size in batch_sizes:
+        batch = X[:size]
+        predict_fn(batch)
+        timings = []
+        for _ in range(repeats if size < 1000 else max(repeats // 5, 2)):
+            start = time.perf_counter()
+            predict_fn(batch)
+            timings.append(time.perf_counter() - start)
+        results[size] = float(np.median(timings)) * 1000
+    return results
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    import joblib
+
+    from data_store import dataset_exists, load_dataset
+    from feature_transformer import build_model_matrix
+    from model_registry import get_current_model
+
+    model, feature_info = get_current_model()
+    if model is None or not can_flatten(model):
+        print("❌ Chưa có mô hình rừng cây (RandomForestRegressor) để làm phẳng!")
+    elif not dataset_exists('features'):
+        print("❌ File features không tồn tại!")
+    else:
+        start = time.perf_counter()
+        forest = FlatForest.from_model(model)
+        print(f"✅ Đã làm phẳng {forest.n_trees} cây, {forest.n_nodes} nút, độ sâu {forest.max_depth} "
+              f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+        df = load_dataset('features').head(10_000)
+        X = build_model_matrix(df, feature_info['features'], feature_info.get('hashed_text'))
+        print(f"🔍 Sai khác lớn nhất so với model.predict: {check_parity(model, forest, X):.3g}")
+
+        # Kích thước và thời gian nạp: pickle của sklearn so với định dạng gọn đọc bằng mmap
+        with tempfile.TemporaryDirectory() as tmp:
+            pickle_path = Path(tmp) / 'model.pkl'
+            joblib.dump(model, pickle_path)
+            forest.save(Path(tmp) / 'forest')
+            start = time.perf_counter()
+            joblib.load(pickle_path)
+            pickle_ms = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            FlatForest.load(Path(tmp) / 'forest')
+            mmap_ms = (time.perf_counter() - start) * 1000
+            print(f"💾 Pickle: {pickle_path.stat().st_size / 1024 ** 2:.2f} MB, nạp {pickle_ms:.1f} ms | "
+                  f"gọn: {forest.nbytes / 1024 ** 2:.2f} MB, nạp (mmap) {mmap_ms:.2f} ms")
+
+        batch_sizes = [size for size in (1, 10, 10_000) if size <= X.shape[0]]
+        sklearn_ms = measure_latency(model.predict, X, batch_sizes)
+        flat_ms = measure_latency(forest.predict, X, batch_sizes)
+        print(f"{'Số dòng':>10}{'sklearn (ms)':>15}{'flat (ms)':>12}{'Nhanh hơn':>12}")
+        for size in batch_sizes:
+            print(f"{size:>10}{sklearn_ms[size]:>15.3f}{flat_ms[size]:>12.3f}{sklearn_ms[size] / flat_ms[size]:>11.1f}x")
+
+        # Cắt tỉa: dung lượng và sai khác theo độ sâu
+        expected = model.predict(X)
+        print(f"{'Độ sâu':>10}{'MB':>10}{'Sai khác TB':>14}")
+        for depth in range(forest.max_depth, 0, -2):
+            pruned = forest.prune(depth)
+            error = np.abs(pruned.predict(X) - expected).mean()
+            print(f"{depth:>10}{pruned.nbytes / 1024 ** 2:>10.2f}{error:>14.4g}")
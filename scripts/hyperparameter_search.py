@@ -0,0 +1,189 @@
+"""
+Tìm siêu tham số cho mô hình AI Score bằng successive halving có giới hạn thời gian
+Cấu hình trong config/model_config.json:
+    "search": {
+        "enabled": true,
+        "budget_seconds": 900,
+        "n_candidates": 27,
+        "factor": 3,
+        "n_jobs": -1,
+        "param_space": {"n_estimators": [50, 100, 200], "max_depth": [6, 10, null], ...},
+        "param_spaces": {"HistGradientBoostingRegressor": {"max_iter": [100, 200], ...}}
+    }
+"param_space" dùng cho RandomForestRegressor; loại mô hình khác (model_engines.py) dùng
+"param_spaces"."<loại>" hoặc không gian mặc định của loại đó.
+
+Mỗi vòng: mọi ứng viên còn lại được huấn luyện song song (mỗi ứng viên một process) trên
+cùng một tập con của dữ liệu huấn luyện và chấm R² trên tập kiểm định; giữ lại 1/factor
+ứng viên tốt nhất và tăng số dòng lên factor lần cho vòng sau. Vòng tiếp theo chỉ bắt đầu
+khi ước lượng thời gian (theo vòng trước) còn nằm trong ngân sách, và trong một vòng
+các ứng viên được đánh giá theo lô để có thể dừng giữa vòng; khi hết thời gian,
+ứng viên tốt nhất của vòng lớn nhất đã chạy được chọn. Ngân sách chỉ tính cho phần
+tìm kiếm, chưa gồm lần huấn luyện cuối trên toàn bộ dữ liệu.
+"""
+
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.metrics import r2_score
+from sklearn.model_selection import ParameterSampler
+
+from model_engines import DEFAULT_ENGINE, ModelEngine, get_engine
+
+DEFAULT_SEARCH_CONFIG = {
+    'enabled': False,
+    'budget_seconds': 900,
+    'n_candidates': 27,
+    'factor': 3,
+    'n_jobs': -1,
+    'validation_size': 0.2,
+    'param_space': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [6, 10, 16, None],
+        'min_samples_split': [2, 5, 10],
+        'min_samples_leaf': [1, 2, 4, 8],
+    },
+}
+
+# Số dòng tối thiểu của vòng đầu tiên
+MIN_ROUND_SAMPLES = 200
+
+
+def get_search_config(config: Dict) -> Dict:
+    """Cấu hình tìm kiếm (mục "search" của model_config.json) đã điền giá trị mặc định"""
+    return {**DEFAULT_SEARCH_CONFIG, **config.get('search', {})}
+
+
+def get_param_space(search_config: Dict, engine: ModelEngine) -> Dict:
+    """Không gian tìm kiếm của một loại mô hình"""
+    param_spaces = search_config.get('param_spaces', {})
+    if engine.name in param_spaces:
+        return param_spaces[engine.name]
+    if engine.name == DEFAULT_ENGINE:
+        return search_config['param_space']
+    return engine.search_space
+
+
+def _cpu_count(n_jobs: int) -> int:
+    cpus = os.cpu_count() or 1
+    return cpus if n_jobs is None or n_jobs < 0 else max(min(n_jobs, cpus), 1)
+
+
+def _as_matrix(X):
+    """DataFrame -> mảng float32 để joblib chia sẻ qua memmap thay vì pickle cho từng process"""
+    if hasattr(X, 'to_numpy'):
+        return X.to_numpy(dtype='float32', na_value=0)
+    return X
+
+
+def _evaluate(engine_name: str, params: Dict, base_params: Dict, X_fit, y_fit, X_val, y_val,
+              n_jobs: int) -> Tuple[float, float]:
+    """Huấn luyện một ứng viên và trả về (R² trên tập kiểm định, số giây huấn luyện)"""
+    start = time.perf_counter()
+    model = get_engine(engine_name).build({**base_params, **params}, n_jobs)
+    model.fit(X_fit, y_fit)
+    score = r2_score(y_val, model.predict(X_val))
+    return float(score), time.perf_counter() - start
+
+
+def successive_halving_search(X, y, base_params: Dict, search_config: Dict,
+                              engine: Optional[ModelEngine] = None,
+                              groups: Optional[np.ndarray] = None) -> Tuple[Dict, List[Dict]]:
+    """
+    Tìm siêu tham số trong ngân sách thời gian.
+
+    Args:
+        X, y: Dữ liệu huấn luyện (DataFrame, mảng hoặc ma trận thưa CSR)
+        base_params: Tham số cố định của mô hình (ví dụ random_state)
+        search_config: get_search_config(config)
+        engine: Loại mô hình (mặc định RandomForestRegressor)
+        groups: student_id từng dòng; tập kiểm định được chia theo học sinh (None = chia theo dòng)
+
+    Returns:
+        (tham số tốt nhất, lịch sử: mỗi phần tử là một lần đánh giá ứng viên)
+    """
+    start = time.perf_counter()
+    engine = engine or get_engine()
+    budget = float(search_config['budget_seconds'])
+    factor = max(int(search_config['factor']), 2)
+    n_workers = _cpu_count(search_config.get('n_jobs', -1))
+    random_state = base_params.get('random_state', 42)
+
+    from model_evaluation import split_indices
+
+    X = engine.prepare(_as_matrix(X))
+    y = np.asarray(y, dtype='float64')
+    # Mọi dòng của một học sinh cùng một phía, để R² kiểm định không được nâng nhờ dòng cùng học sinh
+    fit_idx, val_idx = split_indices(
+        len(y), groups, test_size=search_config.get('validation_size', 0.2), random_state=random_state
+    )
+    X_fit, X_val, y_fit, y_val = X[fit_idx], X[val_idx], y[fit_idx], y[val_idx]
+    # Các vòng dùng các tập con lồng nhau của cùng một hoán vị
+    order = np.random.default_rng(random_state).permutation(len(y_fit))
+
+    candidates = list(ParameterSampler(
+        get_param_space(search_config, engine), n_iter=int(search_config['n_candidates']), random_state=random_state
+    ))
+    n_rounds = max(math.ceil(math.log(len(candidates), factor)), 0) + 1
+    samples = max(len(y_fit) // factor ** (n_rounds - 1), min(MIN_ROUND_SAMPLES, len(y_fit)))
+
+    history: List[Dict] = []
+    best_params, best_score = candidates[0], -np.inf
+    last_round_seconds = last_work = None
+    round_index = 0
+    out_of_budget = False
+    while candidates:
+        samples = min(samples, len(y_fit))
+        work = samples * len(candidates)
+        elapsed = time.perf_counter() - start
+        if last_round_seconds is not None and elapsed + last_round_seconds * work / last_work > budget:
+            print(f"⏱️  Dừng tìm kiếm trước vòng {round_index + 1}: vượt ngân sách {budget:.0f}s")
+            break
+
+        round_start = time.perf_counter()
+        X_round, y_round = X_fit[order[:samples]], y_fit[order[:samples]]
+        # Vòng ít ứng viên: chia số lõi còn dư cho từng mô hình
+        jobs_per_model = max(n_workers // len(candidates), 1)
+        results = []
+        with Parallel(n_jobs=min(n_workers, len(candidates))) as parallel:
+            # Đánh giá theo từng lô bằng số process; hết ngân sách giữa vòng thì chỉ xếp hạng
+            # các ứng viên đã đánh giá xong
+            for batch_start in range(0, len(candidates), n_workers):
+                if results and time.perf_counter() - start > budget:
+                    print(f"⏱️  Hết ngân sách {budget:.0f}s giữa vòng {round_index + 1}")
+                    out_of_budget = True
+                    break
+                batch = candidates[batch_start:batch_start + n_workers]
+                results += parallel(
+                    delayed(_evaluate)(engine.name, params, base_params, X_round, y_round, X_val, y_val, jobs_per_model)
+                    for params in batch
+                )
+        candidates = candidates[:len(results)]
+        last_round_seconds, last_work = time.perf_counter() - round_start, work
+
+        for params, (score, seconds) in zip(candidates, results):
+            history.append({
+                'round': round_index + 1,
+                'n_samples': int(samples),
+                'params': params,
+                'val_r2': score,
+                'fit_seconds': round(seconds, 3),
+            })
+        ranked = sorted(zip(candidates, results), key=lambda item: item[1][0], reverse=True)
+        best_params, best_score = ranked[0][0], ranked[0][1][0]
+        print(f"   Vòng {round_index + 1}: {len(candidates)} ứng viên x {samples} dòng, "
+              f"R² tốt nhất {best_score:.4f} ({last_round_seconds:.1f}s)")
+
+        if out_of_budget or len(candidates) == 1 or samples >= len(y_fit):
+            break
+        candidates = [params for params, _ in ranked[:max(len(candidates) // factor, 1)]]
+        samples *= factor
+        round_index += 1
+
+    print(f"🏆 Tham số tốt nhất: {best_params} (R² kiểm định {best_score:.4f}, "
+          f"{time.perf_counter() - start:.1f}s)")
+    return best_params, history
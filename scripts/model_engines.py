@@ -0,0 +1,116 @@
+"""
+Các loại mô hình (model engine) tính AI Score, chọn bằng "model.type" trong config/model_config.json
+- RandomForestRegressor (mặc định): hỗ trợ ma trận thưa và huấn luyện tăng dần (warm_start thêm cây)
+- HistGradientBoostingRegressor: gom mỗi đặc trưng vào tối đa 255 bin trước khi tìm điểm chia nên
+  huấn luyện nhanh hơn nhiều trên dữ liệu lớn; chỉ nhận ma trận dày, nên ma trận có cột văn bản
+  mã hóa băm (CSR) được chuyển sang mảng float32 dày trước khi fit/predict
+
+Tham số của mỗi loại lấy theo thứ tự: giá trị mặc định của loại đó, mục "engines"."<loại>", rồi
+các khóa ở cấp "model" (chỉ áp dụng cho loại đang chọn trong "type"). Khóa không phải tham số
+của loại mô hình bị bỏ qua.
+    "model": {
+        "type": "RandomForestRegressor",
+        "n_estimators": 100, ...,
+        "engines": {"HistGradientBoostingRegressor": {"max_iter": 300, "learning_rate": 0.1}}
+    }
+
+So sánh các loại mô hình: python scripts/benchmark_models.py
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.ensemble import HistGradientBoostingRegressor, RandomForestRegressor
+
+DEFAULT_ENGINE = 'RandomForestRegressor'
+# Khóa cấu hình của mục "model" không phải tham số mô hình
+RESERVED_KEYS = {'type', 'engines'}
+
+
+class ModelEngine:
+    """Một loại mô hình: cách tạo, tham số mặc định và dạng ma trận đầu vào"""
+
+    def __init__(self, name: str, estimator_class, defaults: Dict, search_space: Dict,
+                 dense_input: bool = False, parallel: bool = False, incremental: bool = False):
+        self.name = name
+        self.estimator_class = estimator_class
+        self.defaults = defaults
+        # Không gian tìm siêu tham số mặc định (hyperparameter_search.py)
+        self.search_space = search_space
+        # Chỉ nhận ma trận dày
+        self.dense_input = dense_input
+        # Có tham số n_jobs (song song theo process/luồng của joblib)
+        self.parallel = parallel
+        # Hỗ trợ huấn luyện tăng dần bằng cách thêm cây (ai_model.update_model)
+        self.incremental = incremental
+
+    def valid_params(self) -> set:
+        return set(self.estimator_class().get_params())
+
+    def params_from_config(self, model_config: Dict) -> Dict:
+        """Tham số của loại mô hình này theo mục "model" của model_config.json"""
+        params = {**self.defaults, **model_config.get('engines', {}).get(self.name, {})}
+        if model_config.get('type', DEFAULT_ENGINE) == self.name:
+            params.update({key: value for key, value in model_config.items() if key not in RESERVED_KEYS})
+        valid = self.valid_params()
+        return {key: value for key, value in params.items() if key in valid}
+
+    def build(self, params: Dict, n_jobs: Optional[int] = None):
+        """Tạo mô hình chưa huấn luyện"""
+        if self.parallel:
+            params = {**params, 'n_jobs': n_jobs}
+        return self.estimator_class(**params)
+
+    def prepare(self, X):
+        """Chuyển ma trận đầu vào sang dạng mô hình nhận được"""
+        if self.dense_input and sp.issparse(X):
+            return X.astype(np.float32).toarray()
+        return X
+
+    def for_serving(self, model):
+        """Dự đoán khi phục vụ web thường chỉ vài dòng: không cần chạy song song"""
+        if self.parallel:
+            model.set_params(n_jobs=None)
+        return model
+
+
+ENGINES: Dict[str, ModelEngine] = {
+    engine.name: engine for engine in [
+        ModelEngine(
+            'RandomForestRegressor', RandomForestRegressor,
+            defaults={'n_estimators': 100, 'max_depth': 10, 'min_samples_split': 5,
+                      'min_samples_leaf': 2, 'random_state': 42},
+            search_space={'n_estimators': [50, 100, 200, 400], 'max_depth': [6, 10, 16, None],
+                          'min_samples_split': [2, 5, 10], 'min_samples_leaf': [1, 2, 4, 8]},
+            parallel=True, incremental=True,
+        ),
+        ModelEngine(
+            'HistGradientBoostingRegressor', HistGradientBoostingRegressor,
+            defaults={'max_iter': 300, 'learning_rate': 0.1, 'max_leaf_nodes': 31,
+                      'min_samples_leaf': 20, 'random_state': 42},
+            search_space={'max_iter': [100, 200, 400, 800], 'learning_rate': [0.03, 0.1, 0.2],
+                          'max_leaf_nodes': [15, 31, 63], 'min_samples_leaf': [10, 20, 40],
+                          'l2_regularization': [0.0, 0.1, 1.0]},
+            dense_input=True,
+        ),
+    ]
+}
+
+
+def get_engine(name: Optional[str] = None) -> ModelEngine:
+    """Loại mô hình theo tên (tên lớp sklearn); None = mặc định"""
+    name = name or DEFAULT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Loại mô hình không hỗ trợ: {name} (hỗ trợ: {', '.join(ENGINES)})")
+    return ENGINES[name]
+
+
+def engine_for_model(model) -> ModelEngine:
+    """Loại mô hình của một mô hình đã huấn luyện"""
+    return get_engine(type(model).__name__)
+
+
+def predict(model, X) -> np.ndarray:
+    """Dự đoán với ma trận đầu vào đã chuyển sang dạng mô hình nhận được"""
+    return model.predict(engine_for_model(model).prepare(X))
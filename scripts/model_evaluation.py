@@ -0,0 +1,198 @@
+"""
+Đánh giá mô hình AI Score bằng kiểm định chéo theo nhóm (Grouped Cross-Validation)
+Mọi dòng của cùng một học sinh nằm cùng một phía (train hoặc test), nên R² đo được là R²
+trên học sinh mới, không bị "thấy trước" các môn khác của cùng học sinh.
+
+- GroupKFold theo student_id: mỗi fold được huấn luyện trong một process riêng (song song theo số lõi)
+- Tùy chọn chia theo thời gian (year, semester): với mỗi học kỳ trong n_time_splits học kỳ cuối,
+  huấn luyện trên các học kỳ trước đó và kiểm tra trên học kỳ đó
+- Kết quả từng fold và trung bình/độ lệch chuẩn được ghi vào feature_info.json (mục "cross_validation")
+
+Cấu hình trong config/model_config.json:
+    "evaluation": {
+        "enabled": true,
+        "n_splits": 5,
+        "time_split": false,
+        "n_time_splits": 3,
+        "max_fold_train_rows": 200000,
+        "n_jobs": -1
+    }
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit, train_test_split
+
+from hyperparameter_search import _as_matrix, _cpu_count
+from model_engines import ModelEngine, get_engine
+
+DEFAULT_EVALUATION_CONFIG = {
+    'enabled': True,
+    'n_splits': 5,
+    'time_split': False,
+    'n_time_splits': 3,
+    # Số dòng huấn luyện tối đa của mỗi fold (lấy mẫu theo học sinh) để đánh giá đủ nhanh
+    # cho mỗi lần huấn luyện lại; None = dùng toàn bộ
+    'max_fold_train_rows': 200_000,
+    'n_jobs': -1,
+}
+
+METRIC_NAMES = ['r2', 'mae', 'rmse']
+
+
+def get_evaluation_config(config: Dict) -> Dict:
+    """Cấu hình đánh giá (mục "evaluation" của model_config.json) đã điền giá trị mặc định"""
+    return {**DEFAULT_EVALUATION_CONFIG, **config.get('evaluation', {})}
+
+
+def split_indices(n_rows: int, groups: Optional[np.ndarray], test_size: float = 0.2,
+                  random_state: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vị trí các dòng train/test khi chia theo nhóm (mọi dòng của một học sinh cùng một phía);
+    không có cột nhóm thì chia ngẫu nhiên theo dòng
+    """
+    if groups is None or len(np.unique(groups)) < 2:
+        return train_test_split(np.arange(n_rows), test_size=test_size, random_state=random_state)
+    splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    return next(splitter.split(np.zeros(n_rows), groups=groups))
+
+
+def split_train_test(X, y, groups: Optional[np.ndarray], test_size: float = 0.2, random_state: int = 42):
+    """
+    Chia train/test theo nhóm (mọi dòng của một học sinh cùng một phía);
+    không có cột nhóm thì chia ngẫu nhiên theo dòng như trước
+    """
+    train_idx, test_idx = split_indices(len(y), groups, test_size, random_state)
+    return _take(X, train_idx), _take(X, test_idx), _take(y, train_idx), _take(y, test_idx)
+
+
+def _take(data, indices: np.ndarray):
+    """Lấy các dòng theo vị trí (DataFrame/Series, mảng hoặc ma trận thưa)"""
+    return data.iloc[indices] if hasattr(data, 'iloc') else data[indices]
+
+
+def _metrics(y_true, y_pred) -> Dict[str, float]:
+    return {
+        'r2': float(r2_score(y_true, y_pred)),
+        'mae': float(mean_absolute_error(y_true, y_pred)),
+        'rmse': float(np.sqrt(mean_squared_error(y_true, y_pred))),
+    }
+
+
+def _fit_fold(engine_name: str, params: Dict, X, y, train_idx: np.ndarray, test_idx: np.ndarray,
+              n_jobs: int) -> Dict:
+    """Huấn luyện một fold và trả về chỉ số trên phần kiểm tra"""
+    start = time.perf_counter()
+    model = get_engine(engine_name).build(params, n_jobs)
+    model.fit(X[train_idx], y[train_idx])
+    result = _metrics(y[test_idx], model.predict(X[test_idx]))
+    result.update({
+        'n_train': int(len(train_idx)),
+        'n_test': int(len(test_idx)),
+        'seconds': round(time.perf_counter() - start, 3),
+    })
+    return result
+
+
+def _limit_train_rows(train_idx: np.ndarray, groups: np.ndarray, max_rows: Optional[int],
+                      rng: np.random.Generator) -> np.ndarray:
+    """Lấy mẫu theo học sinh để phần huấn luyện của fold không vượt max_rows dòng"""
+    if not max_rows or len(train_idx) <= max_rows:
+        return train_idx
+    train_groups = np.unique(groups[train_idx])
+    keep = rng.choice(train_groups, size=max(int(len(train_groups) * max_rows / len(train_idx)), 1),
+                      replace=False)
+    return train_idx[np.isin(groups[train_idx], keep)]
+
+
+def group_folds(groups: np.ndarray, n_splits: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Các fold GroupKFold theo học sinh"""
+    n_splits = min(n_splits, len(np.unique(groups)))
+    if n_splits < 2:
+        return []
+    return list(GroupKFold(n_splits=n_splits).split(np.zeros(len(groups)), groups=groups))
+
+
+def time_folds(terms: pd.DataFrame, n_splits: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Các fold theo thời gian: kiểm tra trên từng học kỳ trong n_splits học kỳ cuối,
+    huấn luyện trên mọi học kỳ trước đó (cửa sổ mở rộng)
+    """
+    keys = terms[['year', 'semester']].apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+    valid = ~np.isnan(keys).any(axis=1)
+    # Học kỳ sắp theo (year, semester); term_codes là thứ tự học kỳ của từng dòng
+    order, inverse = np.unique(keys[valid], axis=0, return_inverse=True)
+    if len(order) < 2:
+        return []
+    term_codes = np.full(len(keys), -1)
+    term_codes[valid] = inverse.ravel()
+
+    folds = []
+    for test_term in range(max(len(order) - n_splits, 1), len(order)):
+        train_idx = np.flatnonzero((term_codes >= 0) & (term_codes < test_term))
+        test_idx = np.flatnonzero(term_codes == test_term)
+        if len(train_idx) and len(test_idx):
+            folds.append((train_idx, test_idx))
+    return folds
+
+
+def _summarize(folds: List[Dict]) -> Dict:
+    summary = {'n_splits': len(folds), 'folds': folds}
+    for name in METRIC_NAMES:
+        values = np.array([fold[name] for fold in folds])
+        summary[f'mean_{name}'] = float(values.mean())
+        summary[f'std_{name}'] = float(values.std())
+    summary['min_r2'] = float(min(fold['r2'] for fold in folds))
+    return summary
+
+
+def cross_validate(engine: ModelEngine, params: Dict, X, y, groups: Optional[np.ndarray],
+                   terms: Optional[pd.DataFrame], evaluation_config: Dict) -> Optional[Dict]:
+    """
+    Kiểm định chéo theo học sinh (và theo thời gian nếu bật), các fold chạy song song.
+
+    Args:
+        X, y: Toàn bộ dữ liệu (ma trận đã qua engine.prepare)
+        groups: student_id của từng dòng
+        terms: DataFrame cột year, semester của từng dòng (cho chia theo thời gian)
+
+    Returns:
+        {"group": {...}, "time": {...}, "seconds": ...}; None nếu không đủ nhóm để chia
+    """
+    start = time.perf_counter()
+    X = _as_matrix(X)
+    y = np.asarray(y, dtype='float64')
+    rng = np.random.default_rng(params.get('random_state', 42))
+    max_rows = evaluation_config.get('max_fold_train_rows')
+
+    splits = {}
+    if groups is not None:
+        splits['group'] = group_folds(groups, int(evaluation_config['n_splits']))
+    if evaluation_config.get('time_split') and terms is not None:
+        splits['time'] = time_folds(terms, int(evaluation_config['n_time_splits']))
+    tasks = [(kind, _limit_train_rows(train_idx, groups, max_rows, rng) if groups is not None else train_idx,
+              test_idx)
+             for kind, folds in splits.items() for train_idx, test_idx in folds]
+    if not tasks:
+        return None
+
+    n_workers = _cpu_count(evaluation_config.get('n_jobs', -1))
+    # Ít fold hơn số lõi: chia số lõi còn dư cho từng mô hình
+    jobs_per_model = max(n_workers // len(tasks), 1)
+    results = Parallel(n_jobs=min(n_workers, len(tasks)))(
+        delayed(_fit_fold)(engine.name, params, X, y, train_idx, test_idx, jobs_per_model)
+        for _, train_idx, test_idx in tasks
+    )
+
+    report = {}
+    for kind in splits:
+        folds = [result for (task_kind, _, _), result in zip(tasks, results) if task_kind == kind]
+        if folds:
+            report[kind] = _summarize(folds)
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    return report
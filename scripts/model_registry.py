@@ -0,0 +1,301 @@
+"""
+Kho phiên bản mô hình (Model Registry)
+Mỗi lần huấn luyện tạo một phiên bản mới trong models/registry/<phiên bản>/ gồm:
+- ai_model.pkl: mô hình
+- feature_info.json: danh sách đặc trưng, chỉ số đánh giá, phiên bản và hash của bộ biến đổi đặc trưng
+- forest/: rừng cây ở định dạng gọn (forest_predictor.py) để dự đoán nhanh vài dòng, đọc bằng mmap
+  nên các process web dùng chung một bản trong bộ nhớ; chỉ có với mô hình rừng cây
+- training_sample.npy: vị trí (trong file features) các dòng của mẫu huấn luyện; chỉ có khi
+  features được lấy mẫu phân tầng (training_sampler.py)
+
+File models/registry/CURRENT chứa tên phiên bản đang dùng. Thư mục phiên bản được ghi xong
+dưới tên tạm rồi mới đổi tên, và CURRENT được thay bằng os.replace, nên người đọc luôn thấy
+hoặc phiên bản cũ hoặc phiên bản mới đầy đủ, không bao giờ thấy file đang ghi dở.
+
+get_serving_model() giữ phiên bản đang dùng trong bộ nhớ và tự nạp lại khi CURRENT đổi (web app
+không cần khởi động lại); trong lúc một luồng đang nạp phiên bản mới, các luồng khác tiếp tục
+dùng phiên bản cũ. get_current_model() trả về mô hình sklearn của phiên bản đó.
+
+Mô hình sklearn chỉ được nạp khi cần, nên process web có thể còn đọc file của phiên bản vừa bị
+thay: promote() đánh dấu thời điểm phiên bản cũ thôi được dùng (file RETIRED) và prune_versions()
+không xóa phiên bản thôi được dùng chưa quá PRUNE_GRACE_SECONDS.
+
+Dùng:
+    python scripts/model_registry.py                # liệt kê các phiên bản
+    python scripts/model_registry.py <phiên bản>    # chuyển sang (hoặc quay lại) một phiên bản
+"""
+
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+
+from forest_predictor import META_FILE, FlatForest
+from model_engines import predict
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+MODELS_DIR = PROJECT_ROOT / 'models'
+REGISTRY_DIR = MODELS_DIR / 'registry'
+CURRENT_POINTER = REGISTRY_DIR / 'CURRENT'
+MODEL_FILE = 'ai_model.pkl'
+INFO_FILE = 'feature_info.json'
+FOREST_DIR = 'forest'
+SAMPLE_FILE = 'training_sample.npy'
+RETIRED_FILE = 'RETIRED'
+# Mô hình cũ (trước khi có registry): vẫn được đọc nếu chưa có phiên bản nào
+LEGACY_MODEL_PATH = MODELS_DIR / MODEL_FILE
+LEGACY_INFO_PATH = MODELS_DIR / INFO_FILE
+
+# Số phiên bản cũ được giữ lại (ngoài phiên bản đang dùng) để có thể quay lại
+KEEP_VERSIONS = 5
+# Phiên bản vừa thôi được dùng chưa bị xóa trong khoảng này (process web chuyển sang phiên bản
+# mới ở request kế tiếp, trong lúc đó vẫn có thể nạp mô hình của phiên bản cũ)
+PRUNE_GRACE_SECONDS = 600
+# Lô tối đa dự đoán bằng rừng cây gọn; lô lớn hơn dùng sklearn (nhanh hơn khi nhiều dòng)
+FLAT_FOREST_MAX_ROWS = 1000
+
+
+def new_version_id() -> str:
+    """
+    Tên phiên bản: thời điểm huấn luyện + pid + chuỗi ngẫu nhiên (không trùng khi hai lần
+    huấn luyện cùng giây, kể cả trong cùng một process)
+    """
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def version_paths(version: str) -> Tuple[Path, Path]:
+    """(đường dẫn mô hình, đường dẫn feature_info) của một phiên bản"""
+    version_dir = REGISTRY_DIR / version
+    return version_dir / MODEL_FILE, version_dir / INFO_FILE
+
+
+def list_versions() -> List[str]:
+    """Các phiên bản đã đăng ký, cũ nhất trước"""
+    if not REGISTRY_DIR.exists():
+        return []
+    return sorted(path.name for path in REGISTRY_DIR.iterdir()
+                  if path.is_dir() and not path.name.startswith('.'))
+
+
+def register_model(model, feature_info: Dict, forest: Optional[FlatForest] = None,
+                   sample_rows: Optional[np.ndarray] = None) -> str:
+    """
+    Lưu mô hình thành một phiên bản mới (chưa đưa vào sử dụng); trả về tên phiên bản
+
+    Args:
+        forest: Rừng cây gọn của mô hình để phục vụ web (None nếu mô hình không phải rừng cây)
+        sample_rows: Vị trí các dòng mẫu huấn luyện trong file features (None nếu dùng toàn bộ)
+    """
+    version = new_version_id()
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_dir = REGISTRY_DIR / f".{version}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+    joblib.dump(model, tmp_dir / MODEL_FILE)
+    if forest is not None:
+        forest.save(tmp_dir / FOREST_DIR)
+    if sample_rows is not None:
+        np.save(tmp_dir / SAMPLE_FILE, np.asarray(sample_rows, dtype='int64'))
+    with open(tmp_dir / INFO_FILE, 'w', encoding='utf-8') as f:
+        json.dump({**feature_info, 'version': version}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_dir, REGISTRY_DIR / version)
+    return version
+
+
+def promote(version: str):
+    """Đưa một phiên bản vào sử dụng (đổi con trỏ CURRENT một cách nguyên tử)"""
+    if version not in list_versions():
+        raise ValueError(f"Không có phiên bản mô hình: {version}")
+    previous = current_version()
+    tmp_pointer = CURRENT_POINTER.with_name(f".CURRENT.{os.getpid()}.tmp")
+    tmp_pointer.write_text(version, encoding='utf-8')
+    os.replace(tmp_pointer, CURRENT_POINTER)
+    (REGISTRY_DIR / version / RETIRED_FILE).unlink(missing_ok=True)
+    if previous and previous != version and (REGISTRY_DIR / previous).is_dir():
+        (REGISTRY_DIR / previous / RETIRED_FILE).touch()
+
+
+def _recently_retired(version: str) -> bool:
+    """Phiên bản thôi được dùng chưa quá PRUNE_GRACE_SECONDS"""
+    try:
+        retired_at = (REGISTRY_DIR / version / RETIRED_FILE).stat().st_mtime
+    except OSError:
+        return False
+    return time.time() - retired_at < PRUNE_GRACE_SECONDS
+
+
+def prune_versions(keep: int = KEEP_VERSIONS):
+    """
+    Xóa các phiên bản cũ, giữ phiên bản đang dùng, phiên bản process này đang giữ trong bộ nhớ,
+    các phiên bản vừa thôi được dùng (process khác có thể còn nạp) và `keep` phiên bản gần nhất khác
+    """
+    loaded = _loaded
+    in_use = {current_version(), loaded.version if loaded is not None else None}
+    others = [version for version in list_versions() if version not in in_use]
+    for version in others[:max(len(others) - keep, 0)]:
+        if not _recently_retired(version):
+            shutil.rmtree(REGISTRY_DIR / version, ignore_errors=True)
+
+
+def current_version() -> Optional[str]:
+    """Phiên bản đang dùng; None nếu chưa có"""
+    try:
+        version = CURRENT_POINTER.read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    return version or None
+
+
+def current_model_paths() -> List[Path]:
+    """Các file của mô hình đang dùng (dùng làm đầu vào/đầu ra trong pipeline manifest)"""
+    version = current_version()
+    if version is None:
+        return [LEGACY_MODEL_PATH, LEGACY_INFO_PATH]
+    return [CURRENT_POINTER, *version_paths(version)]
+
+
+def has_model() -> bool:
+    """Đã có mô hình để dùng hay chưa"""
+    return current_version() is not None or LEGACY_MODEL_PATH.exists()
+
+
+def load_version(version: Optional[str]):
+    """Tải (mô hình, feature_info) của một phiên bản; None = mô hình cũ ngoài registry"""
+    if version is None:
+        model_path, info_path = LEGACY_MODEL_PATH, LEGACY_INFO_PATH
+    else:
+        model_path, info_path = version_paths(version)
+    if not model_path.exists():
+        return None, None
+    model = joblib.load(model_path)
+    with open(info_path, 'r', encoding='utf-8') as f:
+        feature_info = json.load(f)
+    return model, feature_info
+
+
+def load_training_sample(version: Optional[str]) -> Optional[np.ndarray]:
+    """Vị trí các dòng mẫu huấn luyện của một phiên bản; None nếu phiên bản dùng toàn bộ features"""
+    if version is None:
+        return None
+    path = REGISTRY_DIR / version / SAMPLE_FILE
+    return np.load(path) if path.exists() else None
+
+
+class LoadedModel:
+    """
+    Một phiên bản mô hình đã nạp để dùng. feature_info và rừng cây gọn (mmap) được nạp ngay;
+    mô hình sklearn (pickle) chỉ được nạp khi cần (lô lớn, mô hình không phải rừng cây, hoặc
+    huấn luyện tăng dần), nên process web khởi động không phải unpickle cả mô hình.
+    """
+
+    def __init__(self, version: Optional[str], model_path: Path, info_path: Path, forest_dir: Optional[Path]):
+        self.version = version
+        self.model_path = model_path
+        with open(info_path, 'r', encoding='utf-8') as f:
+            self.feature_info = json.load(f)
+        self.forest = None
+        if forest_dir is not None and (forest_dir / META_FILE).exists():
+            self.forest = FlatForest.load(forest_dir, mmap=True)
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Mô hình sklearn (nạp từ pickle ở lần dùng đầu tiên)"""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = joblib.load(self.model_path)
+        return self._model
+
+    def predict(self, X):
+        """
+        Dự đoán: lô nhỏ dùng rừng cây gọn (không qua sklearn); lô lớn dùng sklearn.
+        Rừng cây đã cắt tỉa thì luôn dùng nó để kết quả không phụ thuộc kích thước lô.
+        """
+        if self.forest is not None and (self.forest.pruned_depth is not None
+                                        or X.shape[0] <= FLAT_FOREST_MAX_ROWS):
+            return self.forest.predict(X)
+        return predict(self.model, X)
+
+
+def _open_version(version: Optional[str]) -> Optional[LoadedModel]:
+    if version is None:
+        model_path, info_path, forest_dir = LEGACY_MODEL_PATH, LEGACY_INFO_PATH, None
+    else:
+        model_path, info_path = version_paths(version)
+        forest_dir = REGISTRY_DIR / version / FOREST_DIR
+    if not model_path.exists():
+        return None
+    return LoadedModel(version, model_path, info_path, forest_dir)
+
+
+# Phiên bản đang giữ trong bộ nhớ (thay cả đối tượng một lần)
+_loaded: Optional[LoadedModel] = None
+_load_lock = threading.Lock()
+
+
+def get_serving_model() -> Optional[LoadedModel]:
+    """
+    Phiên bản mô hình đang dùng (giữ trong bộ nhớ, tự nạp lại khi CURRENT đổi);
+    None nếu chưa có mô hình
+    """
+    global _loaded
+    version = current_version()
+    loaded = _loaded
+    if loaded is not None and loaded.version == version:
+        return loaded
+
+    # Đã có mô hình cũ: luồng khác đang nạp thì tiếp tục dùng mô hình cũ thay vì chờ
+    if not _load_lock.acquire(blocking=loaded is None):
+        return loaded
+    try:
+        if _loaded is None or _loaded.version != version:
+            _loaded = _open_version(version) or _loaded
+        return _loaded
+    finally:
+        _load_lock.release()
+
+
+def get_current_model():
+    """
+    Mô hình sklearn đang dùng (giữ trong bộ nhớ, tự nạp lại khi CURRENT đổi).
+
+    Returns:
+        (mô hình, feature_info) hoặc (None, None) nếu chưa có mô hình
+    """
+    loaded = get_serving_model()
+    if loaded is None:
+        return None, None
+    return loaded.model, loaded.feature_info
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        promote(sys.argv[1])
+        print(f"✅ Đã chuyển sang phiên bản mô hình: {sys.argv[1]}")
+    else:
+        active = current_version()
+        for name in list_versions():
+            _, info_path = version_paths(name)
+            with open(info_path, 'r', encoding='utf-8') as f:
+                metrics = json.load(f).get('metrics', {})
+            marker = '*' if name == active else ' '
+            print(f"{marker} {name}  test_r2={metrics.get('test_r2', float('nan')):.4f}")
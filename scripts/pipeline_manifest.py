@@ -0,0 +1,220 @@
+"""
+Manifest cho xử lý tăng dần (incremental) của pipeline
+Lưu hash nội dung, mtime và kích thước của các file đầu vào/đầu ra của từng bước.
+Một bước được bỏ qua khi mọi file đầu vào/đầu ra của nó không thay đổi kể từ lần chạy trước.
+
+File chỉ được hash lại khi mtime hoặc kích thước thay đổi, nên một lần chạy
+không có thay đổi gì chỉ tốn vài lệnh stat().
+
+Dấu vân tay của file đầu vào được lấy bằng snapshot_inputs() TRƯỚC khi bước đọc chúng và truyền
+vào record_stage(); chỉ file đầu ra được hash sau khi chạy. Nhờ vậy file đầu vào bị sửa trong lúc
+bước đang chạy (ví dụ học sinh nhập điểm từ web) sẽ làm bước chạy lại ở lần sau.
+
+Nhiều process (các worker làm sạch song song, pipeline chạy từ web) có thể cùng ghi nhận
+bước: mỗi lần đọc-sửa-ghi manifest được bọc trong khóa file (pipeline_manifest.lock) để
+không process nào ghi đè mất ghi nhận của process khác.
+"""
+
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+DATA_OUTPUT = PROJECT_ROOT / 'data' / 'output'
+MANIFEST_PATH = DATA_OUTPUT / 'pipeline_manifest.json'
+LOCK_PATH = DATA_OUTPUT / 'pipeline_manifest.lock'
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _relative_key(path: Path) -> str:
+    """Khóa của file trong manifest: đường dẫn tương đối so với thư mục gốc dự án"""
+    path = Path(path).resolve()
+    try:
+        return path.relative_to(PROJECT_ROOT).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+def hash_file(path: Path) -> str:
+    """Tính hash nội dung file theo từng block (không đọc toàn bộ vào bộ nhớ)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> Dict:
+    """Đọc manifest, trả về manifest rỗng nếu chưa có hoặc bị hỏng"""
+    if MANIFEST_PATH.exists():
+        try:
+            with open(MANIFEST_PATH, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest.setdefault('files', {})
+            manifest.setdefault('stages', {})
+            return manifest
+        except (OSError, ValueError):
+            print(f"⚠️  Manifest bị hỏng, bỏ qua: {MANIFEST_PATH}")
+    return {'files': {}, 'stages': {}}
+
+
+@contextmanager
+def manifest_lock():
+    """Khóa độc quyền (giữa các process) quanh một lần đọc-sửa-ghi manifest"""
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_PATH, 'a+') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def save_manifest(manifest: Dict):
+    """Ghi manifest (ghi file tạm rồi thay thế); gọi trong manifest_lock()"""
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = MANIFEST_PATH.with_name(f"{MANIFEST_PATH.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def file_fingerprint(path: Path, manifest: Dict) -> Optional[Dict]:
+    """
+    Lấy dấu vân tay (hash, mtime, size) của file.
+    Dùng lại hash đã lưu nếu mtime và kích thước không đổi.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    stat = path.stat()
+    key = _relative_key(path)
+    cached = manifest['files'].get(key)
+    if cached and cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size:
+        return cached
+
+    fingerprint = {
+        'hash': hash_file(path),
+        'mtime_ns': stat.st_mtime_ns,
+        'size': stat.st_size,
+    }
+    manifest['files'][key] = fingerprint
+    return fingerprint
+
+
+def is_stage_fresh(stage: str, inputs: Iterable[Optional[Path]], outputs: Iterable[Optional[Path]],
+                   params: Optional[Dict] = None) -> bool:
+    """
+    Kiểm tra một bước có thể bỏ qua hay không: đã từng chạy với cùng tham số,
+    mọi file đầu ra còn tồn tại và hash của mọi file đầu vào/đầu ra không đổi.
+    """
+    manifest = load_manifest()
+    entry = manifest['stages'].get(stage)
+    if not entry or entry.get('params') != (params or {}):
+        return False
+
+    # File không tồn tại (None) được bỏ qua; nếu sau đó file xuất hiện, tập khóa sẽ khác
+    paths = [path for path in list(inputs) + list(outputs) if path is not None]
+    keys = [_relative_key(path) for path in paths]
+    if set(keys) != set(entry['files']):
+        return False
+
+    files_before = dict(manifest['files'])
+    fresh = True
+    for path, key in zip(paths, keys):
+        fingerprint = file_fingerprint(path, manifest)
+        if fingerprint is None or fingerprint['hash'] != entry['files'][key]:
+            fresh = False
+            break
+
+    # Lưu lại mtime mới nếu file chỉ bị "touch" mà nội dung không đổi
+    changed = {key: value for key, value in manifest['files'].items() if files_before.get(key) != value}
+    if changed:
+        _update_manifest(lambda latest: latest['files'].update(changed))
+    return fresh
+
+
+def _update_manifest(update):
+    """Đọc lại manifest mới nhất, sửa bằng update(manifest) rồi ghi, tất cả trong khóa"""
+    with manifest_lock():
+        manifest = load_manifest()
+        update(manifest)
+        save_manifest(manifest)
+
+
+def snapshot_inputs(inputs: Iterable[Optional[Path]]) -> Dict[str, Dict]:
+    """
+    Dấu vân tay của các file đầu vào, lấy trước khi bước đọc chúng (truyền vào record_stage).
+    File không tồn tại được bỏ qua như trong is_stage_fresh.
+    """
+    manifest = load_manifest()
+    fingerprints = {}
+    for path in inputs:
+        if path is None:
+            continue
+        fingerprint = file_fingerprint(path, manifest)
+        if fingerprint is not None:
+            fingerprints[_relative_key(path)] = fingerprint
+    return fingerprints
+
+
+def record_stage(stage: str, inputs: Union[Dict[str, Dict], Iterable[Optional[Path]]],
+                 outputs: Iterable[Optional[Path]], params: Optional[Dict] = None):
+    """
+    Ghi nhận một bước đã chạy xong cùng hash của các file đầu vào/đầu ra.
+
+    Args:
+        inputs: Kết quả snapshot_inputs() lấy trước khi chạy bước; danh sách đường dẫn thì
+                được hash ngay lúc này (chỉ dùng khi đầu vào không thể đổi trong lúc chạy)
+        outputs: File đầu ra, được hash sau khi chạy
+
+    File được hash ngoài khóa; trong khóa chỉ đọc lại manifest mới nhất, thêm ghi nhận rồi ghi.
+    """
+    fingerprints = dict(inputs) if isinstance(inputs, dict) else snapshot_inputs(inputs)
+    fingerprints.update(snapshot_inputs(outputs))
+    files = {key: fingerprint['hash'] for key, fingerprint in fingerprints.items()}
+
+    entry = {
+        'files': files,
+        'params': params or {},
+        'completed_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+
+    def update(manifest: Dict):
+        manifest['files'].update(fingerprints)
+        manifest['stages'][stage] = entry
+
+    _update_manifest(update)
+
+
+def invalidate_stage(stage: str):
+    """Xóa ghi nhận của một bước để lần chạy sau buộc phải chạy lại"""
+    _update_manifest(lambda manifest: manifest['stages'].pop(stage, None))
@@ -0,0 +1,203 @@
+"""
+Đồ thị môn tiên quyết (Prerequisite Graph)
+Đọc cột prerequisites của bảng môn học (mã môn, phân tách bằng dấu phẩy) thành đồ thị có hướng
+không chu trình và tính sẵn bao đóng bắc cầu: với mỗi môn, tập *mọi* môn tiên quyết trực tiếp
+và gián tiếp được lưu dạng bitset (mảng uint64, mỗi bit là một môn).
+
+- is_unlocked(): môn X đã "mở" với tập môn đã qua của học sinh chưa (một phép AND trên bitset)
+- unlock_counts: số môn phụ thuộc (trực tiếp hoặc gián tiếp) vào mỗi môn, dùng để xếp hạng gợi ý
+
+Đồ thị được dựng một lần và giữ trong bộ nhớ; chỉ dựng lại khi bảng môn học thay đổi.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_store import dataset_exists, find_dataset, load_dataset
+
+
+def get_project_root():
+    """Tìm thư mục gốc dự án"""
+    current = Path(__file__).resolve()
+    if current.parent.name == 'scripts':
+        return current.parent.parent
+    return Path.cwd()
+
+
+PROJECT_ROOT = get_project_root()
+
+PREREQUISITE_SEPARATOR = ','
+# Điểm tối thiểu để coi là đã qua môn (thang 10)
+PASS_GRADE = 5.0
+
+
+def parse_prerequisites(value) -> List[str]:
+    """Tách ô prerequisites thành danh sách mã môn"""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return []
+    return [code.strip() for code in str(value).split(PREREQUISITE_SEPARATOR) if code.strip()]
+
+
+class PrerequisiteGraph:
+    """
+    Đồ thị môn tiên quyết với bao đóng bắc cầu dạng bitset.
+    Mỗi môn có một chỉ số i; closure[i] là bitset các môn phải học trước môn i.
+    """
+
+    def __init__(self, subjects_df: pd.DataFrame):
+        # Bảng môn học không có cột prerequisites: đồ thị không có cạnh
+        values = subjects_df.get('prerequisites')
+        values = values.astype(object) if values is not None else [None] * len(subjects_df)
+        prerequisites = {
+            str(code): parse_prerequisites(value)
+            for code, value in zip(subjects_df['subject_code'].astype(object), values)
+            if pd.notna(code)
+        }
+        # Môn tiên quyết không có trong bảng môn học vẫn được thêm làm đỉnh của đồ thị
+        codes = list(prerequisites)
+        codes += sorted({p for prereqs in prerequisites.values() for p in prereqs} - set(prerequisites))
+        self.codes = codes
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(codes)}
+        self.n_words = max((len(codes) + 63) // 64, 1)
+
+        parents = [[self.index[p] for p in prerequisites.get(code, []) if p != code] for code in codes]
+        self.cyclic: List[str] = []
+        self.closure = self._build_closure(parents)
+
+        # Số môn phụ thuộc vào mỗi môn = số bit i trên mọi hàng của bao đóng
+        bits = np.unpackbits(self.closure.view(np.uint8), axis=1, bitorder='little')[:, :len(codes)]
+        self.unlock_counts = bits.sum(axis=0).astype(np.int64)
+
+    def _bit(self, i: int) -> np.ndarray:
+        row = np.zeros(self.n_words, dtype=np.uint64)
+        row[i // 64] = np.uint64(1) << np.uint64(i % 64)
+        return row
+
+    def _build_closure(self, parents: List[List[int]]) -> np.ndarray:
+        """Bao đóng theo thứ tự topo (Kahn): closure[i] = OR(closure[p] | bit(p)) với p là môn tiên quyết"""
+        n = len(parents)
+        closure = np.zeros((n, self.n_words), dtype=np.uint64)
+        children = [[] for _ in range(n)]
+        in_degree = np.zeros(n, dtype=np.int64)
+        for i, ps in enumerate(parents):
+            in_degree[i] = len(ps)
+            for p in ps:
+                children[p].append(i)
+
+        queue = [i for i in range(n) if in_degree[i] == 0]
+        done = 0
+        while queue:
+            i = queue.pop()
+            done += 1
+            for p in parents[i]:
+                closure[i] |= closure[p] | self._bit(p)
+            for child in children[i]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+
+        if done < n:
+            # Chu trình trong dữ liệu: các môn trong chu trình lấy bao đóng bằng lặp đến điểm bất động
+            remaining = [i for i in range(n) if in_degree[i] > 0]
+            self.cyclic = [self.codes[i] for i in remaining]
+            print(f"⚠️  Môn tiên quyết có chu trình: {', '.join(self.cyclic)}")
+            changed = True
+            while changed:
+                changed = False
+                for i in remaining:
+                    updated = closure[i].copy()
+                    for p in parents[i]:
+                        updated |= closure[p] | self._bit(p)
+                    if (updated != closure[i]).any():
+                        closure[i] = updated
+                        changed = True
+        return closure
+
+    def prerequisite_counts(self) -> np.ndarray:
+        """Số môn tiên quyết (trực tiếp và gián tiếp) của mỗi môn"""
+        bits = np.unpackbits(self.closure.view(np.uint8), axis=1, bitorder='little')
+        return bits.sum(axis=1).astype(np.int64)
+
+    def mask(self, codes: Iterable[str]) -> np.ndarray:
+        """Bitset của một tập mã môn (bỏ qua mã không có trong đồ thị)"""
+        row = np.zeros(self.n_words, dtype=np.uint64)
+        for code in codes:
+            i = self.index.get(str(code))
+            if i is not None:
+                row[i // 64] |= np.uint64(1) << np.uint64(i % 64)
+        return row
+
+    def passed_mask(self, passed_codes: Iterable[str]) -> np.ndarray:
+        """
+        Bitset các môn coi như đã qua: các môn đã qua và mọi môn tiên quyết của chúng
+        (đã học môn B thì coi như đã có môn A là tiên quyết của B)
+        """
+        row = self.mask(passed_codes)
+        indices = self._indices(row)
+        if len(indices):
+            row = row | np.bitwise_or.reduce(self.closure[indices], axis=0)
+        return row
+
+    def _indices(self, row: np.ndarray) -> np.ndarray:
+        bits = np.unpackbits(row.view(np.uint8), bitorder='little')[:len(self.codes)]
+        return np.flatnonzero(bits)
+
+    def prerequisites_of(self, code: str) -> List[str]:
+        """Mọi môn tiên quyết (trực tiếp và gián tiếp) của một môn"""
+        i = self.index.get(str(code))
+        if i is None:
+            return []
+        return [self.codes[j] for j in self._indices(self.closure[i])]
+
+    def is_unlocked(self, code: str, passed: np.ndarray) -> bool:
+        """Môn đã được mở với bitset môn đã qua (passed_mask) chưa; môn không có trong đồ thị luôn mở"""
+        i = self.index.get(str(code))
+        if i is None:
+            return True
+        return not (self.closure[i] & ~passed).any()
+
+    def unlock_count(self, code: str) -> int:
+        """Số môn phụ thuộc (trực tiếp hoặc gián tiếp) vào môn này"""
+        i = self.index.get(str(code))
+        return int(self.unlock_counts[i]) if i is not None else 0
+
+
+def passed_subjects(grades_df: pd.DataFrame, pass_grade: float = PASS_GRADE) -> List[str]:
+    """Các môn học sinh đã qua (điểm >= pass_grade ở bất kỳ lần học nào)"""
+    if grades_df is None or grades_df.empty or 'grade_score' not in grades_df.columns:
+        return []
+    scores = pd.to_numeric(grades_df['grade_score'].astype(object), errors='coerce')
+    return grades_df.loc[scores.to_numpy() >= pass_grade, 'subject_code'].astype(str).unique().tolist()
+
+
+_graph_cache: Dict = {}
+
+
+def load_prerequisite_graph() -> Optional[PrerequisiteGraph]:
+    """
+    Đồ thị môn tiên quyết dựng từ subjects_cleaned; giữ trong bộ nhớ và chỉ dựng lại
+    khi file thay đổi. None nếu chưa có bảng môn học.
+    """
+    if not dataset_exists('subjects_cleaned'):
+        return None
+    path = find_dataset('subjects_cleaned')
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    if _graph_cache.get('key') != key:
+        subjects_df = load_dataset('subjects_cleaned', columns=['subject_code', 'prerequisites'], missing='ignore')
+        _graph_cache['graph'] = PrerequisiteGraph(subjects_df)
+        _graph_cache['key'] = key
+    return _graph_cache['graph']
+
+
+if __name__ == '__main__':
+    graph = load_prerequisite_graph()
+    if graph is None:
+        print("❌ Vui lòng chạy data_processor.py trước!")
+    else:
+        print(f"✅ {len(graph.codes)} môn học, {int((graph.prerequisite_counts() > 0).sum())} môn có môn tiên quyết")
+        for code in graph.codes[:10]:
+            print(f"   {code}: tiên quyết {graph.prerequisites_of(code)}, mở khóa {graph.unlock_count(code)} môn")
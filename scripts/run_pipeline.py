@@ -1,13 +1,15 @@
 """
 Pipeline chạy toàn bộ quy trình xử lý dữ liệu và AI
 1. Xử lý dữ liệu (data_processor.py)
-2. Feature Engineering (feature_engineering.py)
-3. Huấn luyện mô hình (ai_model.py)
-4. Tạo gợi ý (ai_recommender.py)
+2. Nạp dữ liệu đã làm sạch vào database (database_manager.py)
+3. Feature Engineering (feedback_features.py, feature_engineering.py)
+4. Huấn luyện mô hình (ai_model.py)
+5. Tạo gợi ý (ai_recommender.py)
 """
 
 import sys
 from pathlib import Path
+from typing import Optional
 
 # Thêm thư mục scripts vào path
 scripts_dir = Path(__file__).parent
@@ -15,13 +17,23 @@ sys.path.insert(0, str(scripts_dir))
 
 from data_processor import process_all_data
 from feature_engineering import create_features
+from feedback_features import build_feedback_features
 from ai_model import train_model
 from ai_recommender import process_all_students
-from database_manager import init_database
+from database_manager import init_database, load_cleaned_data
 
 
-def run_full_pipeline():
-    """Chạy toàn bộ pipeline"""
+def run_full_pipeline(chunksize: Optional[int] = None, force: bool = False, workers: int = 1):
+    """
+    Chạy toàn bộ pipeline.
+    Các bước có đầu vào không thay đổi kể từ lần chạy trước sẽ được bỏ qua
+    (xem pipeline_manifest.py), trừ khi force=True.
+
+    Args:
+        chunksize: Số dòng mỗi chunk khi làm sạch dữ liệu (None = đọc toàn bộ file)
+        force: Chạy lại mọi bước
+        workers: Số process làm sạch song song các file đầu vào
+    """
     print("=" * 60)
     print("🚀 BẮT ĐẦU PIPELINE XỬ LÝ DỮ LIỆU VÀ AI")
     print("=" * 60)
@@ -33,23 +45,28 @@ def run_full_pipeline():
         
         # Bước 2: Xử lý dữ liệu
         print("\n📊 Bước 2: Xử lý và làm sạch dữ liệu...")
-        process_all_data()
+        process_all_data(chunksize=chunksize, force=force, workers=workers)
+        
+        # Bước 3: Nạp dữ liệu vào database
+        print("\n📊 Bước 3: Nạp dữ liệu đã làm sạch vào database...")
+        load_cleaned_data(force=force)
         
-        # Bước 3: Feature Engineering
-        print("\n📊 Bước 3: Feature Engineering...")
-        create_features()
+        # Bước 4: Feature Engineering
+        print("\n📊 Bước 4: Feature Engineering...")
+        build_feedback_features(force=force)
+        create_features(force=force)
         
-        # Bước 4: Huấn luyện mô hình
-        print("\n📊 Bước 4: Huấn luyện mô hình AI...")
-        model = train_model()
+        # Bước 5: Huấn luyện mô hình
+        print("\n📊 Bước 5: Huấn luyện mô hình AI...")
+        model = train_model(force=force)
         
         if model is None:
             print("❌ Không thể huấn luyện mô hình. Dừng pipeline.")
             return
         
-        # Bước 5: Tạo gợi ý
-        print("\n📊 Bước 5: Tạo gợi ý học tập cá nhân hóa...")
-        process_all_students()
+        # Bước 6: Tạo gợi ý
+        print("\n📊 Bước 6: Tạo gợi ý học tập cá nhân hóa...")
+        process_all_students(force=force)
         
         print("\n" + "=" * 60)
         print("✅ HOÀN THÀNH PIPELINE!")
@@ -65,5 +82,5 @@ def run_full_pipeline():
 
 
 if __name__ == '__main__':
-    run_full_pipeline()
+    run_full_pipeline(force='--force' in sys.argv)
 
@@ -0,0 +1,200 @@
+"""
+Schema dữ liệu tập trung cho tất cả các bảng CSV/Parquet
+Khai báo kiểu dữ liệu tiết kiệm bộ nhớ cho từng cột:
+- category: mã định danh, mã môn, học kỳ, phong cách học, định hướng nghề nghiệp
+- Int8/Int16: số tín chỉ, năm học (kiểu nullable để giữ được giá trị thiếu)
+- float32: điểm số và các tỷ lệ
+- object (TEXT_DTYPE): văn bản tự do; khai báo để Parquet luôn lưu dạng chuỗi, kể cả khi
+  cột toàn ô trống trong chunk đầu
+Các cột không khai báo (cột đã mã hóa, ...) giữ nguyên kiểu pandas tự suy luận.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Kiểu của cột văn bản tự do trong schema
+TEXT_DTYPE = 'object'
+
+SCHEMAS: Dict[str, Dict[str, str]] = {
+    'subjects': {
+        'subject_code': 'category',
+        'subject_name': 'category',
+        'category': 'category',
+        'credits': 'Int8',
+        'difficulty_level': 'category',
+        'prerequisites': TEXT_DTYPE,
+    },
+    'grades': {
+        'student_id': 'category',
+        'subject_code': 'category',
+        'grade_score': 'float32',
+        'attendance_rate': 'float32',
+        'homework_completion': 'float32',
+        'semester': 'category',
+        'year': 'Int16',
+    },
+    'feedback': {
+        'student_id': 'category',
+        'subject_code': 'category',
+        'teacher_id': 'category',
+        'comment': TEXT_DTYPE,
+        'strengths': TEXT_DTYPE,
+        'improvements': TEXT_DTYPE,
+        'semester': 'category',
+    },
+    'student_profiles': {
+        'student_id': 'category',
+        'name': TEXT_DTYPE,
+        'major': 'category',
+        'career_path': 'category',
+        'learning_style': 'category',
+        'interests': TEXT_DTYPE,
+        'goals': TEXT_DTYPE,
+    },
+    # Bảng features: các cột phân loại đã được mã hóa thành số nên chỉ khai báo
+    # khóa và các cột số gốc/dẫn xuất
+    'features': {
+        'student_id': 'category',
+        'subject_code': 'category',
+        'grade_score': 'float32',
+        'attendance_rate': 'float32',
+        'homework_completion': 'float32',
+        'semester': 'Int8',
+        'year': 'Int16',
+        'credits': 'Int8',
+        'student_avg_grade': 'float32',
+        'difficulty_numeric': 'Int8',
+        'completion_rate': 'float32',
+        'ai_score': 'float32',
+    },
+    # Đặc trưng nhận xét đã gộp theo (student_id, subject_code, semester); các cột còn lại là số thực
+    'feedback_features': {
+        'student_id': 'category',
+        'subject_code': 'category',
+        'semester': 'float64',
+        'feedback_count': 'Int32',
+    },
+    'ai_scores': {
+        'student_id': 'category',
+        'subject_code': 'category',
+        'ai_score': 'float32',
+    },
+}
+
+# Cột category có giá trị là số thật (học kỳ, mức độ khó): category được đổi sang kiểu số.
+# Cột mã định danh/mã môn luôn giữ category dạng chuỗi để không mất số 0 ở đầu ('00123', '01')
+NUMERIC_CATEGORIES = {'semester', 'difficulty_level'}
+
+# Tên file đầu vào / tên bảng output -> schema tương ứng
+DATASET_SCHEMAS = {
+    'subjects.csv': 'subjects',
+    'subjects_cleaned': 'subjects',
+    'grades.csv': 'grades',
+    'grades_cleaned': 'grades',
+    'teacher_feedback.csv': 'feedback',
+    'feedback_cleaned': 'feedback',
+    'student_profile.csv': 'student_profiles',
+    'student_profiles_cleaned': 'student_profiles',
+    'features': 'features',
+    'feedback_features': 'feedback_features',
+    'ai_scores': 'ai_scores',
+}
+
+
+def get_schema(dataset: str) -> Dict[str, str]:
+    """
+    Lấy schema của một bảng theo tên bảng, tên file hoặc đường dẫn file.
+    Trả về dict rỗng nếu bảng không có schema.
+    """
+    name = Path(dataset).name
+    key = DATASET_SCHEMAS.get(name) or DATASET_SCHEMAS.get(Path(name).stem) or name
+    return SCHEMAS.get(key, {})
+
+
+def csv_read_dtypes(dataset: str) -> Dict[str, str]:
+    """
+    Kiểu dữ liệu truyền cho pd.read_csv(dtype=...).
+    Chỉ các cột category được đọc trực tiếp (không bao giờ lỗi khi parse);
+    các cột số được ép kiểu sau trong apply_schema để giá trị sai thành NaN.
+    """
+    return {col: dtype for col, dtype in get_schema(dataset).items() if dtype == 'category'}
+
+
+def read_csv_typed(path, dataset: Optional[str] = None, **kwargs) -> pd.DataFrame:
+    """Đọc file CSV theo schema của bảng (mặc định suy ra từ tên file)"""
+    dataset = dataset or Path(path).name
+    usecols = kwargs.get('usecols')
+    dtypes = csv_read_dtypes(dataset)
+    if usecols is not None and not callable(usecols):
+        dtypes = {col: dtype for col, dtype in dtypes.items() if col in usecols}
+    df = pd.read_csv(path, dtype=dtypes, encoding='utf-8', **kwargs)
+    if isinstance(df, pd.DataFrame):
+        return apply_schema(df, dataset)
+    # chunksize được truyền: trả về iterator các chunk đã áp schema
+    return (apply_schema(chunk, dataset) for chunk in df)
+
+
+def _as_category(series: pd.Series, numeric: bool = False) -> pd.Series:
+    """
+    Chuyển sang category; với cột số thật (numeric=True, ví dụ học kỳ) mà mọi category đều là số
+    thì dùng category kiểu số
+    """
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        series = series.astype('category')
+    categories = series.cat.categories
+    if numeric and len(categories) and not pd.api.types.is_numeric_dtype(categories):
+        numeric = pd.to_numeric(categories, errors='coerce')
+        if not numeric.isna().any() and numeric.is_unique:
+            series = series.cat.rename_categories(numeric)
+    return series
+
+
+def apply_schema(df: pd.DataFrame, dataset: str) -> pd.DataFrame:
+    """Ép kiểu các cột của DataFrame theo schema; giá trị số không hợp lệ thành NaN"""
+    schema = get_schema(dataset)
+    if not schema or df.empty:
+        return df
+
+    df = df.copy(deep=False)
+    for col, dtype in schema.items():
+        if col not in df.columns:
+            continue
+        if dtype == 'category':
+            df[col] = _as_category(df[col], numeric=col in NUMERIC_CATEGORIES)
+            continue
+        if dtype == TEXT_DTYPE:
+            df[col] = df[col].astype(object)
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        numeric = pd.to_numeric(df[col], errors='coerce')
+        try:
+            df[col] = numeric.astype(dtype)
+        except (TypeError, ValueError):
+            # Giá trị lẻ trong cột số nguyên (ví dụ 2.5 tín chỉ): giữ dạng số thực
+            df[col] = numeric.astype('float32')
+    return df
+
+
+def fill_missing(series: pd.Series, value) -> pd.Series:
+    """fillna an toàn cho cả cột category (thêm category mới nếu cần)"""
+    return add_category(series, value).fillna(value)
+
+
+def add_category(series: pd.Series, value) -> pd.Series:
+    """Thêm giá trị vào danh sách category của cột (nếu cột là category và chưa có)"""
+    if isinstance(series.dtype, pd.CategoricalDtype) and pd.notna(value) \
+            and value not in series.cat.categories:
+        return series.cat.add_categories([value])
+    return series
+
+
+def decategorize_numeric(df: pd.DataFrame) -> pd.DataFrame:
+    """Chuyển các cột category có giá trị số (ví dụ học kỳ) về kiểu số để đưa vào mô hình"""
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype) and pd.api.types.is_numeric_dtype(dtype.categories):
+            df[col] = df[col].astype('float64')
+    return df
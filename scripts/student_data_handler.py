@@ -17,8 +17,10 @@ sys.path.insert(0, str(scripts_dir))
 
 # Import các module cần thiết
 from data_processor import process_all_data
-from feature_engineering import create_features
-from ai_model import train_model
+from database_manager import load_cleaned_data
+from feature_engineering import update_student_features
+from database_manager import is_database_loaded, upsert_feedback, upsert_grade, upsert_student_profile
+from ai_model import update_model
 from ai_recommender import process_all_students
 
 
@@ -34,10 +36,14 @@ def _ensure_directories():
 
 
 def _load_or_create_csv(filepath: Path, default_columns: List[str]) -> pd.DataFrame:
-    """Tải file CSV hoặc tạo mới nếu chưa tồn tại"""
+    """
+    Tải file CSV đầu vào hoặc tạo mới nếu chưa tồn tại.
+    Đọc nguyên văn dạng chuỗi (không áp schema) vì file được ghi lại vào data/input:
+    mã có số 0 ở đầu ('00123') và ô trống phải được giữ y như cũ.
+    """
     if filepath.exists():
         try:
-            df = pd.read_csv(filepath, encoding='utf-8')
+            df = pd.read_csv(filepath, dtype=object, keep_default_na=False, encoding='utf-8')
             return df
         except Exception as e:
             print(f"⚠️  Không thể đọc {filepath.name}: {e}. Tạo file mới.")
@@ -63,7 +69,8 @@ def _update_or_append_record(df: pd.DataFrame, new_record: Dict,
         mask = pd.Series([True] * len(df))
         for key in unique_keys:
             if key in new_record and key in df.columns:
-                mask = mask & (df[key] == new_record[key])
+                # Các cột được đọc dạng chuỗi: so sánh theo chuỗi (học kỳ 1 == '1')
+                mask = mask & (df[key].astype(str).str.strip() == str(new_record[key]).strip())
         
         if mask.any():
             # Cập nhật bản ghi cũ
@@ -137,6 +144,10 @@ def add_grade_record(student_id: str, subject_code: str, grade_score: float,
         # Lưu file
         _save_dataframe(df, grades_file)
         
+        # Đồng bộ database (nếu đã được nạp) để cập nhật features tăng dần
+        if is_database_loaded():
+            upsert_grade(grade_record)
+        
         print(f"📝 Đã thêm điểm cho {student_id} - {subject_code}: {grade_score}")
         return True
         
@@ -193,6 +204,10 @@ def add_feedback_record(student_id: str, subject_code: str,
         # Lưu file
         _save_dataframe(df, feedback_file)
         
+        # Đồng bộ database (nếu đã được nạp) để cập nhật đặc trưng nhận xét tăng dần
+        if is_database_loaded():
+            upsert_feedback(feedback_record)
+        
         print(f"💬 Đã thêm feedback cho {student_id} - {subject_code}")
         return True
         
@@ -259,6 +274,10 @@ def update_student_profile(student_id: str, name: str = None,
         # Lưu file
         _save_dataframe(df, profile_file)
         
+        # Đồng bộ database (nếu đã được nạp)
+        if is_database_loaded():
+            upsert_student_profile(profile_record)
+        
         print(f"👤 Đã cập nhật hồ sơ cho {student_id}")
         return True
         
@@ -369,18 +388,23 @@ def run_pipeline_for_student(student_id: str, run_full: bool = True) -> bool:
         print(f"🔄 CHẠY PIPELINE CHO {student_id}")
         print(f"{'='*60}\n")
         
-        # Bước 1: Xử lý dữ liệu
-        print("📊 Bước 1: Xử lý và làm sạch dữ liệu...")
-        process_all_data()
+        # Bước 1: Dữ liệu mới đã được ghi vào database khi lưu; chỉ làm sạch toàn bộ và nạp
+        # database một lần nếu database chưa được nạp (các lần sau không làm sạch lại)
+        if is_database_loaded():
+            print("⏭️  Bước 1: Bỏ qua làm sạch toàn bộ dữ liệu (database đã đồng bộ)")
+        else:
+            print("📊 Bước 1: Xử lý, làm sạch dữ liệu và nạp database...")
+            process_all_data()
+            load_cleaned_data()
         
-        # Bước 2: Feature Engineering
+        # Bước 2: Feature Engineering (chỉ cập nhật features của học sinh này)
         print("\n📊 Bước 2: Feature Engineering...")
-        create_features()
+        update_student_features(student_id)
         
         if run_full:
-            # Bước 3: Huấn luyện lại mô hình
-            print("\n📊 Bước 3: Huấn luyện lại mô hình AI...")
-            model = train_model()
+            # Bước 3: Cập nhật mô hình (tăng dần nếu ít dữ liệu thay đổi, ngược lại huấn luyện lại toàn bộ)
+            print("\n📊 Bước 3: Cập nhật mô hình AI...")
+            model = update_model()
             
             if model is None:
                 print("⚠️  Không thể huấn luyện mô hình, nhưng vẫn tiếp tục...")
@@ -0,0 +1,178 @@
+"""
+Lấy mẫu phân tầng (stratified reservoir sampling) bảng features khi bảng quá lớn để đọc hết vào
+bộ nhớ lúc huấn luyện. Bảng được đọc theo từng chunk (data_store.iter_dataset), không bao giờ
+giữ toàn bộ trong bộ nhớ:
+
+1. Lượt 1 chỉ đọc các cột phân tầng (mặc định major, career_path, year) để đếm số dòng mỗi nhóm,
+   rồi chia ngân sách dòng cho các nhóm theo tỷ lệ (mỗi nhóm ít nhất 1 dòng để nhóm hiếm không mất)
+2. Lượt 2 đọc các cột huấn luyện; mỗi dòng nhận một số ngẫu nhiên và mỗi nhóm giữ các dòng có số
+   nhỏ nhất trong hạn mức của nhóm (reservoir), nên mẫu trong từng nhóm là mẫu ngẫu nhiên đều
+
+Bảng không vượt ngân sách thì được đọc nguyên vẹn như trước. Cùng file features, cùng cấu hình
+(random_state, chunksize) cho ra cùng mẫu; vị trí các dòng được chọn còn được lưu cùng phiên bản
+mô hình (model_registry.py, file training_sample.npy).
+
+Cấu hình trong config/model_config.json:
+    "sampling": {
+        "enabled": true,
+        "max_rows": 1000000,
+        "max_memory_mb": 2048,
+        "strata": ["major", "career_path", "year"],
+        "chunksize": 100000,
+        "random_state": 42
+    }
+"""
+
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_store import DEFAULT_CHUNK_SIZE, dataset_columns, find_dataset, iter_dataset
+from pipeline_manifest import hash_file
+
+DEFAULT_SAMPLING_CONFIG = {
+    'enabled': True,
+    # Số dòng tối đa của mẫu; None = không giới hạn theo số dòng
+    'max_rows': 1_000_000,
+    # Bộ nhớ tối đa (MB) của các cột đã đọc, ước lượng từ các dòng đầu; None = không giới hạn
+    'max_memory_mb': 2048,
+    'strata': ['major', 'career_path', 'year'],
+    'chunksize': DEFAULT_CHUNK_SIZE,
+    'random_state': 42,
+}
+
+# Số dòng đầu dùng để ước lượng bộ nhớ mỗi dòng
+ESTIMATE_ROWS = 1000
+
+
+def get_sampling_config(config: Dict) -> Dict:
+    """Cấu hình lấy mẫu (mục "sampling" của model_config.json) đã điền giá trị mặc định"""
+    return {**DEFAULT_SAMPLING_CONFIG, **config.get('sampling', {})}
+
+
+def _stratum_keys(chunk: pd.DataFrame, strata: List[str]) -> pd.Series:
+    """Khóa nhóm của từng dòng (giá trị các cột phân tầng nối bằng '|')"""
+    if not strata:
+        return pd.Series('', index=chunk.index)
+    keys = chunk[strata[0]].astype(str)
+    for col in strata[1:]:
+        keys = keys + '|' + chunk[col].astype(str)
+    return keys
+
+
+def count_strata(strata: List[str], chunksize: int = DEFAULT_CHUNK_SIZE) -> pd.Series:
+    """Số dòng của từng nhóm trong bảng features (chỉ đọc các cột phân tầng)"""
+    counts = pd.Series(dtype='int64')
+    for chunk in iter_dataset('features', columns=strata or None, chunksize=chunksize):
+        counts = counts.add(_stratum_keys(chunk, strata).value_counts(), fill_value=0)
+    return counts.astype('int64')
+
+
+def row_budget(columns: List[str], sampling_config: Dict) -> Optional[int]:
+    """Số dòng tối đa của mẫu theo max_rows và max_memory_mb; None = không giới hạn"""
+    budget = sampling_config.get('max_rows')
+    budget = int(budget) if budget else None
+    max_memory_mb = sampling_config.get('max_memory_mb')
+    if max_memory_mb:
+        head = next(iter_dataset('features', columns=columns, chunksize=ESTIMATE_ROWS), None)
+        if head is not None and len(head):
+            bytes_per_row = head.memory_usage(deep=True).sum() / len(head)
+            memory_rows = int(max_memory_mb * 1024 ** 2 / bytes_per_row)
+            budget = memory_rows if budget is None else min(budget, memory_rows)
+    return budget
+
+
+def allocate(counts: np.ndarray, budget: int) -> np.ndarray:
+    """
+    Chia ngân sách dòng cho các nhóm theo tỷ lệ số dòng (phần dư chia cho các nhóm có phần lẻ
+    lớn nhất); mỗi nhóm ít nhất 1 dòng và không quá số dòng của nhóm
+    """
+    exact = counts * budget / counts.sum()
+    quotas = np.floor(exact).astype('int64')
+    remainder = int(budget - quotas.sum())
+    if remainder > 0:
+        quotas[np.argsort(quotas - exact, kind='stable')[:remainder]] += 1
+    return np.minimum(np.maximum(quotas, 1), counts)
+
+
+def _select(priorities: np.ndarray, codes: np.ndarray, quotas: np.ndarray) -> np.ndarray:
+    """Vị trí các dòng được giữ: trong mỗi nhóm, quota dòng có số ngẫu nhiên nhỏ nhất"""
+    order = np.lexsort((priorities, codes))
+    sorted_codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+    rank = np.arange(len(order)) - group_start
+    return np.sort(order[rank < quotas[sorted_codes]])
+
+
+def sample_features(columns: List[str], sampling_config: Dict) -> Optional[Tuple[pd.DataFrame, Dict]]:
+    """
+    Lấy mẫu phân tầng bảng features nếu bảng vượt ngân sách dòng.
+
+    Args:
+        columns: Các cột cần đọc
+        sampling_config: Mục "sampling" đã điền mặc định (get_sampling_config)
+
+    Returns:
+        (DataFrame mẫu theo thứ tự trong file, index là vị trí dòng trong file; thông tin mẫu);
+        None nếu bảng không vượt ngân sách (đọc toàn bộ như bình thường)
+    """
+    start = time.perf_counter()
+    available = set(dataset_columns('features'))
+    strata = [col for col in sampling_config.get('strata') or [] if col in available]
+    chunksize = int(sampling_config.get('chunksize') or DEFAULT_CHUNK_SIZE)
+
+    budget = row_budget(columns, sampling_config)
+    if budget is None:
+        return None
+    counts = count_strata(strata, chunksize)
+    total_rows = int(counts.sum())
+    if total_rows <= budget:
+        return None
+
+    stratum_index = pd.Index(counts.index)
+    quotas = allocate(counts.to_numpy(), budget)
+    # Ngưỡng số ngẫu nhiên của từng nhóm: nhóm đã đủ hạn mức chỉ nhận dòng có số nhỏ hơn ngưỡng
+    thresholds = np.ones(len(quotas))
+    rng = np.random.default_rng(sampling_config.get('random_state'))
+
+    reservoir = None
+    reservoir_priorities = np.empty(0)
+    reservoir_codes = np.empty(0, dtype='int64')
+    offset = 0
+    for chunk in iter_dataset('features', columns=columns, chunksize=chunksize):
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        priorities = rng.random(len(chunk))
+        codes = stratum_index.get_indexer(_stratum_keys(chunk, strata))
+        candidates = priorities < thresholds[codes]
+        if not candidates.any():
+            continue
+
+        merged = chunk[candidates] if reservoir is None else pd.concat([reservoir, chunk[candidates]])
+        merged_priorities = np.r_[reservoir_priorities, priorities[candidates]]
+        merged_codes = np.r_[reservoir_codes, codes[candidates]]
+        keep = _select(merged_priorities, merged_codes, quotas)
+        reservoir = merged.iloc[keep]
+        reservoir_priorities, reservoir_codes = merged_priorities[keep], merged_codes[keep]
+
+        kept = np.bincount(reservoir_codes, minlength=len(quotas))
+        max_priority = np.zeros(len(quotas))
+        np.maximum.at(max_priority, reservoir_codes, reservoir_priorities)
+        thresholds = np.where(kept >= quotas, max_priority, 1.0)
+
+    sample = reservoir.sort_index()
+    summary = {
+        'total_rows': total_rows,
+        'sample_rows': int(len(sample)),
+        'budget_rows': int(budget),
+        'strata': strata,
+        'n_strata': int(len(quotas)),
+        'random_state': sampling_config.get('random_state'),
+        'chunksize': chunksize,
+        'features_hash': hash_file(find_dataset('features')),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    return sample, summary
@@ -5,6 +5,7 @@ Dashboard hiển thị kết quả học tập, biểu đồ năng lực, và g
 """
 
 import os
+import sqlite3
 import sys
 import webbrowser
 import threading
@@ -23,10 +24,12 @@ scripts_dir = project_root / 'scripts'
 sys.path.insert(0, str(scripts_dir))
 
 from ai_recommender import generate_recommendations, predict_ai_scores, process_all_students  # type: ignore
-from database_manager import init_database, get_connection  # type: ignore
+from database_manager import init_database, get_connection, get_student_grades  # type: ignore
+from data_store import dataset_exists, load_dataset  # type: ignore
 from data_processor import process_all_data  # type: ignore
 from feature_engineering import create_features  # type: ignore
 from ai_model import train_model  # type: ignore
+from model_registry import current_version, has_model  # type: ignore
 from run_pipeline import run_full_pipeline  # type: ignore
 from student_data_handler import process_new_student_data  # type: ignore
 from student_utils import (  # type: ignore
@@ -534,15 +537,12 @@ def create_app() -> Flask:
         """Dashboard hiển thị kết quả học tập và gợi ý"""
         user = get_current_user()
         try:
-            # Đọc trực tiếp từ file output nếu có
-            output_dir = project_root / 'data' / 'output'
-            
+            # Đọc trực tiếp từ dữ liệu output nếu có (CSV hoặc Parquet)
             # Đọc hồ sơ học sinh
-            profiles_path = output_dir / 'student_profiles_cleaned.csv'
             profile = None
-            if profiles_path.exists():
+            if dataset_exists('student_profiles_cleaned'):
                 try:
-                    profiles_df = pd.read_csv(profiles_path)
+                    profiles_df = load_dataset('student_profiles_cleaned')
                     student_profile = profiles_df[profiles_df['student_id'] == student_id]
                     if not student_profile.empty:
                         profile = student_profile.iloc[0].to_dict()
@@ -551,10 +551,9 @@ def create_app() -> Flask:
             
             # Đọc AI Scores từ file
             scores_data = None
-            scores_path = output_dir / 'ai_scores.csv'
-            if scores_path.exists():
+            if dataset_exists('ai_scores'):
                 try:
-                    scores_df = pd.read_csv(scores_path)
+                    scores_df = load_dataset('ai_scores')
                     student_scores = scores_df[scores_df['student_id'] == student_id]
                     if not student_scores.empty:
                         scores_data = student_scores.to_dict('records')
@@ -572,10 +571,9 @@ def create_app() -> Flask:
             
             # Đọc Recommendations từ file
             recommendations = []
-            rec_path = output_dir / 'recommendations.csv'
-            if rec_path.exists():
+            if dataset_exists('recommendations'):
                 try:
-                    rec_df = pd.read_csv(rec_path)
+                    rec_df = load_dataset('recommendations')
                     student_recs = rec_df[rec_df['student_id'] == student_id].head(10)
                     if not student_recs.empty:
                         recommendations = student_recs.to_dict('records')
@@ -589,12 +587,15 @@ def create_app() -> Flask:
                 except:
                     pass
             
-            # Đọc điểm số thực tế
+            # Đọc điểm số thực tế (truy vấn database theo student_id, nếu chưa nạp thì đọc file)
             grades_data = None
-            grades_path = output_dir / 'grades_cleaned.csv'
-            if grades_path.exists():
+            try:
+                grades_data = get_student_grades(student_id) or None
+            except sqlite3.Error:
+                pass
+            if grades_data is None and dataset_exists('grades_cleaned'):
                 try:
-                    grades_df = pd.read_csv(grades_path)
+                    grades_df = load_dataset('grades_cleaned')
                     student_grades = grades_df[grades_df['student_id'] == student_id]
                     if not student_grades.empty:
                         grades_data = student_grades.to_dict('records')
@@ -680,9 +681,8 @@ def create_app() -> Flask:
                 return jsonify({'error': 'No data found'}), 404
             
             # Tính toán năng lực theo category
-            subjects_path = project_path('subjects_cleaned.csv')
-            if subjects_path.exists():
-                subjects_df = pd.read_csv(subjects_path)
+            if dataset_exists('subjects_cleaned'):
+                subjects_df = load_dataset('subjects_cleaned')
                 merged = scores_df.merge(
                     subjects_df,
                     on='subject_code',
@@ -728,22 +728,24 @@ def create_app() -> Flask:
             sys.stdout = output_buffer
             sys.stderr = error_buffer
             
+            # Chạy từng bước riêng lẻ từ trang quản lý luôn chạy lại (force=True),
+            # còn pipeline đầy đủ chỉ chạy lại các bước có dữ liệu thay đổi
             if task_name == 'data-processor':
-                process_all_data()
+                process_all_data(force=True)
                 message = "Xử lý dữ liệu hoàn tất!"
                 
             elif task_name == 'feature-engineering':
-                create_features()
+                create_features(force=True)
                 message = "Feature Engineering hoàn tất!"
                 
             elif task_name == 'train-model':
-                model = train_model()
+                model = train_model(force=True)
                 if model is None:
                     raise Exception("Không thể huấn luyện mô hình")
                 message = "Huấn luyện mô hình hoàn tất!"
                 
             elif task_name == 'generate-recommendations':
-                process_all_students()
+                process_all_students(force=True)
                 message = "Tạo gợi ý hoàn tất!"
                 
             elif task_name == 'pipeline':
@@ -865,7 +867,6 @@ def create_app() -> Flask:
         try:
             input_dir = project_root / 'data' / 'input'
             output_dir = project_root / 'data' / 'output'
-            models_dir = project_root / 'models'
             db_path = project_root / 'web' / 'student_learning.db'
             
             # Đếm file input
@@ -876,10 +877,10 @@ def create_app() -> Flask:
             # Đếm file output
             output_files = 0
             if output_dir.exists():
-                output_files = len([f for f in output_dir.iterdir() if f.suffix == '.csv'])
+                output_files = len([f for f in output_dir.iterdir() if f.suffix in ('.csv', '.parquet')])
             
             # Kiểm tra mô hình
-            model_exists = (models_dir / 'ai_model.pkl').exists() if models_dir.exists() else False
+            model_exists = has_model()
             
             # Kiểm tra database
             database_exists = db_path.exists()
@@ -888,6 +889,7 @@ def create_app() -> Flask:
                 'input_files': input_files,
                 'output_files': output_files,
                 'model_exists': model_exists,
+                'model_version': current_version(),
                 'database_exists': database_exists
             })
             
@@ -14,38 +14,40 @@ sys.path.insert(0, str(scripts_dir))
 
 from ai_recommender import generate_recommendations, predict_ai_scores  # type: ignore
 from database_manager import get_connection  # type: ignore
+from data_store import dataset_exists, load_dataset, save_dataset  # type: ignore
+from schemas import read_csv_typed  # type: ignore
 
 
 def _load_subjects_dataframe() -> pd.DataFrame:
     """Đọc danh sách môn học từ output hoặc input"""
-    paths = [
-        project_root / "data" / "output" / "subjects_cleaned.csv",
-        project_root / "data" / "input" / "subjects.csv",
-    ]
-    for path in paths:
-        if path.exists():
-            try:
-                return pd.read_csv(path)
-            except Exception:
-                return pd.DataFrame()
+    if dataset_exists("subjects_cleaned"):
+        try:
+            return load_dataset("subjects_cleaned")
+        except Exception:
+            return pd.DataFrame()
+    path = project_root / "data" / "input" / "subjects.csv"
+    if path.exists():
+        try:
+            return read_csv_typed(path)
+        except Exception:
+            return pd.DataFrame()
     return pd.DataFrame()
 
 
 def _load_student_profile(student_id: str) -> dict:
     """Tìm profile học sinh trong output hoặc input"""
-    paths = [
-        project_root / "data" / "output" / "student_profiles_cleaned.csv",
-        project_root / "data" / "input" / "student_profile.csv",
+    loaders = [
+        lambda: load_dataset("student_profiles_cleaned"),
+        lambda: read_csv_typed(project_root / "data" / "input" / "student_profile.csv"),
     ]
-    for path in paths:
-        if path.exists():
-            try:
-                df = pd.read_csv(path)
-                match = df[df["student_id"] == student_id]
-                if not match.empty:
-                    return match.iloc[0].to_dict()
-            except Exception:
-                continue
+    for load in loaders:
+        try:
+            df = load()
+            match = df[df["student_id"] == student_id]
+            if not match.empty:
+                return match.iloc[0].to_dict()
+        except Exception:
+            continue
     return {}
 
 
@@ -75,6 +77,19 @@ def _save_student_dataframe(
     df_new.to_csv(path, index=False, encoding="utf-8")
 
 
+def _save_student_dataset(name: str, student_id: str, df_new: pd.DataFrame):
+    """Thay dữ liệu của học sinh trong một bảng output (CSV hoặc Parquet)"""
+    if dataset_exists(name):
+        try:
+            existing = load_dataset(name)
+            if "student_id" in existing.columns:
+                existing = existing[existing["student_id"] != student_id]
+            df_new = pd.concat([existing, df_new], ignore_index=True)
+        except Exception:
+            pass
+    save_dataset(df_new, name)
+
+
 def _save_student_input_data(student_id: str, synthetic_data: dict):
     """Ghi dữ liệu của học sinh vào các file input"""
     input_dir = project_root / "data" / "input"
@@ -255,37 +270,35 @@ def initialize_student_data(student_id: str, full_name: str = None):
             scores_df = None
 
         if scores_df is not None and not scores_df.empty:
-            _save_student_dataframe(output_dir / "ai_scores.csv", student_id, scores_df)
+            _save_student_dataset("ai_scores", student_id, scores_df)
             recommendations = generate_recommendations(student_id, top_n=10)
             if recommendations:
                 recs_df = pd.DataFrame(recommendations)
-                _save_student_dataframe(
-                    output_dir / "recommendations.csv", student_id, recs_df
-                )
+                _save_student_dataset("recommendations", student_id, recs_df)
         else:
             synthetic = _create_synthetic_student_data(student_id, full_name)
             if synthetic:
-                _save_student_dataframe(
-                    output_dir / "ai_scores.csv", student_id, synthetic["ai_scores"]
+                _save_student_dataset(
+                    "ai_scores", student_id, synthetic["ai_scores"]
                 )
-                _save_student_dataframe(
-                    output_dir / "recommendations.csv",
+                _save_student_dataset(
+                    "recommendations",
                     student_id,
                     synthetic["recommendations"],
                 )
-                _save_student_dataframe(
-                    output_dir / "grades_cleaned.csv",
+                _save_student_dataset(
+                    "grades_cleaned",
                     student_id,
                     synthetic["grades"],
                 )
-                _save_student_dataframe(
-                    output_dir / "student_profiles_cleaned.csv",
+                _save_student_dataset(
+                    "student_profiles_cleaned",
                     student_id,
                     synthetic["profile"],
                 )
                 if synthetic.get("feedback") is not None:
-                    _save_student_dataframe(
-                        output_dir / "feedback_cleaned.csv",
+                    _save_student_dataset(
+                        "feedback_cleaned",
                         student_id,
                         synthetic["feedback"],
                     )
@@ -297,9 +310,7 @@ def initialize_student_data(student_id: str, full_name: str = None):
         profile = _load_student_profile(student_id)
         if profile:
             profile_df = pd.DataFrame([profile])
-            _save_student_dataframe(
-                output_dir / "student_profiles_cleaned.csv", student_id, profile_df
-            )
+            _save_student_dataset("student_profiles_cleaned", student_id, profile_df)
     except Exception:
         # Không để lỗi đăng ký chỉ vì tạo dữ liệu thất bại
         pass